@@ -0,0 +1,32 @@
+"""add extraction job shards
+
+Revision ID: 3b8e6d0f2a71
+Revises: 7c2f9a41d5e3
+Create Date: 2026-10-18 19:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8e6d0f2a71'
+down_revision: Union[str, None] = '7c2f9a41d5e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('extrjob', sa.Column('parent_id', sa.Uuid(), nullable=True))
+    op.create_index(op.f('ix_extrjob_parent_id'), 'extrjob', ['parent_id'], unique=False)
+    op.create_foreign_key(
+        'extrjob_parent_id_fkey', 'extrjob', 'extrjob', ['parent_id'], ['id'], ondelete='CASCADE'
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('extrjob_parent_id_fkey', 'extrjob', type_='foreignkey')
+    op.drop_index(op.f('ix_extrjob_parent_id'), table_name='extrjob')
+    op.drop_column('extrjob', 'parent_id')
@@ -0,0 +1,26 @@
+"""add extraction job run_after
+
+Revision ID: 5e2b8c1f7a94
+Revises: 9d41c7e8b2f6
+Create Date: 2026-10-19 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2b8c1f7a94'
+down_revision: Union[str, None] = '9d41c7e8b2f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('extrjob', sa.Column('run_after', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('extrjob', 'run_after')
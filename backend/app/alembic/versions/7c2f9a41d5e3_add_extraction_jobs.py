@@ -0,0 +1,55 @@
+"""add extraction jobs
+
+Revision ID: 7c2f9a41d5e3
+Revises: e480532b73da
+Create Date: 2026-10-18 18:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2f9a41d5e3'
+down_revision: Union[str, None] = 'e480532b73da'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('extrjob',
+    sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+    sa.Column('filename', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('owner_id', sa.Uuid(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(length=16), nullable=False),
+    sa.Column('file_path', sqlmodel.sql.sqltypes.AutoString(length=1024), nullable=False),
+    sa.Column('options', sa.JSON(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_extrjob_status'), 'extrjob', ['status'], unique=False)
+    op.create_index(op.f('ix_extrjob_created_at'), 'extrjob', ['created_at'], unique=False)
+    op.create_table('extrjobresult',
+    sa.Column('job_id', sa.Uuid(), nullable=False),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.ForeignKeyConstraint(['job_id'], ['extrjob.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('job_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('extrjobresult')
+    op.drop_index(op.f('ix_extrjob_created_at'), table_name='extrjob')
+    op.drop_index(op.f('ix_extrjob_status'), table_name='extrjob')
+    op.drop_table('extrjob')
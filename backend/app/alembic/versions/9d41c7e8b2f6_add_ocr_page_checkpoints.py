@@ -0,0 +1,41 @@
+"""add ocr page checkpoints
+
+Revision ID: 9d41c7e8b2f6
+Revises: 3b8e6d0f2a71
+Create Date: 2026-10-18 20:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d41c7e8b2f6'
+down_revision: Union[str, None] = '3b8e6d0f2a71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ocrpagecheckpoint',
+    sa.Column('document_hash', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False),
+    sa.Column('page', sa.Integer(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('source', sqlmodel.sql.sqltypes.AutoString(length=16), nullable=False),
+    sa.Column('model', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+    sa.Column('document_type', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=True),
+    sa.Column('render_settings', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+    sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+    sa.Column('completion_tokens', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('document_hash', 'page')
+    )
+    op.create_index(op.f('ix_ocrpagecheckpoint_created_at'), 'ocrpagecheckpoint', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_ocrpagecheckpoint_created_at'), table_name='ocrpagecheckpoint')
+    op.drop_table('ocrpagecheckpoint')
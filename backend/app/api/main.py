@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.routes import items, login, private, users, utils,extractorg,extractorgpt,extractorts
+from app.api.routes import items, login, private, users, utils,extractorg,extractorgpt,extractorts,jobs
 from app.core.config import settings
 
 api_router = APIRouter()
@@ -11,6 +11,7 @@ api_router.include_router(items.router)
 api_router.include_router(extractorg.router)
 api_router.include_router(extractorgpt.router)
 api_router.include_router(extractorts.router)
+api_router.include_router(jobs.router)
 
 
 if settings.ENVIRONMENT == "local":
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, File, UploadFile, HTTPException
 import os
 from fastapi.responses import JSONResponse
+from app.core.uploads import check_page_count, save_upload
+from app.gptocr.utilityFunction import count_pdf_pages
 #from app.core.config import settings
 
 from app.googleapi.documentocr import process_document
@@ -23,8 +25,8 @@ async def upload_file(file: UploadFile = File(...)):
     #file_location = os.path.join(file.filename)
 
     # implement store in S3 bucket aws or GCP
-    with open(file_location, "wb") as f:
-        f.write(await file.read())
+    await save_upload(file, file_location)
+    check_page_count(count_pdf_pages(file_location))
     print("The document uploaded and I am here")
     dpcument_content = process_document(file_location)
     #return JSONResponse(content={"message": "File uploaded successfully", "file_path": file_location}, status_code=200)
@@ -37,10 +39,10 @@ async def upload_file_ts(file: UploadFile = File(...)):
     #file_location = os.path.join(file.filename)
 
     # implement store in S3 bucket aws or GCP
-    with open(file_location, "wb") as f:
-        f.write(await file.read())
+    await save_upload(file, file_location)
+    check_page_count(count_pdf_pages(file_location))
     print("The document uploaded and I am here TS")
-    dpcument_content = process_document_invoice(file_location)
+    dpcument_content = await process_document_invoice(file_location)
     #return JSONResponse(content={"message": "File uploaded successfully", "file_path": file_location}, status_code=200)
     return JSONResponse(content={"message": dpcument_content, "file_path": file_location}, status_code=200)    
 
@@ -50,9 +52,9 @@ async def upload_file_tspp(file: UploadFile = File(...)):
     #file_location = os.path.join(file.filename)
 
     # implement store in S3 bucket aws or GCP
-    with open(file_location, "wb") as f:
-        f.write(await file.read())
+    await save_upload(file, file_location)
+    check_page_count(count_pdf_pages(file_location))
     print("The document uploaded and I am here TS")
-    dpcument_content = process_invoice(file_location)
+    dpcument_content = await process_invoice(file_location)
     #return JSONResponse(content={"message": "File uploaded successfully", "file_path": file_location}, status_code=200)
     return JSONResponse(content={"message": dpcument_content, "file_path": file_location}, status_code=200)    
\ No newline at end of file
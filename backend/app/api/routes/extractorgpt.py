@@ -1,16 +1,22 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Body
+from fastapi import APIRouter, Depends, File, Form, UploadFile, HTTPException, Body
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
 import os
-import tempfile
 import asyncio
-from typing import  Optional
+from typing import  AsyncIterator, List, Optional, Tuple
 from pydantic import  ValidationError
 from app.gptocr.model.gptmodel import OCRRequest, OCRResponse
-from app.gptocr.utilityFunction import convert_pdf_to_images_pymupdf, encode_images, create_batches
-from app.gptocr.helperFunction import get_pdf_bytes
-from app.gptocr.ocrbatchprocess import process_batches, concatenate_texts
+from app.gptocr.utilityFunction import count_pdf_pages
+from app.gptocr.helperFunction import check_pdf_source, save_uploaded_pdf
+from app.core.uploads import check_page_count
+from app.gptocr.ocrbatchprocess import classify_pdf, ocr_document, page_path_counters, resumable_ocr_pipeline
 from app.gptocr.logger import logger
 from app.core.config import settings
-from app.api.deps import CurrentUser, SessionDep
+from app.core.llmclients import llm_clients
+from app.gptocr.ocrcache import ocr_cache
+from app.gptocr.ratelimiter import rate_limiter
+from app.gptocr.urlfetch import url_fetcher, url_filename
+from app.api.deps import CurrentUser, SessionDep, get_current_active_superuser
 import re
 from app.models import Extr, ExtrBase, Item
 from typing import Any
@@ -24,87 +30,44 @@ router = APIRouter(prefix="/gptfiles", tags=["gptfiles"])
 async def ocr_endpoint(
     session: SessionDep,
     file: Optional[UploadFile] = File(None),
-    #ocr_request: Optional[OCRRequest] = Body(None),
+    url: Optional[str] = Form(None),
+    text_layer: Optional[bool] = None,
     current_user: CurrentUser = None,
 ):
     """
     Perform OCR on a provided PDF file or a PDF from a URL.
 
+    A URL whose server sends an ETag or Last-Modified is re-fetched with a
+    conditional request; if the document is unchanged its earlier result is
+    returned without downloading or OCR'ing it again.
+
     Args:
         file (Optional[UploadFile]): The uploaded PDF file.
-        ocr_request (Optional[OCRRequest]): The OCR request containing a PDF URL.
+        url (Optional[str]): URL of the PDF, as a form field, instead of a file.
+        text_layer (Optional[bool]): Use the PDF's embedded text where it is good enough
+            instead of vision OCR; defaults to `OCR_TEXT_LAYER_ENABLED`.
 
     Returns:
-        OCRResponse: The response containing the extracted text.
+        OCRResponse: The extracted text and each page's status. Pages that
+        fail are reported in `failed_pages` while the others are still returned.
 
     Raises:
-        HTTPException: If input validation fails or processing errors occur.
+        HTTPException: If input validation fails or no page could be processed.
     """
     try:
-        extr_count = read_extr_count(session=session, current_user=current_user)
-        print(f"Extr count is {extr_count}", settings.MAX_EXTR_COUNT)
-        if extr_count > settings.MAX_EXTR_COUNT:
-            logger.warning("OCR request rejected: maximum number of extractions reached.")
-            raise HTTPException(
-                status_code=403,
-                detail="Maximum number of extractions reached. Please subscribe to use further.",
-            )
-        
-        # Retrieve PDF bytes
-        #pdf_bytes = await get_pdf_bytes(file, ocr_request)
-        print(f"File is {file}")
-        pdf_bytes = await get_pdf_bytes(file)
-
-        # Save PDF bytes to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf_file:
-            tmp_pdf_file.write(pdf_bytes)
-            tmp_pdf_path = tmp_pdf_file.name
-            logger.info(f"Saved PDF to temporary file {tmp_pdf_path}.")
-
-        try:
-            # Convert PDF to images using PyMuPDF with multiprocessing
-            loop = asyncio.get_event_loop()
-            image_bytes_list = await loop.run_in_executor(
-                None, convert_pdf_to_images_pymupdf, tmp_pdf_path
+        ocr_request = OCRRequest(url=url) if url else None
+        check_pdf_source(file, ocr_request)
+        if ocr_request:
+            return await ocr_remote_document(
+                session, str(ocr_request.url), resolve_text_layer(text_layer), current_user
             )
 
-            file_extr = ExtrBase(filename=file.filename, pagecount=len(image_bytes_list), owner_id=current_user.id)
-            create_extr(extr_in=file_extr, current_user=current_user, session=session)
-
-            # Encode images to base64 data URLs along with page numbers
-            image_data_urls = encode_images(image_bytes_list)
-
-            # Create batches for OCR
-            batches = create_batches(image_data_urls, settings.BATCH_SIZE)
-            #batches = create_batches(image_data_urls, 1)
-
-            # Process OCR batches in parallel
-            extracted_texts = await process_batches(batches)
-
-            # Concatenate extracted texts
-            final_text = concatenate_texts(extracted_texts)
-
-            if not final_text:
-                logger.warning("OCR completed but no text was extracted.")
-                raise HTTPException(
-                    status_code=500, detail="OCR completed but no text was extracted."
-                )
-            # else:
-            #     logger.info("OCR completed successfully.", final_text)
-
-            #     json_match = re.search(r'{.*}', final_text, re.DOTALL)
-            #     print("The JSON extracted from the summary is TS:",json_match)
-
-            #     if json_match:
-            #         final_text = json_match.group(0)
-            #         #print("The JSON extracted from the text is TS:", final_text)
-            #         #logger.info("OCR completed successfully.", final_text)
-            return OCRResponse(text=final_text)
+        tmp_pdf_path, page_count = await prepare_ocr_document(session, file, current_user)
 
+        try:
+            return await ocr_document(tmp_pdf_path, page_count, resolve_text_layer(text_layer))
         finally:
-            # Clean up temporary PDF file
-            os.remove(tmp_pdf_path)
-            logger.info(f"Deleted temporary PDF file {tmp_pdf_path}.")
+            remove_temp_pdf(tmp_pdf_path)
 
     except HTTPException:
         raise
@@ -118,6 +81,216 @@ async def ocr_endpoint(
             detail="An unexpected error occurred during OCR processing.",
         )
 
+@router.post('/ocr/stream')
+async def ocr_stream_endpoint(
+    session: SessionDep,
+    file: Optional[UploadFile] = File(None),
+    url: Optional[str] = Form(None),
+    stream_tokens: bool = False,
+    text_layer: Optional[bool] = None,
+    current_user: CurrentUser = None,
+):
+    """
+    Perform OCR on a provided PDF file or a PDF from a URL and stream the result as Server-Sent Events.
+
+    Each batch's markdown is sent in a `page` event as soon as it finishes, with
+    its page numbers and timings. Pages finished by an earlier, interrupted
+    upload of the same file are resent from their checkpoints first. Failed batches produce an `error` event and a
+    final `summary` event, which also reports the detected document type,
+    closes the stream. With `stream_tokens` the model output
+    is also forwarded in `delta` events while it is being generated.
+
+    Args:
+        file (Optional[UploadFile]): The uploaded PDF file.
+        url (Optional[str]): URL of the PDF, as a form field, instead of a file.
+        stream_tokens (bool): Forward token-level output from the model.
+        text_layer (Optional[bool]): Use the PDF's embedded text where it is good enough
+            instead of vision OCR; defaults to `OCR_TEXT_LAYER_ENABLED`.
+
+    Returns:
+        StreamingResponse: A `text/event-stream` response.
+
+    Raises:
+        HTTPException: If input validation fails or the PDF cannot be opened before streaming starts.
+    """
+    try:
+        ocr_request = OCRRequest(url=url) if url else None
+    except ValidationError as ve:
+        logger.error(f"Validation error: {ve}")
+        raise HTTPException(status_code=422, detail="Invalid request parameters.")
+    tmp_pdf_path, page_count = await prepare_ocr_document(session, file, current_user, ocr_request)
+
+    async def event_stream() -> AsyncIterator[str]:
+        document_type = await classify_pdf(tmp_pdf_path)
+        async for name, event in resumable_ocr_pipeline(
+            tmp_pdf_path,
+            page_count,
+            resolve_text_layer(text_layer),
+            document_type=document_type,
+            stream_tokens=stream_tokens,
+        ):
+            yield f"event: {name}\ndata: {event.model_dump_json()}\n\n"
+
+    return TempPDFStreamingResponse(
+        event_stream(),
+        tmp_pdf_path,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get('/cache/stats', dependencies=[Depends(get_current_active_superuser)])
+async def ocr_cache_stats() -> dict[str, int]:
+    """
+    OCR result cache hit/miss counters and tier sizes.
+    """
+    return ocr_cache.stats()
+
+@router.get('/pipeline/stats', dependencies=[Depends(get_current_active_superuser)])
+async def ocr_pipeline_stats() -> dict[str, int]:
+    """
+    Pages answered from the embedded text layer or Tesseract (hybrid mode) vs sent to vision OCR since startup.
+    """
+    return dict(page_path_counters)
+
+@router.get('/url/stats', dependencies=[Depends(get_current_active_superuser)])
+async def ocr_url_stats() -> dict[str, int]:
+    """
+    Documents downloaded by URL vs answered with 304 Not Modified since startup.
+    """
+    return url_fetcher.stats()
+
+@router.get('/circuit/stats', dependencies=[Depends(get_current_active_superuser)])
+async def ocr_circuit_stats() -> dict[str, str]:
+    """
+    Circuit breaker state (closed, open or half_open) per model deployment.
+    """
+    return rate_limiter.circuit_states()
+
+@router.get('/llm/stats', dependencies=[Depends(get_current_active_superuser)])
+async def ocr_llm_client_stats() -> dict[str, dict[str, Any]]:
+    """
+    Requests, connections, pool waits and latency histogram per shared OpenAI client since startup.
+    """
+    return llm_clients.stats()
+
+def resolve_text_layer(text_layer: Optional[bool]) -> bool:
+    return settings.OCR_TEXT_LAYER_ENABLED if text_layer is None else text_layer
+
+async def prepare_ocr_document(
+    session: SessionDep,
+    file: Optional[UploadFile],
+    current_user: CurrentUser,
+    ocr_request: Optional[OCRRequest] = None,
+) -> Tuple[str, int]:
+    """
+    Check the user's quota, stream the uploaded (or downloaded) PDF to a temporary file and record the extraction.
+
+    Pages are not rendered here; the OCR pipeline renders them on demand with
+    `iter_rendered_pages` so only a bounded window of pages is held in memory.
+
+    Args:
+        session (SessionDep): Database session.
+        file (Optional[UploadFile]): The uploaded PDF file.
+        current_user (CurrentUser): The requesting user.
+        ocr_request (Optional[OCRRequest]): The OCR request containing a PDF URL.
+
+    Returns:
+        Tuple[str, int]: Path of the temporary PDF and its page count. The caller
+        deletes the file with `remove_temp_pdf` once OCR is done.
+
+    Raises:
+        HTTPException: If the quota is exhausted, or the file cannot be opened or has too many pages.
+    """
+    check_extr_quota(session, current_user)
+
+    # Save the PDF to a temporary file
+    print(f"File is {file}")
+    tmp_pdf_path = await save_uploaded_pdf(file, ocr_request)
+    logger.info(f"Saved PDF to temporary file {tmp_pdf_path}.")
+    filename = file.filename if file else url_filename(str(ocr_request.url))
+
+    try:
+        page_count = record_pdf_extr(session, current_user, tmp_pdf_path, filename)
+    except Exception:
+        remove_temp_pdf(tmp_pdf_path)
+        raise
+
+    return tmp_pdf_path, page_count
+
+async def ocr_remote_document(
+    session: SessionDep, url: str, use_text_layer: bool, current_user: CurrentUser
+) -> OCRResponse:
+    """
+    OCR a PDF fetched by URL, reusing the earlier result if the server reports it unchanged.
+
+    Args:
+        session (SessionDep): Database session.
+        url (str): The URL of the PDF.
+        use_text_layer (bool): Use the embedded text of pages where it is good enough.
+        current_user (CurrentUser): The requesting user.
+
+    Returns:
+        OCRResponse: The extracted text and each page's status.
+
+    Raises:
+        HTTPException: If the quota is exhausted, the download fails or OCR fails.
+    """
+    check_extr_quota(session, current_user)
+    document = await url_fetcher.fetch(url, use_text_layer)
+    if document.result is not None:
+        file_extr = ExtrBase(filename=document.filename, pagecount=len(document.result.pages), owner_id=current_user.id)
+        create_extr(extr_in=file_extr, current_user=current_user, session=session)
+        return document.result
+
+    try:
+        page_count = record_pdf_extr(session, current_user, document.path, document.filename)
+        response = await ocr_document(document.path, page_count, use_text_layer)
+    finally:
+        remove_temp_pdf(document.path)
+    await url_fetcher.store_result(document, use_text_layer, response)
+    return response
+
+def check_extr_quota(session: SessionDep, current_user: CurrentUser) -> None:
+    extr_count = read_extr_count(session=session, current_user=current_user)
+    print(f"Extr count is {extr_count}", settings.MAX_EXTR_COUNT)
+    if extr_count > settings.MAX_EXTR_COUNT:
+        logger.warning("OCR request rejected: maximum number of extractions reached.")
+        raise HTTPException(
+            status_code=403,
+            detail="Maximum number of extractions reached. Please subscribe to use further.",
+        )
+
+def record_pdf_extr(session: SessionDep, current_user: CurrentUser, pdf_path: str, filename: str) -> int:
+    page_count = check_page_count(count_pdf_pages(pdf_path))
+    logger.info(f"PDF loaded with {page_count} pages.")
+    file_extr = ExtrBase(filename=filename, pagecount=page_count, owner_id=current_user.id)
+    create_extr(extr_in=file_extr, current_user=current_user, session=session)
+    return page_count
+
+def remove_temp_pdf(tmp_pdf_path: str) -> None:
+    try:
+        os.remove(tmp_pdf_path)
+        logger.info(f"Deleted temporary PDF file {tmp_pdf_path}.")
+    except FileNotFoundError:
+        pass
+
+class TempPDFStreamingResponse(StreamingResponse):
+    """
+    A `StreamingResponse` over a temporary PDF that deletes the file once the
+    response is over: after the last chunk, on an error, or when the client
+    disconnects, even before the stream was started.
+    """
+
+    def __init__(self, content: AsyncIterator[str], tmp_pdf_path: str, **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self.tmp_pdf_path = tmp_pdf_path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            remove_temp_pdf(self.tmp_pdf_path)
+
 def create_extr(
     *, session: SessionDep, current_user: CurrentUser, extr_in: ExtrBase
 ) -> Any:
@@ -0,0 +1,144 @@
+import os
+import uuid
+from typing import Any, Optional
+
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import func, select
+
+from app.api.deps import CurrentUser, SessionDep
+from app.api.routes.extractorgpt import create_extr, read_extr_count
+from app.core.config import settings
+from app.core.uploads import check_page_count, save_upload
+from app.gptocr.utilityFunction import count_pdf_pages
+from app.jobs.handlers import HANDLERS
+from app.jobs.queue import FINAL_STATUSES, enqueue_job
+from app.models import (
+    ExtrBase,
+    ExtrJob,
+    ExtrJobPublic,
+    ExtrJobResult,
+    ExtrJobResultPublic,
+    ExtrJobsPublic,
+)
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.post("/", response_model=ExtrJobPublic, status_code=202)
+async def create_job(
+    session: SessionDep,
+    current_user: CurrentUser,
+    file: UploadFile = File(...),
+    kind: str = "gptocr",
+    text_layer: Optional[bool] = None,
+) -> Any:
+    """
+    Queue an extraction job.
+
+    The upload is stored under `JOB_STORAGE_DIR` and a worker
+    (`python -m app.jobs.worker`) runs the extractor; poll `GET /jobs/{id}`
+    and fetch the output from `GET /jobs/{id}/result`. `kind` selects the
+    extractor: gptocr, google, tesseract or tesseract_pp.
+    """
+    if kind not in HANDLERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown job kind. Use one of: {', '.join(HANDLERS)}.",
+        )
+    if file.content_type not in ["application/pdf", "image/jpeg", "image/png"]:
+        raise HTTPException(status_code=400, detail="Uploaded file is not a PDF or image.")
+    if kind == "gptocr" and read_extr_count(session=session, current_user=current_user) > settings.MAX_EXTR_COUNT:
+        raise HTTPException(
+            status_code=403,
+            detail="Maximum number of extractions reached. Please subscribe to use further.",
+        )
+
+    job_id = uuid.uuid4()
+    os.makedirs(settings.JOB_STORAGE_DIR, exist_ok=True)
+    extension = os.path.splitext(file.filename or "")[1] or ".pdf"
+    file_path = os.path.join(settings.JOB_STORAGE_DIR, f"{job_id}{extension}")
+    try:
+        await save_upload(file, file_path)
+        page_count = check_page_count(await run_in_threadpool(count_pdf_pages, file_path))
+        if kind == "gptocr":
+            file_extr = ExtrBase(filename=file.filename, pagecount=page_count, owner_id=current_user.id)
+            create_extr(extr_in=file_extr, current_user=current_user, session=session)
+        return enqueue_job(
+            session,
+            owner_id=current_user.id,
+            kind=kind,
+            filename=file.filename or file_path,
+            file_path=file_path,
+            options={"text_layer": text_layer},
+            job_id=job_id,
+        )
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+
+@router.get("/", response_model=ExtrJobsPublic)
+def read_jobs(
+    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+) -> Any:
+    """
+    Retrieve extraction jobs, newest first.
+    """
+    count_statement = select(func.count()).select_from(ExtrJob).where(ExtrJob.parent_id.is_(None))
+    statement = select(ExtrJob).where(ExtrJob.parent_id.is_(None))
+    if not current_user.is_superuser:
+        count_statement = count_statement.where(ExtrJob.owner_id == current_user.id)
+        statement = statement.where(ExtrJob.owner_id == current_user.id)
+    count = session.exec(count_statement).one()
+    statement = statement.order_by(ExtrJob.created_at.desc()).offset(skip).limit(limit)
+    jobs = session.exec(statement).all()
+    return ExtrJobsPublic(data=jobs, count=count)
+
+
+@router.get("/{id}", response_model=ExtrJobPublic)
+def read_job(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+    """
+    Get job status by ID. A large document is split into page-range shards
+    while it runs; `shards_succeeded` of `shards_total` shows its progress.
+    """
+    job = get_own_job(session, current_user, id)
+    shard_counts = dict(
+        session.exec(
+            select(ExtrJob.status, func.count()).where(ExtrJob.parent_id == job.id).group_by(ExtrJob.status)
+        ).all()
+    )
+    return ExtrJobPublic.model_validate(
+        job,
+        update={
+            "shards_total": sum(shard_counts.values()),
+            "shards_succeeded": shard_counts.get("succeeded", 0),
+        },
+    )
+
+
+@router.get("/{id}/result", response_model=ExtrJobResultPublic)
+def read_job_result(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+    """
+    Get the output of a finished job; a failed job returns its error.
+    """
+    job = get_own_job(session, current_user, id)
+    if job.status not in FINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}.")
+    job_result = session.get(ExtrJobResult, job.id)
+    return ExtrJobResultPublic(
+        job_id=job.id,
+        status=job.status,
+        result=job_result.result if job_result else None,
+        error=job.error,
+    )
+
+
+def get_own_job(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> ExtrJob:
+    job = session.get(ExtrJob, id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not current_user.is_superuser and (job.owner_id != current_user.id):
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+    return job
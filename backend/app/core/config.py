@@ -1,4 +1,6 @@
+import os
 import secrets
+import tempfile
 import warnings
 from typing import Annotated, Any, Literal
 
@@ -37,9 +39,167 @@ class Settings(BaseSettings):
     FRONTEND_HOST: str = "http://localhost:5173"
     ENVIRONMENT: Literal["local", "staging", "production"] = "local"
     MAX_EXTR_COUNT: int = 5
+    # Uploads are spooled to disk and copied in UPLOAD_CHUNK_BYTES chunks.
+    # Bodies over MAX_UPLOAD_BYTES and files that are not PDF/JPEG/PNG are
+    # rejected while they stream in; PDFs over MAX_PDF_PAGES once saved.
+    MAX_UPLOAD_BYTES: int = 250 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    MAX_PDF_PAGES: int = 2000
+    # Documents fetched by URL share one connection pool; at most
+    # URL_FETCH_MAX_PER_HOST downloads run against a host at a time and
+    # each is capped at MAX_UPLOAD_BYTES. Only http(s) URLs of public hosts
+    # are fetched, on every redirect too, unless URL_FETCH_ALLOW_PRIVATE_HOSTS.
+    URL_FETCH_MAX_CONNECTIONS: int = 50
+    URL_FETCH_MAX_PER_HOST: int = 4
+    URL_FETCH_CONNECT_TIMEOUT: float = 10.0
+    URL_FETCH_TIMEOUT: float = 60.0
+    URL_FETCH_MAX_REDIRECTS: int = 5
+    URL_FETCH_ALLOW_PRIVATE_HOSTS: bool = False
     MAX_CONCURRENT_PDF_CONVERSION: int = 4
+    # Worker processes in the shared render pool (0 = one per CPU) and the
+    # largest page range handed to one worker task.
+    PDF_RENDER_POOL_SIZE: int = 0
+    PDF_RENDER_CHUNK_PAGES: int = 16
+    # Tesseract extraction renders and recognizes pages in its own process
+    # pool (0 = one worker per CPU), at most TESSERACT_CHUNK_PAGES per task.
+    TESSERACT_POOL_SIZE: int = 0
+    TESSERACT_CHUNK_PAGES: int = 4
+    TESSERACT_DPI: int = 200
+    TESSERACT_LANG: str = "eng"
+    # "tesserocr" keeps one Tesseract instance per worker (pip install
+    # tesserocr, needs libtesseract), "pytesseract" runs the tesseract binary
+    # per page; "auto" prefers tesserocr when it is installed.
+    TESSERACT_BACKEND: str = "auto"
+    # The Tesseract extractors summarize the whole document into JSON with
+    # SUMMARY_MODEL: the page text is split into chunks of at most
+    # SUMMARY_CHUNK_TOKENS, summarized SUMMARY_MAX_CONCURRENT at a time over
+    # the shared OpenAI client, and the chunk summaries merged into one.
+    SUMMARY_MODEL: str = "gpt-4o-mini"
+    SUMMARY_CHUNK_TOKENS: int = 6000
+    SUMMARY_MAX_CONCURRENT: int = 8
+    SUMMARY_CHARACTER_LIMIT: int = 500
+    SUMMARY_MAX_OUTPUT_TOKENS: int = 1000
+    # Streaming OCR pipeline: page ranges rendered ahead of OCR, and batches
+    # waiting for a free OCR slot. Together they cap pages held in memory.
+    OCR_PIPELINE_RENDER_AHEAD: int = 4
+    OCR_PIPELINE_QUEUE_DEPTH: int = 8
+    # Most pages sent in one OCR request. With more than one, pages are packed
+    # into requests by estimated image tokens and expected output tokens
+    # (ink coverage x OCR_OUTPUT_TOKENS_PER_INK) and the answer is split back
+    # into pages on its "Page N:" markers.
     BATCH_SIZE: int = 1
+    OCR_BATCH_MAX_IMAGE_TOKENS: int = 4000
+    OCR_BATCH_MAX_OUTPUT_TOKENS: int = 2500
+    OCR_OUTPUT_TOKENS_PER_INK: int = 12000
+    OCR_DEFAULT_PAGE_OUTPUT_TOKENS: int = 800
     OPENAI_DEPLOYMENT_ID: str ="gpt-4o"
+    # Shared OpenAI clients (app.core.llmclients) used by every extractor;
+    # HTTP/2 needs the h2 package and falls back to HTTP/1.1 without it
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_EXPIRY: float = 30.0
+    OPENAI_CONNECT_TIMEOUT: float = 10.0
+    OPENAI_REQUEST_TIMEOUT: float = 120.0
+    # Retries inside the SDK bypass the rate limiter and circuit breaker;
+    # retry_with_backoff (OCR_RETRY_MAX_ATTEMPTS) retries instead
+    OPENAI_MAX_RETRIES: int = 0
+    OPENAI_HTTP2: bool = True
+    # Request/token budgets per minute, per deployment, e.g.
+    # OPENAI_RATE_LIMITS='{"gpt-4o": {"rpm": 5000, "tpm": 800000}}'
+    OPENAI_RPM_LIMIT: int = 500
+    OPENAI_TPM_LIMIT: int = 30000
+    OPENAI_RATE_LIMITS: dict[str, dict[str, int]] = {}
+    OCR_MAX_CONCURRENT_REQUESTS: int = 16
+    OCR_MAX_OUTPUT_TOKENS: int = 4000
+    # Attempts per OCR request on rate limiting, timeouts and provider errors,
+    # with jittered exponential backoff (Retry-After wins when it is sent)
+    OCR_RETRY_MAX_ATTEMPTS: int = 5
+    OCR_RETRY_BASE_DELAY: float = 1.0
+    OCR_RETRY_MAX_DELAY: float = 60.0
+    # Fail fast for OCR_CIRCUIT_RESET_SECONDS after this many consecutive
+    # provider failures on a deployment
+    OCR_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    OCR_CIRCUIT_RESET_SECONDS: float = 30.0
+    PDF_RENDER_ZOOM: int = 2
+    # Page images sent to the model: format (png, jpeg or webp), lossy quality,
+    # grayscale rendering, and edge limits matching the vision tiling (0 = no
+    # limit). OCR_IMAGE_DETAIL is low, high or adaptive (low when a page fits
+    # in one 512 px tile).
+    OCR_IMAGE_FORMAT: Literal["png", "jpeg", "webp"] = "png"
+    OCR_IMAGE_QUALITY: int = 80
+    OCR_IMAGE_GRAYSCALE: bool = False
+    OCR_IMAGE_MAX_LONG_EDGE: int = 2048
+    OCR_IMAGE_MAX_SHORT_EDGE: int = 768
+    OCR_IMAGE_DETAIL: Literal["low", "high", "adaptive"] = "adaptive"
+    # Use the PDF's own text layer instead of vision OCR for pages with enough
+    # clean embedded text and little raster content (per request: ?text_layer=).
+    OCR_TEXT_LAYER_ENABLED: bool = True
+    OCR_TEXT_LAYER_MIN_CHARS: int = 100
+    OCR_TEXT_LAYER_MAX_IMAGE_COVERAGE: float = 0.5
+    # Hybrid OCR: read each page with Tesseract (TESSERACT_BACKEND, _DPI, _LANG)
+    # in the render workers first, and only send it to the vision model when
+    # the length-weighted mean word confidence (0-100) is below
+    # OCR_HYBRID_MIN_CONFIDENCE or less than OCR_HYBRID_MIN_COVERAGE of the
+    # page's ink lies inside recognized words. Accepted pages are plain text,
+    # not markdown.
+    OCR_HYBRID_ENABLED: bool = False
+    OCR_HYBRID_MIN_CONFIDENCE: float = 85.0
+    OCR_HYBRID_MIN_COVERAGE: float = 0.8
+    # Skip pages whose ink coverage (fraction of dark pixels) is at most
+    # OCR_BLANK_PAGE_MAX_INK, and reuse the result of an earlier page in the
+    # same document whose 256 bit perceptual hash is within
+    # OCR_DUPLICATE_MAX_DISTANCE bits and whose 192x144 thumbnail differs by at
+    # most OCR_DUPLICATE_MAX_PIXEL_DELTA gray levels in every cell.
+    OCR_SKIP_BLANK_PAGES: bool = True
+    OCR_BLANK_PAGE_MAX_INK: float = 0.001
+    OCR_DEDUPLICATE_PAGES: bool = True
+    OCR_DUPLICATE_MAX_DISTANCE: int = 8
+    OCR_DUPLICATE_MAX_PIXEL_DELTA: int = 6
+    # Classify each document from a small image of its first page with a cheap
+    # model, then OCR it with a short prompt for that document type instead of
+    # the general one.
+    OCR_CLASSIFY_DOCUMENTS: bool = True
+    OCR_CLASSIFIER_MODEL: str = "gpt-4o-mini"
+    OCR_CLASSIFIER_IMAGE_EDGE: int = 512
+    # Offline bulk OCR through the Batch API (python -m app.gptocr.bulkingest):
+    # input files are split to stay under the API's per-batch limits.
+    OCR_BULK_COMPLETION_WINDOW: str = "24h"
+    OCR_BULK_MAX_REQUESTS_PER_BATCH: int = 50000
+    OCR_BULK_MAX_BATCH_FILE_BYTES: int = 190 * 1024 * 1024
+    OCR_BULK_POLL_INTERVAL: float = 60.0
+    # OCR result cache; set OCR_CACHE_DIR to an empty string to keep it in memory only
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_MEMORY_MAX_BYTES: int = 64 * 1024 * 1024
+    OCR_CACHE_DIR: str = os.path.join(tempfile.gettempdir(), "ocr-cache")
+    OCR_CACHE_DISK_MAX_BYTES: int = 1024 * 1024 * 1024
+    # Per-page OCR progress is saved in the database as pages finish, so a
+    # resubmitted upload or a restarted job resumes at the missing pages.
+    # Checkpoints of a finished document are dropped; those of an abandoned
+    # one expire after OCR_CHECKPOINT_TTL_HOURS.
+    OCR_CHECKPOINT_ENABLED: bool = True
+    OCR_CHECKPOINT_TTL_HOURS: float = 72.0
+
+    # Asynchronous extraction jobs, run by `python -m app.jobs.worker`.
+    # JOB_STORAGE_DIR holds the uploads and must be shared by the API and the
+    # workers. Each worker process runs JOB_WORKER_CONCURRENCY jobs at once; a
+    # running job whose heartbeat is older than JOB_STALE_AFTER seconds is
+    # claimed again, up to JOB_MAX_ATTEMPTS times. A job that failed with a
+    # retryable error waits for exponential backoff with jitter from
+    # JOB_RETRY_BASE_DELAY up to JOB_RETRY_MAX_DELAY seconds, or the error's
+    # Retry-After; failures while the OCR circuit is open use no attempt.
+    JOB_STORAGE_DIR: str = os.path.join(tempfile.gettempdir(), "extr-jobs")
+    JOB_WORKER_CONCURRENCY: int = 4
+    JOB_POLL_INTERVAL: float = 1.0
+    JOB_HEARTBEAT_INTERVAL: float = 15.0
+    JOB_STALE_AFTER: float = 120.0
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BASE_DELAY: float = 30.0
+    JOB_RETRY_MAX_DELAY: float = 600.0
+    # GPT OCR jobs longer than JOB_SHARD_PAGES are split into page-range shards
+    # that any worker, on any host, claims and runs like a job of its own; the
+    # worker that finishes the last shard merges the results. 0 disables it.
+    # Workers on several hosts need JOB_STORAGE_DIR on shared storage.
+    JOB_SHARD_PAGES: int = 50
 
     BACKEND_CORS_ORIGINS: Annotated[
         list[AnyUrl] | str, BeforeValidator(parse_cors)
@@ -0,0 +1,306 @@
+import bisect
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------
+# Client Metrics
+# ----------------------------
+
+# Upper bounds (ms) of the request latency histogram buckets; the last bucket is unbounded.
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class ClientMetrics:
+    """
+    Counters of one HTTP client, per HTTP request (retries count separately).
+
+    Latency runs from handing the request to the transport until its
+    response body is closed, so streamed answers count in full. Pool wait
+    is the time before the request got a connection: until a new
+    connection starts to connect, or until an idle one starts to send.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.pool_waits = 0
+        self.pool_wait_ms = 0.0
+        self.max_pool_wait_ms = 0.0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def started(self) -> None:
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finished(self, started: float, failed: bool = False) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.in_flight -= 1
+            self.errors += failed
+            self.latency_counts[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def connection_acquired(self, started: float) -> None:
+        wait_ms = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.pool_waits += 1
+            self.pool_wait_ms += wait_ms
+            self.max_pool_wait_ms = max(self.max_pool_wait_ms, wait_ms)
+
+    def traced(self, event: str) -> None:
+        with self.lock:
+            if event == "connection.connect_tcp.started":
+                self.new_connections += 1
+            elif event == "connection.start_tls.started":
+                self.tls_handshakes += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "new_connections": self.new_connections,
+                "tls_handshakes": self.tls_handshakes,
+                "mean_pool_wait_ms": round(self.pool_wait_ms / self.pool_waits, 2) if self.pool_waits else 0.0,
+                "max_pool_wait_ms": round(self.max_pool_wait_ms, 2),
+                "latency_ms": {
+                    f"le_{bound}" if bound else "inf": count
+                    for bound, count in zip((*LATENCY_BUCKETS_MS, None), self.latency_counts)
+                },
+            }
+
+
+class RequestTrace:
+    """httpcore `trace` extension of one request: records when it got a connection."""
+
+    def __init__(self, metrics: ClientMetrics, started: float, inner: Optional[Callable] = None):
+        self.metrics = metrics
+        self.started = started
+        self.inner = inner
+        self.acquired = False
+
+    def record(self, event: str) -> None:
+        self.metrics.traced(event)
+        if not self.acquired and event in (
+            "connection.connect_tcp.started",
+            "http11.send_request_headers.started",
+            "http2.send_request_headers.started",
+        ):
+            self.acquired = True
+            self.metrics.connection_acquired(self.started)
+
+    def __call__(self, event: str, info: Dict[str, Any]) -> None:
+        self.record(event)
+        if self.inner is not None:
+            self.inner(event, info)
+
+
+class AsyncRequestTrace(RequestTrace):
+    async def __call__(self, event: str, info: Dict[str, Any]) -> None:
+        self.record(event)
+        if self.inner is not None:
+            await self.inner(event, info)
+
+
+class MeteredStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, done: Callable[[], None]):
+        self.stream = stream
+        self.done = done
+
+    def __iter__(self):
+        yield from self.stream
+
+    def close(self) -> None:
+        try:
+            self.stream.close()
+        finally:
+            self.done()
+
+
+class AsyncMeteredStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, done: Callable[[], None]):
+        self.stream = stream
+        self.done = done
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            self.done()
+
+
+class MeteredTransport(httpx.BaseTransport):
+    """Wraps a transport and records every request in `metrics`."""
+
+    def __init__(self, transport: httpx.BaseTransport, metrics: ClientMetrics):
+        self.transport = transport
+        self.metrics = metrics
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        request.extensions["trace"] = RequestTrace(self.metrics, started, request.extensions.get("trace"))
+        self.metrics.started()
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            self.metrics.finished(started, failed=True)
+            raise
+        response.stream = MeteredStream(
+            response.stream, lambda: self.metrics.finished(started, failed=response.status_code >= 500)
+        )
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncMeteredTransport(httpx.AsyncBaseTransport):
+    """Wraps an async transport and records every request in `metrics`."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, metrics: ClientMetrics):
+        self.transport = transport
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        request.extensions["trace"] = AsyncRequestTrace(self.metrics, started, request.extensions.get("trace"))
+        self.metrics.started()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self.metrics.finished(started, failed=True)
+            raise
+        response.stream = AsyncMeteredStream(
+            response.stream, lambda: self.metrics.finished(started, failed=response.status_code >= 500)
+        )
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+# ----------------------------
+# LLM Client Provider
+# ----------------------------
+
+def http2_available() -> bool:
+    if not settings.OPENAI_HTTP2:
+        return False
+    try:
+        import h2  # type: ignore  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class LLMClients:
+    """
+    Owns the process-wide OpenAI clients: one AsyncOpenAI for the event loop
+    and one OpenAI for code that runs in threads.
+
+    Each keeps a single keep-alive connection pool (HTTP/2 when
+    `OPENAI_HTTP2` is set and the h2 package is installed) with the
+    `OPENAI_*` limits, timeouts and retry policy, so requests reuse
+    connections instead of paying a TCP and TLS handshake each. Clients
+    are created on first use, or by `start` at startup, and closed by
+    `close` at shutdown; a later use creates them again. Every request is
+    recorded in the client's `ClientMetrics`, see `stats`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._sync_client: Optional[OpenAI] = None
+        self.metrics: Dict[str, ClientMetrics] = {"async": ClientMetrics(), "sync": ClientMetrics()}
+
+    def client_options(self) -> Dict[str, Any]:
+        return {
+            "timeout": httpx.Timeout(settings.OPENAI_REQUEST_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT),
+            "max_retries": settings.OPENAI_MAX_RETRIES,
+        }
+
+    def transport_options(self) -> Dict[str, Any]:
+        return {
+            "http2": http2_available(),
+            "limits": httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+            ),
+        }
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        with self.lock:
+            if self._async_client is None:
+                transport = AsyncMeteredTransport(
+                    httpx.AsyncHTTPTransport(**self.transport_options()), self.metrics["async"]
+                )
+                self._async_client = AsyncOpenAI(
+                    **self.client_options(), http_client=DefaultAsyncHttpxClient(transport=transport)
+                )
+                logger.info(f"Created async OpenAI client (HTTP/2: {http2_available()}).")
+            return self._async_client
+
+    @property
+    def sync_client(self) -> OpenAI:
+        with self.lock:
+            if self._sync_client is None:
+                transport = MeteredTransport(httpx.HTTPTransport(**self.transport_options()), self.metrics["sync"])
+                self._sync_client = OpenAI(**self.client_options(), http_client=DefaultHttpxClient(transport=transport))
+                logger.info(f"Created sync OpenAI client (HTTP/2: {http2_available()}).")
+            return self._sync_client
+
+    def start(self) -> None:
+        """
+        Create both clients. Called on application startup.
+        """
+        self.async_client
+        self.sync_client
+
+    async def close(self) -> None:
+        """
+        Close both clients' connection pools. Called on application shutdown.
+        """
+        with self.lock:
+            async_client, self._async_client = self._async_client, None
+            sync_client, self._sync_client = self._sync_client, None
+        if async_client is not None:
+            await async_client.close()
+        if sync_client is not None:
+            sync_client.close()
+        logger.info("Closed OpenAI client connection pools.")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Request metrics of each client.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per client ("async", "sync"): requests, errors,
+            requests in flight and the most at once, new connections and TLS
+            handshakes, pool wait and a latency histogram, since startup.
+        """
+        return {name: metrics.snapshot() for name, metrics in self.metrics.items()}
+
+# Process-wide OpenAI clients, closed with the application
+llm_clients = LLMClients()
@@ -0,0 +1,240 @@
+import logging
+import os
+import tempfile
+from typing import BinaryIO, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the file types the extractors accept
+FILE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+)
+# PDF readers accept junk before the header as long as it starts in the first KiB
+PDF_HEADER = b"%PDF-"
+SNIFF_BYTES = 1024
+# Room for multipart boundaries, part headers and small form fields
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """
+    Detect a PDF, JPEG or PNG from its first bytes.
+
+    Args:
+        head (bytes): Up to `SNIFF_BYTES` leading bytes of the file.
+
+    Returns:
+        Optional[str]: The content type, or None if the file is none of them.
+    """
+    for signature, content_type in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if PDF_HEADER in head[:SNIFF_BYTES]:
+        return "application/pdf"
+    return None
+
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Upload exceeds the limit of {settings.MAX_UPLOAD_BYTES // (1024 * 1024)} MB.",
+    )
+
+
+class UploadInspector:
+    """
+    Follows a multipart body as it streams in and rejects it as soon as a
+    file part is too large or does not start like a PDF, JPEG or PNG.
+    """
+
+    def __init__(self, boundary: bytes):
+        self.parser = MultipartParser(
+            boundary,
+            {
+                "on_part_begin": self.on_part_begin,
+                "on_part_data": self.on_part_data,
+                "on_part_end": self.on_part_end,
+                "on_header_field": self.on_header_field,
+                "on_header_value": self.on_header_value,
+                "on_header_end": self.on_header_end,
+            },
+        )
+        self.received = 0
+        self.header_name = b""
+        self.header_value = b""
+        self.on_part_begin()
+
+    def feed(self, chunk: bytes) -> None:
+        self.received += len(chunk)
+        if self.received > settings.MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+            raise upload_too_large()
+        self.parser.write(chunk)
+
+    def on_part_begin(self) -> None:
+        self.is_file = False
+        self.head = b""
+        self.checked = False
+        self.part_size = 0
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self.header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self.header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self.header_name.lower() == b"content-disposition":
+            _, options = parse_options_header(self.header_value)
+            self.is_file = b"filename" in options
+        self.header_name = b""
+        self.header_value = b""
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self.is_file:
+            return
+        self.part_size += end - start
+        if self.part_size > settings.MAX_UPLOAD_BYTES:
+            raise upload_too_large()
+        if not self.checked:
+            self.head += data[start : min(end, start + SNIFF_BYTES)]
+            if len(self.head) >= SNIFF_BYTES:
+                self.check_head()
+
+    def on_part_end(self) -> None:
+        if self.is_file and not self.checked and self.head:
+            self.check_head()
+
+    def check_head(self) -> None:
+        self.checked = True
+        if sniff_content_type(self.head) is None:
+            logger.warning("Rejected upload that is not a PDF, JPEG or PNG.")
+            raise HTTPException(status_code=400, detail="Uploaded file is not a PDF/JPEG/PNG.")
+
+
+class UploadLimitMiddleware:
+    """
+    Enforce `MAX_UPLOAD_BYTES` and the accepted file types while multipart
+    uploads stream in, before the route has read the body.
+
+    A declared `Content-Length` over the limit is answered with 413 without
+    reading the body at all. Otherwise every chunk is passed through an
+    `UploadInspector`; when it objects, the `HTTPException` it raises ends
+    the body parse and the route's exception handler answers with it, and
+    the rest of the body is never read.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        content_type, params = parse_options_header(headers.get("content-type", ""))
+        boundary = params.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+            error = upload_too_large()
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        inspector = UploadInspector(boundary)
+
+        async def inspected_receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                inspector.feed(message.get("body", b""))
+            return message
+
+        await self.app(scope, inspected_receive, send)
+
+
+# ----------------------------
+# Saving Uploads
+# ----------------------------
+
+def copy_upload(source: BinaryIO, path: str) -> int:
+    source.seek(0)
+    size = 0
+    with open(path, "wb") as out:
+        while chunk := source.read(settings.UPLOAD_CHUNK_BYTES):
+            out.write(chunk)
+            size += len(chunk)
+    return size
+
+
+async def save_upload(file: UploadFile, path: str) -> int:
+    """
+    Copy an upload to `path` in `UPLOAD_CHUNK_BYTES` chunks, off the event loop.
+
+    The multipart parser has already spooled the upload to a temporary file,
+    so at most one chunk of it is held in memory.
+
+    Args:
+        file (UploadFile): The uploaded file.
+        path (str): Destination path.
+
+    Returns:
+        int: Size of the upload in bytes.
+
+    Raises:
+        HTTPException: If the upload is empty.
+    """
+    size = await run_in_threadpool(copy_upload, file.file, path)
+    if not size:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    logger.info(f"Saved upload {file.filename} ({size} bytes) to {path}.")
+    return size
+
+
+async def spool_upload(file: UploadFile, suffix: str = ".pdf") -> str:
+    """
+    Save an upload to a new temporary file, see `save_upload`.
+
+    Returns:
+        str: Path of the temporary file; the caller deletes it.
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        path = tmp_file.name
+    try:
+        await save_upload(file, path)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return path
+
+
+def check_page_count(page_count: int) -> int:
+    """
+    Reject documents over `MAX_PDF_PAGES` before any page is rendered.
+
+    Returns:
+        int: The page count.
+
+    Raises:
+        HTTPException: 413 if the document has too many pages.
+    """
+    if page_count > settings.MAX_PDF_PAGES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Document has {page_count} pages; the limit is {settings.MAX_PDF_PAGES}.",
+        )
+    return page_count
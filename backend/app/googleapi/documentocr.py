@@ -3,10 +3,12 @@ from typing import Optional
 from google.api_core.client_options import ClientOptions # type: ignore
 #from google.auth.credentials import Credentials # type: ignore
 from google.cloud import documentai  # type: ignore
-from openai import OpenAI # type: ignore
 import re
 import json
 
+from app.core.config import settings
+from app.core.llmclients import llm_clients
+
 # TODO(developer): Uncomment these variables before running the sample.
 project_id = "strategic-guru-444919-s3"
 location = "us" # Format is "us" or "eu"
@@ -109,14 +111,14 @@ def process_document_sample(
 #process_document_sample(project_id,location,processor_id,file_path,mime_type,field_mask)
 
 def summarize_content(content, character_limit=500):
-        client = OpenAI()
+        client = llm_clients.sync_client
         prompt = (
             f"You are an AI assistant tasked with extracting relavant information only" # from the utility bill. "
             f"Please provide a concise summary in {character_limit} characters or less in JSON form. Reply with only the answer in JSON form and include no other commentary:"
         )
         try:
             response = client.chat.completions.create(
-                model="gpt-4o-mini",
+                model=settings.SUMMARY_MODEL,
                 messages=[
                     {"role": "system", "content": prompt},
                     {"role": "user", "content": content}]
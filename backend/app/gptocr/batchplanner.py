@@ -0,0 +1,113 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.gptocr.ratelimiter import DEFAULT_IMAGE_TOKENS, estimate_image_tokens, image_dimensions
+from app.gptocr.renderpool import SharedPage
+from app.gptocr.utilityFunction import PageImage
+
+# ----------------------------
+# Token Budget Batch Planning
+# ----------------------------
+
+# A `Page N:` marker at the start of a line, as requested by `build_ocr_messages`,
+# optionally dressed up as a markdown heading or bold text by the model.
+PAGE_MARKER = re.compile(r"^[ \t#>*_]*Page[ \t]+(\d+)[ \t]*[*_]*:", re.MULTILINE)
+
+
+def page_token_estimate(image: PageImage) -> Tuple[int, int]:
+    """
+    Estimate the image tokens a page adds to a request and the output tokens it will produce.
+
+    Output is estimated from the page's ink coverage, which render workers
+    measure for every page; denser pages transcribe to more text.
+
+    Args:
+        image (PageImage): A data URL or a shared page handle.
+
+    Returns:
+        Tuple[int, int]: (image tokens, output tokens).
+    """
+    output_tokens = settings.OCR_DEFAULT_PAGE_OUTPUT_TOKENS
+    if isinstance(image, SharedPage):
+        image_tokens = image.image_tokens or DEFAULT_IMAGE_TOKENS
+        if image.ink is not None:
+            output_tokens = max(100, int(image.ink * settings.OCR_OUTPUT_TOKENS_PER_INK))
+    else:
+        size = image_dimensions(image)
+        image_tokens = estimate_image_tokens(*size) if size else DEFAULT_IMAGE_TOKENS
+    return image_tokens, output_tokens
+
+
+class BatchPlanner:
+    """
+    Packs pages, in document order, into OCR requests by estimated token budget.
+
+    A batch is closed when the next page would take it past `BATCH_SIZE`
+    pages, `OCR_BATCH_MAX_IMAGE_TOKENS` of images or
+    `OCR_BATCH_MAX_OUTPUT_TOKENS` of expected output, so small, sparse pages
+    share a request while dense pages go alone and no request risks running
+    into `OCR_MAX_OUTPUT_TOKENS`.
+    """
+
+    def __init__(self):
+        self.batch: List[Tuple[int, PageImage]] = []
+        self.image_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, page_num: int, image: PageImage) -> Optional[List[Tuple[int, PageImage]]]:
+        """
+        Add the next page.
+
+        Args:
+            page_num (int): Page number.
+            image (PageImage): The page image.
+
+        Returns:
+            Optional[List[Tuple[int, PageImage]]]: A batch that is now complete, if any.
+        """
+        image_tokens, output_tokens = page_token_estimate(image)
+        completed = None
+        if self.batch and (
+            len(self.batch) >= settings.BATCH_SIZE
+            or self.image_tokens + image_tokens > settings.OCR_BATCH_MAX_IMAGE_TOKENS
+            or self.output_tokens + output_tokens > settings.OCR_BATCH_MAX_OUTPUT_TOKENS
+        ):
+            completed = self.flush()
+        self.batch.append((page_num, image))
+        self.image_tokens += image_tokens
+        self.output_tokens += output_tokens
+        return completed
+
+    def flush(self) -> Optional[List[Tuple[int, PageImage]]]:
+        """Return the pages collected so far as a batch, if there are any."""
+        batch, self.batch = self.batch, []
+        self.image_tokens = self.output_tokens = 0
+        return batch or None
+
+
+def split_batch_text(text: str, page_nums: List[int]) -> Optional[Dict[int, str]]:
+    """
+    Split a multi-page OCR answer into per-page texts on its `Page N:` markers.
+
+    The split is only trusted when the markers name exactly the batch's pages,
+    once each and in order, and nothing but whitespace precedes the first one.
+    Each page's text keeps its marker line, as a single-page answer would.
+
+    Args:
+        text (str): The model's answer for the batch.
+        page_nums (List[int]): The batch's page numbers, in request order.
+
+    Returns:
+        Optional[Dict[int, str]]: Text by page number, or None if the answer cannot be split reliably.
+    """
+    markers = list(PAGE_MARKER.finditer(text))
+    if [int(marker.group(1)) for marker in markers] != page_nums:
+        return None
+    if text[: markers[0].start()].strip():
+        return None
+    bounds = [marker.start() for marker in markers] + [len(text)]
+    return {
+        page_num: text[start:end].strip().rstrip("-").strip()
+        for page_num, start, end in zip(page_nums, bounds, bounds[1:])
+    }
@@ -0,0 +1,391 @@
+"""
+Offline bulk OCR of archived PDFs through the OpenAI Batch API.
+
+Usage:
+    python -m app.gptocr.bulkingest run --workdir /var/lib/ocr-bulk /archive/2023
+    python -m app.gptocr.bulkingest prepare --workdir /var/lib/ocr-bulk /archive/2023
+    python -m app.gptocr.bulkingest submit --workdir /var/lib/ocr-bulk
+    python -m app.gptocr.bulkingest collect --workdir /var/lib/ocr-bulk [--wait]
+
+`prepare` renders every page and writes one chat completion request per page
+to JSONL input files, `submit` uploads them and creates a batch for each,
+and `collect` downloads finished batches and writes each document's pages to
+`results/<document id>.json` in the work directory. As in the interactive
+pipeline, each document is first classified (one small interactive request
+when `OCR_CLASSIFY_DOCUMENTS` is on) to pick its prompt, and pages with a
+usable text layer or no ink are answered without a request. Results also go
+into the OCR cache under the same keys as interactive requests, and pages
+that are already cached are answered during `prepare` without a request. Pages that
+fail or expire are dropped from the run's pending set, so running `prepare`
+again on the same input queues exactly the pages that still lack a result.
+PDFs that cannot be rendered are skipped and listed under `failed` in the
+manifest until a later `prepare` succeeds.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.gptocr.logger import logger
+from app.gptocr.model.gptmodel import BulkManifest, BulkShard
+from app.gptocr.ocrbatchprocess import BLANK_PAGE_TEXT, classify_pdf
+from app.gptocr.ocrcache import ocr_cache
+from app.gptocr.ocrservice import COMPLETION_OPTIONS, ocr_service
+from app.gptocr.renderpool import BlankPage, TextLayerPage, release_pages, render_pool
+from app.gptocr.utilityFunction import convert_pdf_to_images_pymupdf, encode_images
+
+# ----------------------------
+# Bulk OCR through the Batch API
+# ----------------------------
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Batch statuses after which no more output will appear
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def document_id(pdf_path: str) -> str:
+    """Content hash of a PDF, so copies of the same file share one result."""
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def find_pdfs(paths: List[str]) -> List[str]:
+    """Expand files and directories (recursively) into a sorted list of PDF paths."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+class ShardWriter:
+    """
+    Writes batch requests to JSONL files, starting a new file before one
+    would exceed `OCR_BULK_MAX_REQUESTS_PER_BATCH` requests or
+    `OCR_BULK_MAX_BATCH_FILE_BYTES` bytes.
+    """
+
+    def __init__(self, directory: str, first_index: int):
+        self.directory = directory
+        self.index = first_index
+        self.shards: List[BulkShard] = []
+        self.file = None
+        self.size = 0
+
+    def write(self, custom_id: str, line: bytes) -> None:
+        if self.file is not None and (
+            len(self.shards[-1].custom_ids) >= settings.OCR_BULK_MAX_REQUESTS_PER_BATCH
+            or self.size + len(line) > settings.OCR_BULK_MAX_BATCH_FILE_BYTES
+        ):
+            self.close()
+        if self.file is None:
+            path = os.path.join(self.directory, f"batch-{self.index:05d}.jsonl")
+            self.index += 1
+            self.file = open(path, "wb")
+            self.size = 0
+            self.shards.append(BulkShard(path=path, custom_ids=[]))
+        self.file.write(line)
+        self.size += len(line)
+        self.shards[-1].custom_ids.append(custom_id)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class BulkRun:
+    """
+    A bulk OCR run and its work directory: the manifest, the JSONL input
+    files and the per-document results.
+
+    Args:
+        workdir (str): Directory holding the run's state; created if missing.
+    """
+
+    def __init__(self, workdir: str):
+        self.workdir = workdir
+        self.manifest_path = os.path.join(workdir, "manifest.json")
+        self.results_dir = os.path.join(workdir, "results")
+        os.makedirs(self.results_dir, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = BulkManifest.model_validate_json(f.read())
+        else:
+            self.manifest = BulkManifest()
+
+    def save(self) -> None:
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.manifest.model_dump_json())
+        os.replace(tmp_path, self.manifest_path)
+
+    async def prepare(self, pdf_paths: List[str]) -> int:
+        """
+        Render PDFs and write a batch request for every page without a result.
+
+        A PDF that cannot be read or rendered is recorded in the manifest's
+        `failed` and skipped, so one bad file does not stop the run.
+
+        Args:
+            pdf_paths (List[str]): PDFs to OCR.
+
+        Returns:
+            int: Number of requests written.
+        """
+        writer = ShardWriter(self.workdir, len(self.manifest.shards))
+        queued = 0
+        try:
+            for pdf_path in pdf_paths:
+                source = os.path.abspath(pdf_path)
+                try:
+                    queued += await self.prepare_document(pdf_path, writer)
+                except Exception as e:
+                    error = str(getattr(e, "detail", None) or e) or type(e).__name__
+                    logger.error(f"Skipping {pdf_path}: {error}")
+                    self.manifest.failed[source] = error
+                else:
+                    self.manifest.failed.pop(source, None)
+        finally:
+            writer.close()
+            self.manifest.shards.extend(writer.shards)
+            self.save()
+        logger.info(
+            f"Queued {queued} pages in {len(writer.shards)} batch files; "
+            f"{len(self.manifest.failed)} documents failed."
+        )
+        return queued
+
+    async def prepare_document(self, pdf_path: str, writer: ShardWriter) -> int:
+        """
+        Render one PDF and write its requests; returns the number written.
+
+        Like the interactive pipeline, the document is classified to pick its
+        prompt, and pages with a usable text layer or no ink are answered
+        without a request.
+        """
+        deployment = settings.OPENAI_DEPLOYMENT_ID
+        doc_id = document_id(pdf_path)
+        document_type = await classify_pdf(pdf_path)
+        pages = await asyncio.to_thread(
+            convert_pdf_to_images_pymupdf, pdf_path, None, settings.OCR_TEXT_LAYER_ENABLED
+        )
+        self.manifest.documents[doc_id] = os.path.abspath(pdf_path)
+        cached: Dict[int, str] = {}
+        rendered = []
+        for page_num, page in pages:
+            if isinstance(page, TextLayerPage):
+                cached[page_num] = page.text
+            elif isinstance(page, BlankPage):
+                cached[page_num] = BLANK_PAGE_TEXT
+            else:
+                rendered.append((page_num, page))
+        queued = 0
+        try:
+            for page_num, image in encode_images(rendered):
+                custom_id = f"{doc_id}:{page_num}"
+                if custom_id in self.manifest.pending:
+                    continue
+                messages = ocr_service.build_ocr_messages([(page_num, image)], document_type)
+                # The key interactive requests use, so either can answer the other
+                cache_key = ocr_service.page_cache_key((page_num, image), document_type)
+                text = await ocr_cache.get(cache_key)
+                if text is not None:
+                    cached[page_num] = text
+                    continue
+                body = {
+                    "model": deployment,
+                    "messages": messages,
+                    "max_tokens": settings.OCR_MAX_OUTPUT_TOKENS,
+                    **COMPLETION_OPTIONS,
+                }
+                request = {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+                writer.write(custom_id, json.dumps(request).encode() + b"\n")
+                self.manifest.pending[custom_id] = cache_key
+                queued += 1
+        finally:
+            release_pages(image for _, image in pages)
+        if cached:
+            self.store_results(doc_id, cached)
+        logger.info(
+            f"Prepared {pdf_path} ({document_type or 'general'}): {len(pages)} pages, "
+            f"{len(cached)} answered without a request."
+        )
+        return queued
+
+    async def submit(self) -> int:
+        """
+        Upload prepared input files and create a batch for each.
+
+        Returns:
+            int: Number of batches created.
+        """
+        created = 0
+        for shard in self.manifest.shards:
+            if shard.status != "prepared":
+                continue
+            if shard.file_id is None:
+                with open(shard.path, "rb") as f:
+                    uploaded = await ocr_service.client.files.create(file=f, purpose="batch")
+                shard.file_id = uploaded.id
+                self.save()
+            batch = await ocr_service.client.batches.create(
+                input_file_id=shard.file_id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=settings.OCR_BULK_COMPLETION_WINDOW,
+                metadata={"source": "bulk-ocr", "input": os.path.basename(shard.path)},
+            )
+            shard.batch_id = batch.id
+            shard.status = batch.status
+            self.save()
+            created += 1
+            logger.info(f"Submitted {shard.path} ({len(shard.custom_ids)} pages) as batch {batch.id}.")
+        return created
+
+    async def collect(self) -> bool:
+        """
+        Download the output of every batch that has finished since the last call.
+
+        Returns:
+            bool: True once every submitted batch has been collected.
+        """
+        for shard in self.manifest.shards:
+            if shard.batch_id is None or shard.status == "collected":
+                continue
+            batch = await ocr_service.client.batches.retrieve(shard.batch_id)
+            shard.status = batch.status
+            if batch.status not in FINAL_STATUSES:
+                counts = batch.request_counts
+                progress = f"{counts.completed + counts.failed}/{counts.total}" if counts else "?"
+                logger.info(f"Batch {batch.id} is {batch.status} ({progress}).")
+                continue
+            answered = set()
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    content = await ocr_service.client.files.content(file_id)
+                    answered.update(await self.collect_output(shard, content.text))
+            # Requests an expired or cancelled batch never ran count as failed too.
+            for custom_id in shard.custom_ids:
+                if custom_id not in answered and self.manifest.pending.pop(custom_id, None) is not None:
+                    shard.failed.append(custom_id)
+            shard.status = "collected"
+            self.save()
+            logger.info(
+                f"Collected batch {batch.id} ({batch.status}): "
+                f"{len(shard.custom_ids) - len(shard.failed)} pages, {len(shard.failed)} failed."
+            )
+        return all(shard.batch_id is None or shard.status == "collected" for shard in self.manifest.shards)
+
+    async def collect_output(self, shard: BulkShard, output: str) -> List[str]:
+        """
+        Store the answers in a batch output or error file.
+
+        Args:
+            shard (BulkShard): The shard the batch was created from.
+            output (str): JSONL content of the file.
+
+        Returns:
+            List[str]: Custom ids found in the file.
+        """
+        seen = []
+        results: Dict[str, Dict[int, str]] = {}
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            custom_id = record["custom_id"]
+            seen.append(custom_id)
+            cache_key = self.manifest.pending.pop(custom_id, None)
+            if cache_key is None:
+                continue
+            text = response_text(record)
+            if text is None:
+                logger.warning(f"Batch request {custom_id} failed: {record.get('error') or record.get('response')}")
+                shard.failed.append(custom_id)
+                continue
+            doc_id, page_num = custom_id.rsplit(":", 1)
+            results.setdefault(doc_id, {})[int(page_num)] = text
+            await ocr_cache.set(cache_key, text)
+        for doc_id, pages in results.items():
+            self.store_results(doc_id, pages)
+        return seen
+
+    def store_results(self, doc_id: str, pages: Dict[int, str]) -> None:
+        """Merge page texts into a document's result file."""
+        path = os.path.join(self.results_dir, f"{doc_id}.json")
+        stored = {"source": self.manifest.documents.get(doc_id), "pages": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        stored["pages"].update({str(page_num): text for page_num, text in pages.items()})
+        stored["pages"] = dict(sorted(stored["pages"].items(), key=lambda item: int(item[0])))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stored, f)
+        os.replace(tmp_path, path)
+
+    async def wait(self) -> None:
+        """Collect batches every `OCR_BULK_POLL_INTERVAL` seconds until all are done."""
+        while not await self.collect():
+            await asyncio.sleep(settings.OCR_BULK_POLL_INTERVAL)
+
+
+def response_text(record: dict) -> Optional[str]:
+    """
+    Extract the model's answer from one line of a batch output file.
+
+    Args:
+        record (dict): The parsed line.
+
+    Returns:
+        Optional[str]: The text, or None if the request failed or returned nothing.
+    """
+    response = record.get("response") or {}
+    if record.get("error") or response.get("status_code") != 200:
+        return None
+    choices = response.get("body", {}).get("choices") or []
+    content = choices[0].get("message", {}).get("content") if choices else None
+    return content.strip() if content and content.strip() else None
+
+
+async def run_command(args: argparse.Namespace) -> None:
+    bulk_run = BulkRun(args.workdir)
+    try:
+        if args.command in ("prepare", "run"):
+            await bulk_run.prepare(find_pdfs(args.paths))
+        if args.command in ("submit", "run"):
+            await bulk_run.submit()
+        if args.command == "run" or (args.command == "collect" and args.wait):
+            await bulk_run.wait()
+        elif args.command == "collect":
+            await bulk_run.collect()
+    finally:
+        await ocr_service.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["prepare", "submit", "collect", "run"])
+    parser.add_argument("paths", nargs="*", help="PDF files or directories (prepare and run).")
+    parser.add_argument("--workdir", required=True, help="Directory for the run's state and results.")
+    parser.add_argument("--wait", action="store_true", help="With collect: poll until every batch is done.")
+    args = parser.parse_args()
+    if args.command in ("prepare", "run") and not args.paths:
+        parser.error(f"{args.command} needs at least one PDF file or directory")
+    try:
+        asyncio.run(run_command(args))
+    finally:
+        render_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlmodel import Session, delete, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.gptocr.logger import logger
+from app.gptocr.model.gptmodel import OCRPageEvent
+from app.gptocr.utilityFunction import render_settings_key
+from app.models import OCRPageCheckpoint, utcnow
+
+# ----------------------------
+# Page Checkpoints
+# ----------------------------
+
+def hash_document(pdf_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    SHA-256 of a file, read in chunks.
+
+    Args:
+        pdf_path (str): Path to the file.
+        chunk_size (int): Bytes read at a time.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PageCheckpoints:
+    """
+    Per-page OCR progress of one document, kept in the `ocrpagecheckpoint` table.
+
+    Pages are saved as they finish, keyed by the document's hash, so the same
+    file uploaded again, or a job restarted on another worker, picks up the
+    pages already done. Saved pages are only reused with the same model,
+    prompt type and render settings. Checkpointing never fails a request: if
+    the database cannot be reached it is logged and switched off for the
+    rest of the document.
+    """
+
+    def __init__(self, document_hash: str, document_type: Optional[str], use_text_layer: bool):
+        self.document_hash = document_hash
+        self.document_type = document_type
+        self.use_text_layer = use_text_layer
+        self.model = settings.OPENAI_DEPLOYMENT_ID
+        self.render_settings = render_settings_key()
+        self.enabled = True
+
+    @classmethod
+    async def open(
+        cls, pdf_path: str, document_type: Optional[str], use_text_layer: bool
+    ) -> Optional["PageCheckpoints"]:
+        """
+        Hash a document for checkpointing.
+
+        Returns:
+            Optional[PageCheckpoints]: None when `OCR_CHECKPOINT_ENABLED` is off.
+        """
+        if not settings.OCR_CHECKPOINT_ENABLED:
+            return None
+        document_hash = await asyncio.to_thread(hash_document, pdf_path)
+        return cls(document_hash, document_type, use_text_layer)
+
+    async def load(self, first_page: int, end_page: int) -> Dict[int, OCRPageCheckpoint]:
+        """
+        Saved pages of a page range that can be reused.
+
+        Args:
+            first_page (int): Index of the first page of the range.
+            end_page (int): Index after the last page of the range.
+
+        Returns:
+            Dict[int, OCRPageCheckpoint]: Checkpoints by page number.
+        """
+        return await self.run(self.load_sync, first_page, end_page) or {}
+
+    async def save(self, event: OCRPageEvent) -> None:
+        """Save a finished page."""
+        await self.run(self.save_sync, event)
+
+    async def clear(self, first_page: int, end_page: int) -> None:
+        """Drop the checkpoints of a page range once all of its pages are done."""
+        await self.run(self.clear_sync, first_page, end_page)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if not self.enabled:
+            return None
+        try:
+            return await asyncio.to_thread(func, *args)
+        except Exception as e:
+            logger.warning(f"Page checkpoints unavailable, continuing without them: {e}")
+            self.enabled = False
+            return None
+
+    def load_sync(self, first_page: int, end_page: int) -> Dict[int, OCRPageCheckpoint]:
+        with Session(engine) as session:
+            # Abandoned documents are not resumed after the TTL; drop them
+            cutoff = utcnow() - timedelta(hours=settings.OCR_CHECKPOINT_TTL_HOURS)
+            session.exec(delete(OCRPageCheckpoint).where(OCRPageCheckpoint.created_at < cutoff))
+            session.commit()
+            statement = select(OCRPageCheckpoint).where(
+                OCRPageCheckpoint.document_hash == self.document_hash,
+                OCRPageCheckpoint.page > first_page,
+                OCRPageCheckpoint.page <= end_page,
+                OCRPageCheckpoint.model == self.model,
+                OCRPageCheckpoint.render_settings == self.render_settings,
+            )
+            return {
+                checkpoint.page: checkpoint
+                for checkpoint in session.exec(statement).all()
+                if checkpoint.document_type == self.document_type
+                and (self.use_text_layer or checkpoint.source != "text_layer")
+                and (settings.OCR_HYBRID_ENABLED or checkpoint.source != "tesseract")
+            }
+
+    def save_sync(self, event: OCRPageEvent) -> None:
+        with Session(engine) as session:
+            session.merge(
+                OCRPageCheckpoint(
+                    document_hash=self.document_hash,
+                    page=event.pages[0],
+                    text=event.text,
+                    source=event.source,
+                    model=self.model,
+                    document_type=self.document_type,
+                    render_settings=self.render_settings,
+                    prompt_tokens=event.prompt_tokens,
+                    completion_tokens=event.completion_tokens,
+                )
+            )
+            session.commit()
+
+    def clear_sync(self, first_page: int, end_page: int) -> None:
+        with Session(engine) as session:
+            session.exec(
+                delete(OCRPageCheckpoint).where(
+                    OCRPageCheckpoint.document_hash == self.document_hash,
+                    OCRPageCheckpoint.page > first_page,
+                    OCRPageCheckpoint.page <= end_page,
+                )
+            )
+            session.commit()
@@ -0,0 +1,105 @@
+import os
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from app.core.config import settings
+from app.gptocr.logger import logger
+from app.gptocr.pagefilter import INK_LEVEL
+from app.tesractopenaiapi.tesseractengine import recognize_words, resolve_backend, tesserocr_api
+
+# ----------------------------
+# Confidence-Gated Tesseract
+# ----------------------------
+
+class TesseractReading(NamedTuple):
+    """Tesseract's reading of a page, made in a render worker in hybrid mode."""
+    text: str
+    # Mean word confidence (0-100), weighted by word length
+    confidence: float
+    # Fraction of the page's ink inside the boxes of recognized words
+    coverage: float
+    # Rendering and recognizing the page
+    duration_ms: int
+
+    @property
+    def accepted(self) -> bool:
+        """Good enough to answer the page without the vision model."""
+        return (
+            self.confidence >= settings.OCR_HYBRID_MIN_CONFIDENCE
+            and self.coverage >= settings.OCR_HYBRID_MIN_COVERAGE
+        )
+
+
+# Tesseract backend of this render worker, resolved on first use
+_backend: Optional[str] = None
+
+
+def load_tesseract() -> str:
+    """
+    Resolve `TESSERACT_BACKEND` for this worker and load it; with tesserocr
+    the language model is loaded here, once per worker. Tesseract runs on
+    one core, since the render pool already runs one page per core.
+    """
+    global _backend
+    if _backend is None:
+        os.environ["OMP_THREAD_LIMIT"] = "1"
+        _backend = resolve_backend(settings.TESSERACT_BACKEND)
+        if _backend == "tesserocr":
+            tesserocr_api(settings.TESSERACT_LANG)
+    return _backend
+
+
+def ink_coverage(pix: fitz.Pixmap, boxes: List[Tuple[int, int, int, int]]) -> float:
+    """
+    Fraction of the ink pixels of a gray page that fall inside `boxes`.
+
+    Ink outside every word box is something Tesseract did not read:
+    handwriting, stamps, pictures, or text it failed to find. A page
+    without ink counts as fully covered.
+    """
+    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, : pix.width]
+    ink = gray < INK_LEVEL
+    total = np.count_nonzero(ink)
+    if not total:
+        return 1.0
+    covered = np.zeros_like(ink)
+    for left, top, right, bottom in boxes:
+        covered[max(top, 0) : bottom, max(left, 0) : right] = True
+    return float(np.count_nonzero(ink & covered)) / total
+
+
+def read_page(page: fitz.Page) -> Optional[TesseractReading]:
+    """
+    Recognize a page with Tesseract and rate how far its text can be trusted.
+
+    The page is rendered gray at `TESSERACT_DPI`. Confidence is the mean of
+    Tesseract's word confidences weighted by word length, so a stray
+    misread character does not weigh as much as a misread line; a page
+    without words has confidence 0.
+
+    Args:
+        page (fitz.Page): The page, in a render worker.
+
+    Returns:
+        Optional[TesseractReading]: The text with its confidence, coverage and
+        timing, or None if Tesseract failed and the page should go to the model.
+    """
+    started = time.perf_counter()
+    pix = page.get_pixmap(dpi=settings.TESSERACT_DPI, colorspace=fitz.csGRAY)
+    try:
+        text, words = recognize_words(pix, settings.TESSERACT_DPI, settings.TESSERACT_LANG, load_tesseract())
+    except Exception as e:
+        logger.warning(f"Tesseract failed on page {page.number + 1}, sending it to the model: {e}")
+        return None
+    weight = sum(len(word) for word, _, _ in words)
+    confidence = sum(len(word) * word_confidence for word, word_confidence, _ in words) / weight if weight else 0.0
+    coverage = ink_coverage(pix, [box for _, _, box in words])
+    return TesseractReading(
+        text=text.strip(),
+        confidence=round(confidence, 1),
+        coverage=round(coverage, 3),
+        duration_ms=int((time.perf_counter() - started) * 1000),
+    )
@@ -0,0 +1,140 @@
+import base64
+import io
+from typing import NamedTuple, Optional, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from app.core.config import settings
+
+# ----------------------------
+# Page Image Encoding
+# ----------------------------
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+# Images that fit in a single 512px tile look the same to the model at low detail.
+LOW_DETAIL_MAX_EDGE = 512
+
+
+class ImageEncoding(NamedTuple):
+    """
+    How pages are rasterized and encoded before they are sent to the model.
+
+    The vision endpoint scales every image to fit 2048x2048 and then to a
+    short edge of 768 px before tiling it, so pixels beyond that are uploaded
+    and paid for without being seen. Rendering straight to that size, in
+    grayscale for text pages, and with a lossy format where acceptable keeps
+    payloads small without changing what the model gets.
+    """
+
+    zoom: float
+    image_format: str
+    quality: int
+    grayscale: bool
+    max_long_edge: int
+    max_short_edge: int
+    detail: str
+
+    @classmethod
+    def from_settings(cls, zoom: Optional[float] = None) -> "ImageEncoding":
+        return cls(
+            zoom=zoom or settings.PDF_RENDER_ZOOM,
+            image_format=settings.OCR_IMAGE_FORMAT,
+            quality=settings.OCR_IMAGE_QUALITY,
+            grayscale=settings.OCR_IMAGE_GRAYSCALE,
+            max_long_edge=settings.OCR_IMAGE_MAX_LONG_EDGE,
+            max_short_edge=settings.OCR_IMAGE_MAX_SHORT_EDGE,
+            detail=settings.OCR_IMAGE_DETAIL,
+        )
+
+    def cache_key(self) -> str:
+        """Stable description of the renderer and these settings, for OCR cache keys."""
+        quality = f":q={self.quality}" if self.image_format != "png" else ""
+        colour = ":gray" if self.grayscale else ""
+        return (
+            f"pymupdf-{fitz.VersionBind}:zoom={self.zoom}:{self.image_format}{quality}{colour}"
+            f":edges={self.max_long_edge}x{self.max_short_edge}:detail={self.detail}"
+        )
+
+    def page_scale(self, rect: fitz.Rect) -> float:
+        """
+        Scale factor that renders a page at `zoom`, shrunk to fit the edge limits.
+
+        Args:
+            rect (fitz.Rect): The page rectangle in points.
+
+        Returns:
+            float: The matrix scale to render with.
+        """
+        scale = self.zoom
+        long_edge, short_edge = max(rect.width, rect.height), min(rect.width, rect.height)
+        if self.max_long_edge and long_edge:
+            scale = min(scale, self.max_long_edge / long_edge)
+        if self.max_short_edge and short_edge:
+            scale = min(scale, self.max_short_edge / short_edge)
+        return scale
+
+    def page_detail(self, width: int, height: int) -> str:
+        """
+        The `detail` level to send with an image of the given size.
+
+        `adaptive` uses `low` (a flat 85 tokens) for images that fit in one
+        tile anyway, and `high` for everything else.
+        """
+        if self.detail != "adaptive":
+            return self.detail
+        return "low" if max(width, height) <= LOW_DETAIL_MAX_EDGE else "high"
+
+
+def rasterize(page: fitz.Page, encoding: ImageEncoding) -> fitz.Pixmap:
+    """
+    Render a page at the size and colour depth chosen by `encoding`.
+
+    Args:
+        page (fitz.Page): The page to render.
+        encoding (ImageEncoding): Rendering and encoding settings.
+
+    Returns:
+        fitz.Pixmap: Gray or RGB pixmap without alpha.
+    """
+    scale = encoding.page_scale(page.rect)
+    colorspace = fitz.csGRAY if encoding.grayscale else fitz.csRGB
+    return page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=colorspace, alpha=False)
+
+
+def encode_pixmap(pix: fitz.Pixmap, encoding: ImageEncoding) -> Tuple[bytes, str]:
+    """
+    Encode a rendered page as a data URL.
+
+    Args:
+        pix (fitz.Pixmap): The page, as returned by `rasterize`.
+        encoding (ImageEncoding): Rendering and encoding settings.
+
+    Returns:
+        Tuple[bytes, str]: The ASCII data URL and the `detail` level for the page.
+    """
+    if encoding.image_format == "png":
+        data = pix.tobytes("png")
+    else:
+        mode = "L" if pix.n == 1 else "RGB"
+        image = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+        buffer = io.BytesIO()
+        image.save(buffer, format=encoding.image_format.upper(), quality=encoding.quality)
+        data = buffer.getvalue()
+    data_url = f"data:{MIME_TYPES[encoding.image_format]};base64,".encode() + base64.b64encode(data)
+    return data_url, encoding.page_detail(pix.width, pix.height)
+
+
+def render_page(page: fitz.Page, encoding: ImageEncoding) -> Tuple[bytes, str]:
+    """
+    Rasterize and encode one page as a data URL.
+
+    Args:
+        page (fitz.Page): The page to render.
+        encoding (ImageEncoding): Rendering and encoding settings.
+
+    Returns:
+        Tuple[bytes, str]: The ASCII data URL and the `detail` level for the page.
+    """
+    return encode_pixmap(rasterize(page, encoding), encoding)
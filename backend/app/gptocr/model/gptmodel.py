@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, HttpUrl
 
@@ -9,5 +9,102 @@ from pydantic import BaseModel, HttpUrl
 class OCRRequest(BaseModel):
     url: Optional[HttpUrl] = None
 
+class OCRPageStatus(BaseModel):
+    """Outcome of one page of an `/ocr` request."""
+    page: int
+    # "ok" or "error"
+    status: str
+    source: Optional[str] = None
+    status_code: Optional[int] = None
+    detail: Optional[str] = None
+    # Hybrid mode: Tesseract's reading of the page, see `OCRPageEvent`
+    tesseract_confidence: Optional[float] = None
+    tesseract_coverage: Optional[float] = None
+    tesseract_ms: Optional[int] = None
+
 class OCRResponse(BaseModel):
-    text: str
\ No newline at end of file
+    text: str
+    # Per-page outcome; pages listed in `failed_pages` are missing from `text`
+    pages: List[OCRPageStatus] = []
+    failed_pages: List[int] = []
+
+class OCRPageEvent(BaseModel):
+    """Markdown for one finished page."""
+    pages: List[int]
+    text: str
+    elapsed_ms: int
+    duration_ms: int
+    # "ocr" for model output, "text_layer" when taken from the PDF's embedded
+    # text, "tesseract" when Tesseract's reading was accepted in hybrid
+    # mode, "blank" for skipped blank pages, "duplicate" for pages that
+    # reuse the result of the earlier page `duplicate_of` and "checkpoint"
+    # for pages saved by an earlier, interrupted run of the same document
+    source: str = "ocr"
+    duplicate_of: Optional[int] = None
+    # Hybrid mode: word confidence (0-100) and ink coverage (0-1) of
+    # Tesseract's reading and the time it took, for every page Tesseract
+    # read, whether it was accepted or sent on to the model
+    tesseract_confidence: Optional[float] = None
+    tesseract_coverage: Optional[float] = None
+    tesseract_ms: Optional[int] = None
+    # The page's share of the model request it was part of; 0 when no
+    # request was made or the answer was streamed
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class OCRDeltaEvent(BaseModel):
+    """A piece of model output for the pages of a batch that is still running."""
+    pages: List[int]
+    text: str
+
+
+class OCRSummaryEvent(BaseModel):
+    """Sent once after every batch has finished."""
+    page_count: int
+    batch_count: int
+    document_type: Optional[str] = None
+    text_layer_pages: int = 0
+    tesseract_pages: int = 0
+    blank_pages: int = 0
+    duplicate_pages: int = 0
+    ocr_pages: int = 0
+    checkpoint_pages: int = 0
+    failed_pages: List[int] = []
+    characters: int
+    first_page_ms: Optional[int] = None
+    total_ms: int
+
+
+class TokenUsage(BaseModel):
+    """Tokens used by model requests, summed into by `perform_ocr_on_batch`."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class OCRErrorEvent(BaseModel):
+    pages: List[int]
+    status_code: int
+    detail: str
+
+
+class BulkShard(BaseModel):
+    """One JSONL input file of a bulk OCR run and the Batch API batch it was submitted as."""
+    path: str
+    custom_ids: List[str]
+    file_id: Optional[str] = None
+    batch_id: Optional[str] = None
+    # "prepared", then the batch's status, then "collected"
+    status: str = "prepared"
+    failed: List[str] = []
+
+
+class BulkManifest(BaseModel):
+    """State of a bulk OCR run, kept in its work directory between steps."""
+    # Document id -> source PDF
+    documents: Dict[str, str] = {}
+    # Custom id ("<document id>:<page>") -> OCR cache key, for pages awaiting a result
+    pending: Dict[str, str] = {}
+    # Source PDF -> why `prepare` could not render it; retried by the next `prepare`
+    failed: Dict[str, str] = {}
+    shards: List[BulkShard] = []
@@ -1,25 +1,589 @@
 import asyncio
-from typing import List, Tuple
+import contextlib
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
 
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.gptocr.batchplanner import BatchPlanner, split_batch_text
+from app.gptocr.checkpoint import PageCheckpoints
 from app.gptocr.logger import logger
+from app.gptocr.model.gptmodel import (
+    OCRDeltaEvent,
+    OCRErrorEvent,
+    OCRPageEvent,
+    OCRPageStatus,
+    OCRResponse,
+    OCRSummaryEvent,
+    TokenUsage,
+)
 from app.gptocr.ocrservice import ocr_service
+from app.gptocr.pagefilter import DuplicateFinder
+from app.gptocr.ratelimiter import CircuitOpenError
+from app.gptocr.hybridocr import TesseractReading
+from app.gptocr.renderpool import BlankPage, SegmentTracker, SharedPage, TesseractPage, TextLayerPage
+from app.gptocr.utilityFunction import PageImage, RenderedPage, iter_rendered_pages, render_classifier_image
+
+# Pages by how they were answered (embedded text, accepted Tesseract
+# reading, skipped blank, reused duplicate, or sent to the model), since startup
+page_path_counters: Dict[str, int] = {"text_layer": 0, "tesseract": 0, "blank": 0, "duplicate": 0, "ocr": 0}
+
+# Output for pages skipped as blank
+BLANK_PAGE_TEXT = "[Blank page]"
 
-async def process_batches(batches: List[List[Tuple[int, str]]]) -> List[str]:
+async def process_batches(batches: List[List[Tuple[int, PageImage]]]) -> List[str]:
     """
     Process each batch of images for OCR in parallel.
 
+    A failed batch does not cancel the others: its text is left empty and
+    the error is logged. Only if every batch fails is an error raised.
+
     Args:
-        batches (List[List[Tuple[int, str]]]): List of image batches with page numbers.
+        batches (List[List[Tuple[int, PageImage]]]): List of image batches with page numbers.
 
     Returns:
-        List[str]: Extracted texts from each batch.
+        List[str]: Extracted texts from each batch, empty for failed batches.
+
+    Raises:
+        HTTPException: The first batch's error if no batch succeeded.
     """
     tasks = [
         asyncio.create_task(ocr_service.perform_ocr_on_batch(batch))
         for batch in batches
     ]
-    extracted_texts = await asyncio.gather(*tasks, return_exceptions=False)
-    return extracted_texts
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures and len(failures) == len(results):
+        raise failures[0]
+    for batch, result in zip(batches, results):
+        if isinstance(result, BaseException):
+            logger.error(f"OCR failed for pages {[page_num for page_num, _ in batch]}: {result}")
+    return [result if isinstance(result, str) else "" for result in results]
+
+async def classify_pdf(pdf_path: str) -> Optional[str]:
+    """
+    Classify a document from its first page, if `OCR_CLASSIFY_DOCUMENTS` is on.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+
+    Returns:
+        Optional[str]: The document type for `stream_ocr_pipeline`, or None to use the general prompt.
+    """
+    if not settings.OCR_CLASSIFY_DOCUMENTS:
+        return None
+    try:
+        image = await render_classifier_image(pdf_path)
+    except Exception as e:
+        logger.warning(f"Could not render page 1 for classification: {e}")
+        return None
+    if image is None:
+        return None
+    return await ocr_service.classify_document(image)
+
+async def ocr_document(pdf_path: str, page_count: int, use_text_layer: bool) -> OCRResponse:
+    """
+    OCR a whole PDF and return its text with a status for every page.
+
+    Used by the `/ocr` endpoint and by extraction job workers. Pages that
+    fail are reported in `failed_pages` while the others are still returned.
+
+    Args:
+        pdf_path (str): Path to the PDF file; the caller owns and deletes it.
+        page_count (int): Number of pages, see `count_pdf_pages`.
+        use_text_layer (bool): Use the embedded text of pages where it is good enough.
+
+    Returns:
+        OCRResponse: The extracted text and each page's status.
+
+    Raises:
+        HTTPException: If no page could be processed or no text was extracted.
+    """
+    document_type = await classify_pdf(pdf_path)
+    response = await ocr_pages(pdf_path, page_count, use_text_layer, document_type=document_type)
+    return check_extracted_text(response)
+
+async def ocr_pages(
+    pdf_path: str,
+    page_count: int,
+    use_text_layer: bool,
+    page_range: Optional[Tuple[int, int]] = None,
+    document_type: Optional[str] = None,
+) -> OCRResponse:
+    """
+    OCR the pages of a PDF, or one shard of them, without classifying it first.
+
+    Args:
+        pdf_path (str): Path to the PDF file; the caller owns and deletes it.
+        page_count (int): Number of pages, see `count_pdf_pages`.
+        use_text_layer (bool): Use the embedded text of pages where it is good enough.
+        page_range (Optional[Tuple[int, int]]): (start, end) page indices, end
+            exclusive; defaults to every page.
+        document_type (Optional[str]): Prompt to use, see `classify_pdf`.
+
+    Returns:
+        OCRResponse: The extracted text and the status of every page in the range.
+
+    Raises:
+        HTTPException: If no page could be processed.
+    """
+    # Render and OCR the pages as a pipeline; batches finish out of order
+    page_texts = []
+    page_statuses = {}
+    errors = []
+    first_page, end_page = page_range or (0, page_count)
+    async for name, event in resumable_ocr_pipeline(
+        pdf_path, page_count, use_text_layer, page_range=page_range, document_type=document_type
+    ):
+        if name == "error":
+            errors.append(event)
+            for page_num in event.pages:
+                page_statuses[page_num] = OCRPageStatus(
+                    page=page_num, status="error", status_code=event.status_code, detail=event.detail
+                )
+        if name == "page":
+            page_texts.append((event.pages[0], event.text))
+            page_statuses[event.pages[0]] = OCRPageStatus(
+                page=event.pages[0],
+                status="ok",
+                source=event.source,
+                tesseract_confidence=event.tesseract_confidence,
+                tesseract_coverage=event.tesseract_coverage,
+                tesseract_ms=event.tesseract_ms,
+            )
+
+    if errors and not page_texts:
+        raise HTTPException(status_code=errors[0].status_code, detail=errors[0].detail)
+    # Pages of a range that failed to render never reach the pipeline.
+    for page_num in range(first_page + 1, end_page + 1):
+        if page_num not in page_statuses:
+            page_statuses[page_num] = OCRPageStatus(
+                page=page_num,
+                status="error",
+                status_code=errors[0].status_code if errors else 500,
+                detail=errors[0].detail if errors else "Page was not processed.",
+            )
+    failed_pages = [page_num for page_num, status in sorted(page_statuses.items()) if status.status == "error"]
+    if failed_pages:
+        logger.warning(f"OCR failed for pages {failed_pages}; returning partial results.")
+
+    return OCRResponse(
+        text=concatenate_texts([text for _, text in sorted(page_texts)]),
+        pages=[page_statuses[page_num] for page_num in sorted(page_statuses)],
+        failed_pages=failed_pages,
+    )
+
+async def resumable_ocr_pipeline(
+    pdf_path: str,
+    page_count: int,
+    use_text_layer: bool,
+    page_range: Optional[Tuple[int, int]] = None,
+    document_type: Optional[str] = None,
+    stream_tokens: bool = False,
+) -> AsyncIterator[Tuple[str, BaseModel]]:
+    """
+    Run `stream_ocr_pipeline` over a PDF, resuming from its page checkpoints.
+
+    Pages saved by an earlier run of the same file are emitted first with
+    source "checkpoint" and are not rendered or sent to the model again;
+    only the missing pages go through the pipeline, and each of them is
+    saved as soon as it is done. Once every page of the range succeeded its
+    checkpoints are dropped.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        page_count (int): Number of pages, see `count_pdf_pages`.
+        use_text_layer (bool): Use the embedded text of pages where it is good enough.
+        page_range (Optional[Tuple[int, int]]): (start, end) page indices, end
+            exclusive; defaults to every page.
+        document_type (Optional[str]): Prompt to use, see `classify_pdf`.
+        stream_tokens (bool): Also yield `delta` events with model output as it is generated.
+
+    Yields:
+        Tuple[str, BaseModel]: Events as from `stream_ocr_pipeline`, summary last.
+    """
+    first_page, end_page = page_range or (0, page_count)
+    checkpoints = await PageCheckpoints.open(pdf_path, document_type, use_text_layer)
+    saved = await checkpoints.load(first_page, end_page) if checkpoints else {}
+    if saved:
+        logger.info(f"Resuming OCR with {len(saved)} checkpointed pages.")
+    for page_num in sorted(saved):
+        yield "page", OCRPageEvent(
+            pages=[page_num],
+            text=saved[page_num].text,
+            elapsed_ms=0,
+            duration_ms=0,
+            source="checkpoint",
+        )
+
+    tracker = SegmentTracker()
+    pages = iter_missing_pages(pdf_path, page_count, tracker, use_text_layer, first_page, end_page, saved)
+    failed = False
+    async for name, event in stream_ocr_pipeline(
+        pages, tracker, stream_tokens=stream_tokens, document_type=document_type
+    ):
+        if name == "page" and checkpoints:
+            await checkpoints.save(event)
+        if name == "error":
+            failed = True
+        if name == "summary":
+            event.page_count += len(saved)
+            event.checkpoint_pages = len(saved)
+            event.characters += sum(len(checkpoint.text) for checkpoint in saved.values())
+            if checkpoints and not failed:
+                await checkpoints.clear(first_page, end_page)
+        yield name, event
+
+async def iter_missing_pages(
+    pdf_path: str,
+    page_count: int,
+    tracker: SegmentTracker,
+    use_text_layer: bool,
+    first_page: int,
+    end_page: int,
+    saved: Dict[int, object],
+) -> AsyncIterator[Tuple[int, RenderedPage]]:
+    # Render each run of consecutive pages without a checkpoint
+    start = first_page
+    while start < end_page:
+        if start + 1 in saved:
+            start += 1
+            continue
+        end = start
+        while end < end_page and end + 1 not in saved:
+            end += 1
+        async with contextlib.aclosing(
+            iter_rendered_pages(pdf_path, page_count, tracker, use_text_layer=use_text_layer, page_range=(start, end))
+        ) as pages:
+            async for page in pages:
+                yield page
+        start = end
+
+def merge_ocr_responses(responses: List[OCRResponse]) -> OCRResponse:
+    """
+    Merge the results of a document's shards, in any order, into one response in page order.
+
+    Args:
+        responses (List[OCRResponse]): One response per shard, see `ocr_pages`.
+
+    Returns:
+        OCRResponse: The whole document's text and page statuses.
+
+    Raises:
+        HTTPException: If no text was extracted.
+    """
+    responses = sorted(responses, key=lambda response: response.pages[0].page if response.pages else 0)
+    return check_extracted_text(
+        OCRResponse(
+            text=concatenate_texts([response.text for response in responses if response.text]),
+            pages=[status for response in responses for status in response.pages],
+            failed_pages=[page_num for response in responses for page_num in response.failed_pages],
+        )
+    )
+
+def check_extracted_text(response: OCRResponse) -> OCRResponse:
+    if not response.text:
+        logger.warning("OCR completed but no text was extracted.")
+        raise HTTPException(
+            status_code=500, detail="OCR completed but no text was extracted."
+        )
+    # else:
+    #     logger.info("OCR completed successfully.", final_text)
+
+    #     json_match = re.search(r'{.*}', final_text, re.DOTALL)
+    #     print("The JSON extracted from the summary is TS:",json_match)
+
+    #     if json_match:
+    #         final_text = json_match.group(0)
+    #         #print("The JSON extracted from the text is TS:", final_text)
+    #         #logger.info("OCR completed successfully.", final_text)
+    return response
+
+async def stream_ocr_pipeline(
+    pages: AsyncIterator[Tuple[int, Union[PageImage, RenderedPage]]],
+    tracker: SegmentTracker,
+    stream_tokens: bool = False,
+    document_type: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, BaseModel]]:
+    """
+    Run OCR over pages as they arrive and yield events as soon as each batch finishes.
+
+    Pages are packed into requests by `BatchPlanner` and handed to
+    `OCR_MAX_CONCURRENT_REQUESTS` OCR workers through a queue bounded by
+    `OCR_PIPELINE_QUEUE_DEPTH`. When the workers fall behind, the queue fills
+    and the page source is not pulled any further, so memory is capped by the
+    queue depth rather than the page count, and rendering overlaps with the
+    model calls.
+
+    Multi-page answers are split back into pages on their `Page N:` markers,
+    and pages are re-run one at a time when that fails, so `page` events
+    always carry a single page. Failures are isolated the same way: when a
+    multi-page request fails after its retries, each of its pages is retried
+    on its own, and only the pages that still fail get an `error` event,
+    while the rest of the document carries on. While the deployment's
+    circuit breaker is open, pages fail at once without being retried. Pages that arrive as `TextLayerPage`,
+    `TesseractPage` or `BlankPage` are emitted directly without a model call, and pages that are
+    near-duplicates of an earlier page reuse that page's result once it is
+    available, or get an `error` event of their own when that page failed.
+
+    Args:
+        pages (AsyncIterator[Tuple[int, Union[PageImage, RenderedPage]]]): Page source, e.g. `iter_rendered_pages`.
+        tracker (SegmentTracker): Releases each page's shared memory once its batch is done.
+        stream_tokens (bool): Also yield `delta` events with model output as it is generated.
+        document_type (Optional[str]): Document type from `classify_pdf`, selecting the OCR prompt.
+
+    Yields:
+        Tuple[str, BaseModel]: Event name (`delta`, `page`, `error`, `summary`) and payload.
+        The `summary` event is always last.
+
+    Raises:
+        Exception: Any error other than `HTTPException` from the page source or an
+            OCR worker, once the rest of the pipeline has been stopped.
+    """
+    started = time.perf_counter()
+    batch_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.OCR_PIPELINE_QUEUE_DEPTH)
+    events: asyncio.Queue = asyncio.Queue()
+    worker_count = settings.OCR_MAX_CONCURRENT_REQUESTS
+    counts = {"pages": 0, "batches": 0, "text_layer": 0, "tesseract": 0, "blank": 0, "duplicate": 0}
+    duplicates = DuplicateFinder()
+    # Result of each page sent to the model, or its error event if it failed,
+    # for duplicates waiting on it.
+    originals: Dict[int, asyncio.Future] = {}
+    duplicate_tasks: List[asyncio.Task] = []
+    failed_pages = set()
+    # Tesseract readings of pages that were sent to the model anyway, in hybrid mode
+    rejected_readings: Dict[int, TesseractReading] = {}
+
+    def elapsed_ms(since: float) -> int:
+        return int((time.perf_counter() - since) * 1000)
+
+    async def run_batch(batch: List[Tuple[int, PageImage]]) -> None:
+        batch_started = time.perf_counter()
+        if len(batch) > 1:
+            batch = await emit_cached_pages(batch, batch_started)
+            if not batch:
+                return
+        page_nums = [page_num for page_num, _ in batch]
+        counts["batches"] += 1
+        usage = TokenUsage()
+        try:
+            if stream_tokens:
+                parts = []
+                async for delta in ocr_service.stream_ocr_on_batch(batch, document_type):
+                    parts.append(delta)
+                    await events.put(("delta", OCRDeltaEvent(pages=page_nums, text=delta)))
+                text = "".join(parts).strip()
+            else:
+                text = await ocr_service.perform_ocr_on_batch(batch, document_type, usage)
+        except HTTPException as he:
+            if len(batch) > 1 and not isinstance(he, CircuitOpenError):
+                logger.warning(f"OCR failed for pages {page_nums}: {he.detail}; retrying them one by one.")
+                await asyncio.gather(*(run_batch([page]) for page in batch))
+                return
+            logger.error(f"OCR failed for pages {page_nums}: {he.detail}")
+            failed_pages.update(page_nums)
+            error = OCRErrorEvent(pages=page_nums, status_code=he.status_code, detail=str(he.detail))
+            resolve_originals(page_nums, error)
+            await events.put(("error", error))
+            return
+
+        if len(batch) == 1:
+            await emit_page(page_nums[0], text, batch_started, usage)
+            return
+        page_texts = split_batch_text(text, page_nums)
+        if page_texts is None:
+            logger.warning(f"Could not split OCR answer for pages {page_nums}; running them one by one.")
+            await asyncio.gather(*(run_batch([page]) for page in batch))
+            return
+        # Attribute the request's tokens to its pages evenly
+        page_usage = TokenUsage(
+            prompt_tokens=usage.prompt_tokens // len(batch),
+            completion_tokens=usage.completion_tokens // len(batch),
+        )
+        for page in batch:
+            await ocr_service.cache_page(page, page_texts[page[0]], document_type)
+            await emit_page(page[0], page_texts[page[0]], batch_started, page_usage)
+
+    async def emit_cached_pages(
+        batch: List[Tuple[int, PageImage]], batch_started: float
+    ) -> List[Tuple[int, PageImage]]:
+        # Pages seen before, alone or split out of another batch, don't need the model.
+        missing = []
+        for page in batch:
+            text = await ocr_service.get_cached_page(page, document_type)
+            if text is None:
+                missing.append(page)
+            else:
+                await emit_page(page[0], text, batch_started)
+        return missing
+
+    async def emit_page(
+        page_num: int, text: str, batch_started: float, usage: Optional[TokenUsage] = None
+    ) -> None:
+        resolve_originals([page_num], text)
+        await events.put(
+            (
+                "page",
+                OCRPageEvent(
+                    pages=[page_num],
+                    text=text,
+                    elapsed_ms=elapsed_ms(started),
+                    duration_ms=elapsed_ms(batch_started),
+                    prompt_tokens=usage.prompt_tokens if usage else 0,
+                    completion_tokens=usage.completion_tokens if usage else 0,
+                    **reading_fields(rejected_readings.pop(page_num, None)),
+                ),
+            )
+        )
+
+    def resolve_originals(page_nums: List[int], result: Union[str, OCRErrorEvent]) -> None:
+        for page_num in page_nums:
+            future = originals.get(page_num)
+            if future is not None and not future.done():
+                future.set_result(result)
+
+    async def emit_skipped(
+        page_num: int,
+        text: str,
+        source: str,
+        duplicate_of: Optional[int] = None,
+        reading: Optional[TesseractReading] = None,
+    ) -> None:
+        counts[source] += 1
+        page_path_counters[source] += 1
+        await events.put(
+            (
+                "page",
+                OCRPageEvent(
+                    pages=[page_num],
+                    text=text,
+                    elapsed_ms=elapsed_ms(started),
+                    duration_ms=reading.duration_ms if reading else 0,
+                    source=source,
+                    duplicate_of=duplicate_of,
+                    **reading_fields(reading),
+                ),
+            )
+        )
+
+    async def emit_duplicate(page_num: int, original: int) -> None:
+        result = await originals[original]
+        if isinstance(result, OCRErrorEvent):
+            # The original failed; fail with it, so that both are retried.
+            counts["duplicate"] += 1
+            failed_pages.add(page_num)
+            detail = f"Same as page {original}, which failed: {result.detail}"
+            await events.put(("error", OCRErrorEvent(pages=[page_num], status_code=result.status_code, detail=detail)))
+            return
+        await emit_skipped(page_num, result, "duplicate", duplicate_of=original)
+
+    async def produce() -> None:
+        try:
+            planner = BatchPlanner()
+            async for page_num, page in pages:
+                counts["pages"] += 1
+                if isinstance(page, TextLayerPage):
+                    await emit_skipped(page_num, page.text, "text_layer")
+                    continue
+                if isinstance(page, TesseractPage):
+                    await emit_skipped(page_num, page.reading.text, "tesseract", reading=page.reading)
+                    continue
+                if isinstance(page, BlankPage):
+                    await emit_skipped(page_num, BLANK_PAGE_TEXT, "blank")
+                    continue
+                if isinstance(page, SharedPage):
+                    if page.tesseract:
+                        rejected_readings[page_num] = page.tesseract
+                    original = duplicates.find(page_num, page.phash, page.thumbnail)
+                    if original is not None:
+                        tracker.done([page])
+                        duplicate_tasks.append(asyncio.create_task(emit_duplicate(page_num, original)))
+                        continue
+                    originals[page_num] = asyncio.get_running_loop().create_future()
+                page_path_counters["ocr"] += 1
+                batch = planner.add(page_num, page)
+                if batch:
+                    await batch_queue.put(batch)
+            batch = planner.flush()
+            if batch:
+                await batch_queue.put(batch)
+        except HTTPException as he:
+            await events.put(("error", OCRErrorEvent(pages=[], status_code=he.status_code, detail=str(he.detail))))
+        # Any other failure cancels the workers instead, see `supervise`
+        for _ in range(worker_count):
+            await batch_queue.put(None)
+
+    async def consume() -> None:
+        while (batch := await batch_queue.get()) is not None:
+            try:
+                await run_batch(batch)
+            finally:
+                tracker.done(image for _, image in batch)
+
+    async def supervise() -> None:
+        tasks = [asyncio.create_task(produce())] + [asyncio.create_task(consume()) for _ in range(worker_count)]
+        try:
+            await asyncio.gather(*tasks)
+            # Pages left unresolved here never reached a worker (rendering failed).
+            resolve_originals(
+                list(originals), OCRErrorEvent(pages=[], status_code=500, detail="Page was not processed.")
+            )
+            await asyncio.gather(*duplicate_tasks)
+        finally:
+            # After an unexpected error, stop the rest of the pipeline; the
+            # error is re-raised to the reader from `await supervisor`.
+            for task in tasks + duplicate_tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, *duplicate_tasks, return_exceptions=True)
+            await events.put(("done", None))
+
+    supervisor = asyncio.create_task(supervise())
+    characters = 0
+    first_page_ms = None
+    try:
+        while True:
+            name, event = await events.get()
+            if name == "done":
+                break
+            if name == "page":
+                characters += len(event.text)
+                if first_page_ms is None:
+                    first_page_ms = event.elapsed_ms
+            yield name, event
+        await supervisor
+    finally:
+        # The client may disconnect mid-stream; don't keep rendering or paying for its pages.
+        supervisor.cancel()
+        await asyncio.gather(supervisor, return_exceptions=True)
+        await pages.aclose()
+        tracker.release_all()
+
+    yield "summary", OCRSummaryEvent(
+        page_count=counts["pages"],
+        batch_count=counts["batches"],
+        document_type=document_type,
+        text_layer_pages=counts["text_layer"],
+        tesseract_pages=counts["tesseract"],
+        blank_pages=counts["blank"],
+        duplicate_pages=counts["duplicate"],
+        ocr_pages=counts["pages"] - counts["text_layer"] - counts["tesseract"] - counts["blank"] - counts["duplicate"],
+        failed_pages=sorted(failed_pages),
+        characters=characters,
+        first_page_ms=first_page_ms,
+        total_ms=elapsed_ms(started),
+    )
+
+def reading_fields(reading: Optional[TesseractReading]) -> Dict[str, object]:
+    """`OCRPageEvent` fields recording a page's Tesseract reading in hybrid mode."""
+    if reading is None:
+        return {}
+    return {
+        "tesseract_confidence": reading.confidence,
+        "tesseract_coverage": reading.coverage,
+        "tesseract_ms": reading.duration_ms,
+    }
 
 def concatenate_texts(texts: List[str]) -> str:
     """
@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.gptocr.logger import logger
+
+# ----------------------------
+# OCR Result Cache
+# ----------------------------
+
+class MemoryTier:
+    """Size-bounded LRU of OCR results held in process memory."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        text = self.entries.get(key)
+        if text is not None:
+            self.entries.move_to_end(key)
+        return text
+
+    def set(self, key: str, text: str) -> None:
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        self.entries[key] = text
+        self.size += len(text)
+        while self.size > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+
+class DiskTier:
+    """
+    OCR results stored as one file per key under `directory`.
+
+    Reads refresh the file's mtime, so evicting the oldest mtimes first gives
+    least-recently-used eviction once the directory grows past `max_bytes`.
+    Writes run on worker threads; `lock` serializes the size bookkeeping and
+    eviction between them.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size: Optional[int] = None
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.md")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path)
+            return text
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, text: str) -> None:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        with self.lock:
+            try:
+                # Overwriting an entry replaces its size rather than adding to it
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+            if self.size is None:
+                self.size = self.scan()
+            else:
+                self.size += os.path.getsize(path) - replaced
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def files(self) -> List[os.DirEntry]:
+        entries = []
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                entries.extend(entry for entry in os.scandir(shard.path) if entry.name.endswith(".md"))
+        return entries
+
+    def entry_stats(self) -> List[Tuple[str, os.stat_result]]:
+        """Stat every entry, skipping files that vanished since the directory was listed."""
+        results = []
+        for entry in self.files():
+            try:
+                results.append((entry.path, entry.stat()))
+            except FileNotFoundError:
+                continue
+        return results
+
+    def scan(self) -> int:
+        return sum(stat.st_size for _, stat in self.entry_stats())
+
+    def evict(self) -> None:
+        """Delete the least recently used entries; called with `lock` held."""
+        # Trim to 90% so eviction does not run on every write at the limit.
+        target = int(self.max_bytes * 0.9)
+        for path, stat in sorted(self.entry_stats(), key=lambda item: item[1].st_mtime):
+            if self.size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self.size -= stat.st_size
+            self.evictions += 1
+        logger.info(f"Evicted OCR cache entries, disk tier now {self.size} bytes.")
+
+
+class OCRCache:
+    """
+    Content-addressed cache of OCR results.
+
+    Keys hash everything that determines the model's answer: the rendered page
+    images, the prompt text built by `build_ocr_messages`, the model and the
+    render settings. Lookups go to the in-memory LRU first and then to the
+    on-disk tier, whose hits are promoted back into memory.
+    """
+
+    def __init__(self):
+        self.memory = MemoryTier(settings.OCR_CACHE_MEMORY_MAX_BYTES)
+        self.disk = (
+            DiskTier(settings.OCR_CACHE_DIR, settings.OCR_CACHE_DISK_MAX_BYTES)
+            if settings.OCR_CACHE_DIR
+            else None
+        )
+        self.counters: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+        }
+
+    @staticmethod
+    def make_key(messages: List[dict], model: str, render_settings: str) -> str:
+        """
+        Build the cache key for an OCR request.
+
+        Args:
+            messages (List[dict]): The message payload, as built by `build_ocr_messages`.
+            model (str): The model deployment.
+            render_settings (str): Description of how the page images were rendered.
+
+        Returns:
+            str: A hex SHA-256 digest.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{model}\0{render_settings}\0".encode())
+        for message in messages:
+            content = message["content"]
+            parts = [{"type": "text", "text": content}] if isinstance(content, str) else content
+            for part in parts:
+                if part["type"] == "text":
+                    digest.update(part["text"].encode())
+                elif part["type"] == "image_url":
+                    digest.update(hashlib.sha256(part["image_url"]["url"].encode()).digest())
+                digest.update(b"\0")
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        if not settings.OCR_CACHE_ENABLED:
+            return None
+        text = self.memory.get(key)
+        if text is not None:
+            self.counters["memory_hits"] += 1
+            return text
+        if self.disk:
+            try:
+                text = await asyncio.to_thread(self.disk.get, key)
+            except OSError as e:
+                logger.warning(f"OCR cache disk read failed: {e}")
+            if text is not None:
+                self.counters["disk_hits"] += 1
+                self.memory.set(key, text)
+                return text
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, text: str) -> None:
+        if not settings.OCR_CACHE_ENABLED:
+            return
+        self.memory.set(key, text)
+        if self.disk:
+            try:
+                await asyncio.to_thread(self.disk.set, key, text)
+            except OSError as e:
+                logger.warning(f"OCR cache disk write failed: {e}")
+        self.counters["stores"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit/miss counters and tier sizes.
+
+        Returns:
+            Dict[str, int]: Cache metrics.
+        """
+        lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate_percent": round(100 * hits / lookups) if lookups else 0,
+            "memory_entries": len(self.memory.entries),
+            "memory_bytes": self.memory.size,
+            "memory_evictions": self.memory.evictions,
+            "disk_bytes": (self.disk.size or 0) if self.disk else 0,
+            "disk_evictions": self.disk.evictions if self.disk else 0,
+        }
+
+# Process-wide OCR result cache
+ocr_cache = OCRCache()
@@ -1,36 +1,62 @@
 import asyncio
-from typing import List, Tuple
+from typing import Any, AsyncIterator, List, Optional, Tuple
 
 from fastapi import HTTPException
-from openai import OpenAI, OpenAIError
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    AsyncOpenAI,
+    OpenAIError,
+    RateLimitError,
+)
 from app.core.config import settings
+from app.core.llmclients import llm_clients
 from app.gptocr.logger import logger
-from app.gptocr.utilityFunction import retry_with_backoff
+from app.gptocr.model.gptmodel import TokenUsage
+from app.gptocr.ocrcache import ocr_cache
+from app.gptocr.prompts import CLASSIFIER_PROMPT, get_prompt, parse_document_type
+from app.gptocr.ratelimiter import estimate_request_tokens, rate_limiter, retry_after_seconds
+from app.gptocr.utilityFunction import PageImage, image_url_part, render_settings_key, retry_with_backoff
 
 # ----------------------------
 # OCR Service
 # ----------------------------
 
+# The classifier answers with a single word.
+CLASSIFIER_MAX_TOKENS = 5
+# Sampling parameters of every OCR request, interactive or through the Batch API.
+COMPLETION_OPTIONS = {"temperature": 0.1, "top_p": 0.95, "frequency_penalty": 0, "presence_penalty": 0}
+
 class OCRService:
-    def __init__(self):
-        try:
-            # self.client = AsyncAzureOpenAI(
-            #     azure_endpoint=Settings.AZURE_OPENAI_ENDPOINT,
-            #     api_version=Settings.OPENAI_API_VERSION,
-            #     api_key=Settings.OPENAI_API_KEY,
-            # )
-            #self.client = OpenAI(api_key=settings.model_config.OPENAI_API_KEY)
-            self.client = OpenAI()
-        except Exception as e:
-            logger.exception(f"Failed to initialize OpenAI client: {e}")
-            raise RuntimeError(f"Failed to initialize OpenAI client: {e}")
+    @property
+    def client(self) -> AsyncOpenAI:
+        """
+        The shared AsyncOpenAI client, so every batch of every request uses
+        one keep-alive connection pool instead of blocking the event loop.
+        """
+        return llm_clients.async_client
 
-    async def perform_ocr_on_batch(self, image_batch: List[Tuple[int, str]]) -> str:
+    async def close(self) -> None:
+        """
+        Close the underlying HTTP connection pools. Called on application shutdown.
+        """
+        await llm_clients.close()
+
+    async def perform_ocr_on_batch(
+        self,
+        image_batch: List[Tuple[int, PageImage]],
+        document_type: Optional[str] = None,
+        usage: Optional[TokenUsage] = None,
+    ) -> str:
         """
         Perform OCR on a batch of images using OpenAI's API with retry logic.
 
         Args:
-            image_batch (List[Tuple[int, str]]): List of tuples containing page numbers and base64-encoded image URLs.
+            image_batch (List[Tuple[int, PageImage]]): List of tuples containing page numbers and base64-encoded image URLs.
+            document_type (Optional[str]): Document type from `classify_document`, selecting the prompt.
+            usage (Optional[TokenUsage]): Receives the tokens of the request that produced the text;
+                left unchanged on a cache hit.
 
         Returns:
             str: Extracted text.
@@ -38,129 +64,271 @@ class OCRService:
         Raises:
             HTTPException: If OCR fails after retries.
         """
+        deployment = settings.OPENAI_DEPLOYMENT_ID
+        messages = self.build_ocr_messages(image_batch, document_type)
+        cache_key = ocr_cache.make_key(messages, deployment, render_settings_key())
+        cached_text = await ocr_cache.get(cache_key)
+        if cached_text is not None:
+            logger.info(f"OCR cache hit for pages {[page_num for page_num, _ in image_batch]}.")
+            return cached_text
+        estimated_tokens = estimate_request_tokens(messages, settings.OCR_MAX_OUTPUT_TOKENS)
+
         async def ocr_request():
+            response = await self.request_completion(deployment, messages, estimated_tokens)
+            text = self.extract_text_from_response(response)
+            if usage is not None and response.usage is not None:
+                usage.prompt_tokens += response.usage.prompt_tokens
+                usage.completion_tokens += response.usage.completion_tokens
+            return text
+
+        async with rate_limiter.in_flight(deployment):
+            text = await retry_with_backoff(ocr_request)
+        await ocr_cache.set(cache_key, text)
+        return text
+
+    async def get_cached_page(
+        self, page: Tuple[int, PageImage], document_type: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Look up a page's result as if it had been OCR'd on its own.
+
+        Args:
+            page (Tuple[int, PageImage]): Page number and image.
+            document_type (Optional[str]): Document type the page is OCR'd as.
+
+        Returns:
+            Optional[str]: The cached text, or None.
+        """
+        return await ocr_cache.get(self.page_cache_key(page, document_type))
+
+    async def cache_page(
+        self, page: Tuple[int, PageImage], text: str, document_type: Optional[str] = None
+    ) -> None:
+        """
+        Store a page's text, split out of a batch answer, under its single-page key.
+
+        Args:
+            page (Tuple[int, PageImage]): Page number and image.
+            text (str): The page's text.
+            document_type (Optional[str]): Document type the page was OCR'd as.
+        """
+        await ocr_cache.set(self.page_cache_key(page, document_type), text)
+
+    def page_cache_key(self, page: Tuple[int, PageImage], document_type: Optional[str] = None) -> str:
+        return ocr_cache.make_key(
+            self.build_ocr_messages([page], document_type), settings.OPENAI_DEPLOYMENT_ID, render_settings_key()
+        )
+
+    async def stream_ocr_on_batch(
+        self, image_batch: List[Tuple[int, PageImage]], document_type: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Perform OCR on a batch of images and yield the text as the model produces it.
+
+        Retries only cover opening the stream; once tokens have been yielded a
+        failure is raised to the caller.
+
+        Args:
+            image_batch (List[Tuple[int, PageImage]]): List of tuples containing page numbers and base64-encoded image URLs.
+            document_type (Optional[str]): Document type from `classify_document`, selecting the prompt.
+
+        Yields:
+            str: Text deltas, in order.
+
+        Raises:
+            HTTPException: If OCR fails after retries.
+        """
+        deployment = settings.OPENAI_DEPLOYMENT_ID
+        messages = self.build_ocr_messages(image_batch, document_type)
+        cache_key = ocr_cache.make_key(messages, deployment, render_settings_key())
+        cached_text = await ocr_cache.get(cache_key)
+        if cached_text is not None:
+            yield cached_text
+            return
+        estimated_tokens = estimate_request_tokens(messages, settings.OCR_MAX_OUTPUT_TOKENS)
+
+        async def open_stream():
+            return await self.request_completion(deployment, messages, estimated_tokens, stream=True)
+
+        async with rate_limiter.in_flight(deployment):
+            stream = await retry_with_backoff(open_stream)
+            parts = []
             try:
-                messages = self.build_ocr_messages(image_batch)
-                logger.info(
-                    f"Sending OCR request to OpenAI with {len(image_batch)} images."
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+            except OpenAIError as e:
+                logger.error(f"OpenAI stream interrupted: {e}")
+                raise HTTPException(
+                    status_code=502, detail=f"OCR processing failed: {e}"
                 )
-                #response = await self.client.chat.completions.create(
-                response = self.client.chat.completions.create(
-                    model=settings.OPENAI_DEPLOYMENT_ID,
-                    #model="gpt-4o",
-                    messages=messages,
-                    temperature=0.1,
-                    max_tokens=4000,
-                    top_p=0.95,
-                    frequency_penalty=0,
-                    presence_penalty=0,
+            finally:
+                await stream.close()
+        text = "".join(parts).strip()
+        if text:
+            await ocr_cache.set(cache_key, text)
+
+    async def classify_document(self, thumbnail: PageImage) -> Optional[str]:
+        """
+        Classify a document from a small image of its first page with `OCR_CLASSIFIER_MODEL`.
+
+        The answer is cached like OCR results, so a document is classified
+        once however often it is uploaded. Classification is an optimization:
+        any failure is logged and the document is OCR'd with the general prompt.
+
+        Args:
+            thumbnail (PageImage): Low resolution image of the first page.
+
+        Returns:
+            Optional[str]: One of `DOCUMENT_TYPES`, or None if it could not be classified.
+        """
+        model = settings.OCR_CLASSIFIER_MODEL
+        messages = [
+            {"role": "system", "content": CLASSIFIER_PROMPT},
+            {"role": "user", "content": [image_url_part(thumbnail)]},
+        ]
+        cache_key = ocr_cache.make_key(messages, model, "classify")
+        answer = await ocr_cache.get(cache_key)
+        if answer is None:
+            estimated_tokens = estimate_request_tokens(messages, CLASSIFIER_MAX_TOKENS)
+
+            async def classify_request():
+                response = await self.request_completion(
+                    model, messages, estimated_tokens, max_tokens=CLASSIFIER_MAX_TOKENS
                 )
                 return self.extract_text_from_response(response)
-            except OpenAIError as e:
-                if "rate limit" in str(e).lower():
-                    raise HTTPException(
-                        status_code=429, detail="Rate limit exceeded."
-                    )
-                else:
-                    logger.error(f"OpenAI API error: {e}")
-                    raise HTTPException(
-                        status_code=502,
-                        detail=f"OCR processing failed: {e}",
-                    )
-            except asyncio.TimeoutError:
+
+            try:
+                async with rate_limiter.in_flight(model):
+                    answer = await retry_with_backoff(classify_request)
+            except HTTPException as he:
+                logger.warning(f"Document classification failed, using the general prompt: {he.detail}")
+                return None
+            await ocr_cache.set(cache_key, answer)
+        document_type = parse_document_type(answer)
+        logger.info(f"Classified document as {document_type or 'unknown'} ({answer!r}).")
+        return document_type
+
+    async def request_completion(
+        self,
+        deployment: str,
+        messages: List[dict],
+        estimated_tokens: int,
+        stream: bool = False,
+        max_tokens: Optional[int] = None,
+    ) -> Any:
+        """
+        Send one chat completion request through the rate limiter.
+
+        Args:
+            deployment (str): The model deployment to call.
+            messages (List[dict]): The message payload.
+            estimated_tokens (int): Estimated tokens charged against the TPM budget.
+            stream (bool): Whether to request a streamed response.
+            max_tokens (Optional[int]): Completion limit; defaults to `OCR_MAX_OUTPUT_TOKENS`.
+
+        Returns:
+            Any: The parsed ChatCompletion, or an AsyncStream of chunks when streaming.
+
+        Raises:
+            HTTPException: With status 429 on rate limiting, 503 when the provider is down or
+                unreachable and 504 on timeout (all retryable, with `Retry-After` when the
+                provider sent one); 502/500 otherwise.
+            CircuitOpenError: If the deployment's circuit breaker is open.
+        """
+        circuit = rate_limiter.circuit(deployment)
+        await circuit.check()
+        try:
+            await rate_limiter.admit(deployment, estimated_tokens)
+            logger.info(
+                f"Sending OCR request to OpenAI with {len(messages)} messages (~{estimated_tokens} tokens)."
+            )
+            raw_response = await self.client.chat.completions.with_raw_response.create(
+                model=deployment,
+                #model="gpt-4o",
+                messages=messages,
+                max_tokens=max_tokens or settings.OCR_MAX_OUTPUT_TOKENS,
+                stream=stream,
+                **COMPLETION_OPTIONS,
+            )
+            rate_limiter.update_from_headers(deployment, raw_response.headers)
+            circuit.record_success()
+            return raw_response.parse()
+        except RateLimitError as e:
+            circuit.record_success()
+            retry_after = retry_after_seconds(e.response.headers)
+            rate_limiter.update_from_headers(deployment, e.response.headers)
+            rate_limiter.penalize(deployment, retry_after)
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded.",
+                headers={"Retry-After": str(retry_after)} if retry_after is not None else None,
+            )
+        except (APITimeoutError, asyncio.TimeoutError):
+            circuit.record_failure()
+            raise HTTPException(
+                status_code=504,
+                detail="Timeout occurred while communicating with OCR service.",
+            )
+        except APIConnectionError as e:
+            circuit.record_failure()
+            logger.error(f"Could not reach OpenAI: {e}")
+            raise HTTPException(
+                status_code=503, detail="OCR service is unreachable."
+            )
+        except APIStatusError as e:
+            if e.status_code >= 500:
+                circuit.record_failure()
+                retry_after = retry_after_seconds(e.response.headers)
+                logger.error(f"OpenAI server error {e.status_code}: {e}")
                 raise HTTPException(
-                    status_code=504,
-                    detail="Timeout occurred while communicating with OCR service.",
+                    status_code=503,
+                    detail=f"OCR service unavailable ({e.status_code}).",
+                    headers={"Retry-After": str(retry_after)} if retry_after is not None else None,
                 )
-            except Exception as e:
-                logger.exception(f"Unexpected error during OCR processing: {e}")
+            circuit.record_success()
+            logger.error(f"OpenAI API error: {e}")
+            raise HTTPException(
+                status_code=502,
+                detail=f"OCR processing failed: {e}",
+            )
+        except OpenAIError as e:
+            circuit.record_success()
+            if "rate limit" in str(e).lower():
                 raise HTTPException(
-                    status_code=500, detail=f"OCR processing failed: {e}"
+                    status_code=429, detail="Rate limit exceeded."
                 )
+            else:
+                logger.error(f"OpenAI API error: {e}")
+                raise HTTPException(
+                    status_code=502,
+                    detail=f"OCR processing failed: {e}",
+                )
+        except asyncio.CancelledError:
+            circuit.abandon()
+            raise
+        except Exception as e:
+            circuit.abandon()
+            logger.exception(f"Unexpected error during OCR processing: {e}")
+            raise HTTPException(
+                status_code=500, detail=f"OCR processing failed: {e}"
+            )
 
-        return await retry_with_backoff(ocr_request)
-
-    def build_ocr_messages(self, image_batch: List[Tuple[int, str]]) -> List[dict]:
+    def build_ocr_messages(
+        self, image_batch: List[Tuple[int, PageImage]], document_type: Optional[str] = None
+    ) -> List[dict]:
         """
         Build the message payload for the OCR request.
 
         Args:
-            image_batch (List[Tuple[int, str]]): List of tuples containing page numbers and image URLs.
+            image_batch (List[Tuple[int, PageImage]]): List of tuples containing page numbers and image URLs.
+            document_type (Optional[str]): Selects a compact type-specific system prompt; None uses the general one.
 
         Returns:
             List[dict]: The message payload.
         """
-        system_message = """
-                You are an OCR assistant and have ability to extract content from any type of document such as passport, driving license, adhar card, voter id card, green card, citizenship card, birth certificate, invoices, bills, contract, etc.
-                Extract all text from the provided images (Describe images as if you're explaining them to a blind person eg: `[Image: In this picture, 8 people are posed hugging each other]`), which are attached to the document. 
-                Use markdown formatting for:\n\n- Headings (# for main, ## for sub)\n- Lists (- for unordered, 1. for ordered)\n- Emphasis (* for italics, ** for bold)\n- Links ([text](URL))\n- Tables (use markdown table format)\n\nFor non-text elements, describe them: [Image: Brief description]\n\nMaintain logical flow and use horizontal rules (---) to separate sections if needed. 
-                Adjust formatting to preserve readability.\n\nNote any issues or ambiguities at the end of your output.\n\nBe thorough and accurate in transcribing all text content.
-                
-
-                ## Steps
-                1. **Translation**
-                - If the image is not in English, transform and translate the entire document into English.
-
-                2. **Classification**
-                - Identify the type of document (e.g., passport, driving license, birth certificate, invoice, electric bill, contract, etc.).
-
-                2. **Extraction**
-                - Identify key pieces of information typically present personal informations in documents of type passport, driving license, adhar card, voter id card, green card, citizenship card, birth certificate:
-                    - **Personal Information**: Name, address, date
-                    - **Identification Number**: Passport number, driving license number, adhar card number, voter id card number, green card number, citizenship card number, birth certificate number.
-                    - **Date of Issue**: Date of issue of the document.
-                    - **Date of Expiry**: Date of expiry of the document.
-                    - **Additional Information**: Any other relevant details present in the document.
-
-                - Identify key pieces of information typically present in invoices and bills:
-                    - **Vendor Information**: Name, address, contact details, GSTIN, code.
-                    - **Invoice Details**: Invoice number, date of issue, due date.
-                    - **Itemized Purchases**: List each item or service provided, including Challn No, Part No/ Item Code, HSN/SAC, description,  quantity, unit price, and total price.
-                    - **Payment Terms**: Payment methods, terms for discounts, late fees.
-                    - **Total Amount Due**: Including any applicable taxes and additional charges.
-                    - **Currency**: Specify the currency in which the transaction is made.
-                    - **Identifier** : locate a handwritten number and date stacked in the invoice and tag them to ref no, ref date. 
-
-                3. **Completion**, 
-                - Review extracted data for accuracy and completeness.
-                - Format the extracted information clearly and systematically.
-
-                # Output Format
-
-                - Provide the extracted information in a bulleted or table format for easy readability.
-                - Ensure all relevant details are included and clearly labeled for each category of information.
-
-                # Examples
-
-                - **Example 1**:
-                - Name: [Name]
-                - Address: [Address]
-                - Date of Birth: [Date]
-                - Identification Number: [ID Number]
-                - Date of Issue: [Date]
-                - Date of Expiry: [Date]
-                - Additional Information: [Details]
-
-                - **Example 2**:
-                - Vendor Name: [Vendor Name]
-                - Vendor Address: [Vendor Address]
-                - Contact: [Contact Information]
-                - Invoice Number: [Invoice Number]
-                - Date of Issue: [Date]
-                - Due Date: [Due Date]
-                - Items:
-                    - Item 1: [Item Description, Quantity, Unit Price, Total Price]
-                    - Item 2: [Item Description, Quantity, Unit Price, Total Price]
-                - Payment Terms: [Terms Description]
-                - Total Amount Due: [Total Amount]
-                - Currency: [Currency]
-                
-                # Notes
-
-                - Ensure that translations preserve the meaning and context of the original invoice.
-                - Extraction should prioritize accuracy and clarity, maintaining the integrity of financial data.
-                - If any information is unclear or missing, note the issue at the end of the output.
-                    """
+        system_message = get_prompt(document_type)
 
         messages = [
             {
@@ -175,7 +343,7 @@ class OCRService:
 
         if len(image_batch) == 1:
             # Batch size = 1: Mention the specific page number
-            page_num, img_url = image_batch[0]
+            page_num, image = image_batch[0]
             messages.append({
                 "role": "user",
                 "content": f"Page {page_num}:",
@@ -183,19 +351,19 @@ class OCRService:
             messages.append({
                 "role": "user",
                 "content": [
-                    {"type": "image_url", "image_url": {"url": img_url}}
+                    image_url_part(image)
                 ],
             })
         else:
             # Batch size >1: Include all page numbers and stress returning page numbers in response
             messages.append({
                 "role": "user",
-                "content": "Please perform OCR on the following images. Ensure that the extracted text includes the corresponding page numbers.",
+                "content": "Please perform OCR on the following images. Start the text of each image with its page label on a line of its own, exactly as given (for example `Page 3:`), and keep the pages in the order given.",
             })
             content = []
-            for page_num, img_url in image_batch:
+            for page_num, image in image_batch:
                 content.append({"type": "text", "text": f"Page {page_num}:"})
-                content.append({"type": "image_url", "image_url": {"url": img_url}})
+                content.append(image_url_part(image))
             messages.append({
                 "role": "user",
                 "content": content,
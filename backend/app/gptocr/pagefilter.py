@@ -0,0 +1,110 @@
+from typing import List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from app.core.config import settings
+
+# ----------------------------
+# Blank and Duplicate Page Detection
+# ----------------------------
+
+# Pixels darker than this (0-255 gray) count as ink.
+INK_LEVEL = 160
+# Difference hash grid (16x16 = 256 bits), used to find candidate duplicates.
+HASH_SIZE = 16
+HASH_MARGIN = 2.0
+# Thumbnail used to confirm a candidate: cells of about 5 px on a page
+# rendered for the model, small enough that changing one digit of a number
+# moves some cell by well over the default delta (27 KB per page).
+THUMBNAIL_SHAPE = (192, 144)
+
+
+def block_means(gray: np.ndarray, rows: int, cols: int) -> Optional[np.ndarray]:
+    """Average a 2D uint8 array down to a rows x cols grid, or None if it is too small."""
+    cell_rows, cell_cols = gray.shape[0] // rows, gray.shape[1] // cols
+    if cell_rows == 0 or cell_cols == 0:
+        return None
+    cropped = gray[: rows * cell_rows, : cols * cell_cols]
+    sums = cropped.reshape(rows, cell_rows, cols, cell_cols).sum(axis=(1, 3), dtype=np.uint32)
+    return sums / (cell_rows * cell_cols)
+
+
+def page_statistics(pix: fitz.Pixmap) -> Tuple[float, Optional[int], Optional[bytes]]:
+    """
+    Ink coverage, perceptual hash and thumbnail of a rendered page.
+
+    Runs in the render workers on the pixmap that is about to be encoded, so
+    the only extra work is a few vectorized passes over an array that is
+    already in memory.
+
+    Args:
+        pix (fitz.Pixmap): The rendered page, gray or RGB, without alpha.
+
+    Returns:
+        Tuple[float, Optional[int], Optional[bytes]]: Fraction of ink pixels, a 256 bit
+        difference hash and a gray thumbnail of `THUMBNAIL_SHAPE`; the last two are
+        None for pages too small to hash.
+    """
+    samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    # Darkest channel: cheap on uint8 and counts coloured text as ink too.
+    if pix.n == 1:
+        gray = samples[:, :, 0]
+    else:
+        gray = np.minimum(np.minimum(samples[:, :, 0], samples[:, :, 1]), samples[:, :, 2])
+    ink = float(np.count_nonzero(gray < INK_LEVEL)) / gray.size
+
+    small = block_means(gray, HASH_SIZE, HASH_SIZE + 1)
+    thumbnail = block_means(gray, *THUMBNAIL_SHAPE)
+    if small is None or thumbnail is None:
+        return ink, None, None
+    # The margin keeps near-equal neighbours (mostly empty paper) from
+    # flipping with scanner noise.
+    bits = (small[:, 1:] > small[:, :-1] + HASH_MARGIN).flatten()
+    phash = int.from_bytes(np.packbits(bits).tobytes(), "big")
+    return ink, phash, thumbnail.round().astype(np.uint8).tobytes()
+
+
+def is_blank(ink: float) -> bool:
+    return settings.OCR_SKIP_BLANK_PAGES and ink <= settings.OCR_BLANK_PAGE_MAX_INK
+
+
+class DuplicateFinder:
+    """
+    Remembers the pages of one document and matches near-identical repeats.
+
+    Candidates are pages whose hashes differ in at most
+    `OCR_DUPLICATE_MAX_DISTANCE` bits. A candidate only counts as a duplicate
+    if no cell of the two thumbnails differs by more than
+    `OCR_DUPLICATE_MAX_PIXEL_DELTA` gray levels: the hash alone cannot tell
+    apart two pages of the same template that differ in a number, and
+    reusing the wrong page's text is worse than paying for another call. The
+    default delta therefore matches identical renders and re-encodes of the
+    same image rather than noisy rescans.
+    """
+
+    def __init__(self):
+        self.pages: List[Tuple[int, int, np.ndarray]] = []
+
+    def find(self, page_num: int, phash: Optional[int], thumbnail: Optional[bytes]) -> Optional[int]:
+        """
+        Return the earlier page this one duplicates, or remember it as an original.
+
+        Args:
+            page_num (int): Page number.
+            phash (Optional[int]): The page's hash from `page_statistics`.
+            thumbnail (Optional[bytes]): The page's thumbnail from `page_statistics`.
+
+        Returns:
+            Optional[int]: Page number of the original, or None.
+        """
+        if not settings.OCR_DEDUPLICATE_PAGES or phash is None or thumbnail is None:
+            return None
+        cells = np.frombuffer(thumbnail, dtype=np.uint8)
+        for original, original_hash, original_cells in self.pages:
+            if (phash ^ original_hash).bit_count() > settings.OCR_DUPLICATE_MAX_DISTANCE:
+                continue
+            if np.abs(cells.astype(np.int16) - original_cells).max() <= settings.OCR_DUPLICATE_MAX_PIXEL_DELTA:
+                return original
+        self.pages.append((page_num, phash, cells))
+        return None
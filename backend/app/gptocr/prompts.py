@@ -0,0 +1,135 @@
+from typing import Dict, Optional
+
+# ----------------------------
+# OCR Prompts
+# ----------------------------
+
+# The original catch-all prompt, covering identity documents, invoices and
+# everything else. Used when a document has not been classified.
+GENERAL_PROMPT = """
+                You are an OCR assistant and have ability to extract content from any type of document such as passport, driving license, adhar card, voter id card, green card, citizenship card, birth certificate, invoices, bills, contract, etc.
+                Extract all text from the provided images (Describe images as if you're explaining them to a blind person eg: `[Image: In this picture, 8 people are posed hugging each other]`), which are attached to the document. 
+                Use markdown formatting for:\n\n- Headings (# for main, ## for sub)\n- Lists (- for unordered, 1. for ordered)\n- Emphasis (* for italics, ** for bold)\n- Links ([text](URL))\n- Tables (use markdown table format)\n\nFor non-text elements, describe them: [Image: Brief description]\n\nMaintain logical flow and use horizontal rules (---) to separate sections if needed. 
+                Adjust formatting to preserve readability.\n\nNote any issues or ambiguities at the end of your output.\n\nBe thorough and accurate in transcribing all text content.
+                
+
+                ## Steps
+                1. **Translation**
+                - If the image is not in English, transform and translate the entire document into English.
+
+                2. **Classification**
+                - Identify the type of document (e.g., passport, driving license, birth certificate, invoice, electric bill, contract, etc.).
+
+                2. **Extraction**
+                - Identify key pieces of information typically present personal informations in documents of type passport, driving license, adhar card, voter id card, green card, citizenship card, birth certificate:
+                    - **Personal Information**: Name, address, date
+                    - **Identification Number**: Passport number, driving license number, adhar card number, voter id card number, green card number, citizenship card number, birth certificate number.
+                    - **Date of Issue**: Date of issue of the document.
+                    - **Date of Expiry**: Date of expiry of the document.
+                    - **Additional Information**: Any other relevant details present in the document.
+
+                - Identify key pieces of information typically present in invoices and bills:
+                    - **Vendor Information**: Name, address, contact details, GSTIN, code.
+                    - **Invoice Details**: Invoice number, date of issue, due date.
+                    - **Itemized Purchases**: List each item or service provided, including Challn No, Part No/ Item Code, HSN/SAC, description,  quantity, unit price, and total price.
+                    - **Payment Terms**: Payment methods, terms for discounts, late fees.
+                    - **Total Amount Due**: Including any applicable taxes and additional charges.
+                    - **Currency**: Specify the currency in which the transaction is made.
+                    - **Identifier** : locate a handwritten number and date stacked in the invoice and tag them to ref no, ref date. 
+
+                3. **Completion**, 
+                - Review extracted data for accuracy and completeness.
+                - Format the extracted information clearly and systematically.
+
+                # Output Format
+
+                - Provide the extracted information in a bulleted or table format for easy readability.
+                - Ensure all relevant details are included and clearly labeled for each category of information.
+
+                # Examples
+
+                - **Example 1**:
+                - Name: [Name]
+                - Address: [Address]
+                - Date of Birth: [Date]
+                - Identification Number: [ID Number]
+                - Date of Issue: [Date]
+                - Date of Expiry: [Date]
+                - Additional Information: [Details]
+
+                - **Example 2**:
+                - Vendor Name: [Vendor Name]
+                - Vendor Address: [Vendor Address]
+                - Contact: [Contact Information]
+                - Invoice Number: [Invoice Number]
+                - Date of Issue: [Date]
+                - Due Date: [Due Date]
+                - Items:
+                    - Item 1: [Item Description, Quantity, Unit Price, Total Price]
+                    - Item 2: [Item Description, Quantity, Unit Price, Total Price]
+                - Payment Terms: [Terms Description]
+                - Total Amount Due: [Total Amount]
+                - Currency: [Currency]
+                
+                # Notes
+
+                - Ensure that translations preserve the meaning and context of the original invoice.
+                - Extraction should prioritize accuracy and clarity, maintaining the integrity of financial data.
+                - If any information is unclear or missing, note the issue at the end of the output.
+                    """
+
+# Shared transcription rules, kept short: the per-type prompts below add only
+# what matters for their document type.
+TRANSCRIPTION_RULES = """You are an OCR assistant. Transcribe every page image into markdown, completely and in reading order.
+Use # / ## headings, - and 1. lists, **bold** and *italics*, and markdown tables for tabular content.
+Describe non-text elements as [Image: brief description]. Translate non-English text into English.
+Note anything illegible or ambiguous at the end of the page."""
+
+DOCUMENT_PROMPTS: Dict[str, str] = {
+    "identity": TRANSCRIPTION_RULES + """
+This is an identity document (passport, driving licence, national or voter ID, residence card, birth certificate).
+After the transcription, list: document type, full name, date of birth, address, identification number, date of issue, date of expiry, issuing authority, other details.""",
+    "invoice": TRANSCRIPTION_RULES + """
+This is an invoice, bill or receipt. Transcribe line items as a markdown table (challan no, part no/item code, HSN/SAC, description, quantity, unit price, total).
+After the transcription, list: vendor name, address, contact and GSTIN; invoice number, issue date, due date; payment terms; taxes; total amount due; currency; any handwritten reference number and date (as ref no, ref date).""",
+    "contract": TRANSCRIPTION_RULES + """
+This is a contract or agreement. Keep clause numbering and headings exactly.
+After the transcription, list: parties, effective date, term, payment obligations, termination conditions, governing law, signatories.""",
+    "other": TRANSCRIPTION_RULES,
+}
+
+# What the classifier may answer; anything else falls back to GENERAL_PROMPT.
+DOCUMENT_TYPES = tuple(DOCUMENT_PROMPTS)
+
+CLASSIFIER_PROMPT = (
+    "Classify the document shown in the image. Answer with exactly one word from: "
+    + ", ".join(DOCUMENT_TYPES)
+    + "."
+)
+
+
+def get_prompt(document_type: Optional[str]) -> str:
+    """
+    Return the system prompt for a document type.
+
+    Args:
+        document_type (Optional[str]): One of `DOCUMENT_TYPES`, or None if unknown.
+
+    Returns:
+        str: The type-specific prompt, or `GENERAL_PROMPT`.
+    """
+    return DOCUMENT_PROMPTS.get(document_type, GENERAL_PROMPT)
+
+
+def parse_document_type(answer: str) -> Optional[str]:
+    """
+    Map the classifier's answer to a document type.
+
+    Args:
+        answer (str): The model's reply.
+
+    Returns:
+        Optional[str]: A value from `DOCUMENT_TYPES`, or None if the reply names none of them.
+    """
+    words = answer.strip().lower().strip(".").split()
+    return words[0] if words and words[0] in DOCUMENT_TYPES else None
@@ -0,0 +1,441 @@
+import asyncio
+import base64
+import math
+import re
+import struct
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Mapping, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.gptocr.logger import logger
+
+# ----------------------------
+# Token Estimation
+# ----------------------------
+
+# Conservative guess for images whose size cannot be read (a portrait page at high detail).
+DEFAULT_IMAGE_TOKENS = 765
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def image_dimensions(data_url: str) -> Optional[Tuple[int, int]]:
+    """
+    Read the pixel size of a base64 data URL without decoding the whole image.
+
+    Args:
+        data_url (str): A `data:image/...;base64,` URL.
+
+    Returns:
+        Optional[Tuple[int, int]]: (width, height), or None if the header is not understood.
+    """
+    try:
+        payload = data_url.split(",", 1)[1]
+        if data_url.startswith("data:image/png"):
+            header = base64.b64decode(payload[:32])
+            if header[12:16] == b"IHDR":
+                return struct.unpack(">II", header[16:24])
+        elif data_url.startswith(("data:image/jpeg", "data:image/jpg")):
+            # SOF markers normally sit in the first few kilobytes.
+            data = base64.b64decode(payload[: 64 * 1024 // 3 * 4])
+            index = 2
+            while index + 9 < len(data):
+                if data[index] != 0xFF:
+                    return None
+                marker = data[index + 1]
+                length = struct.unpack(">H", data[index + 2 : index + 4])[0]
+                if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                    height, width = struct.unpack(">HH", data[index + 5 : index + 9])
+                    return width, height
+                index += 2 + length
+        elif data_url.startswith("data:image/webp"):
+            header = base64.b64decode(payload[:40])
+            chunk = header[12:16]
+            if chunk == b"VP8X":
+                width = int.from_bytes(header[24:27], "little") + 1
+                height = int.from_bytes(header[27:30], "little") + 1
+                return width, height
+            if chunk == b"VP8 ":
+                width, height = struct.unpack("<HH", header[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b"VP8L":
+                bits = int.from_bytes(header[21:25], "little")
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    except Exception as e:
+        logger.debug(f"Could not read image dimensions: {e}")
+    return None
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """
+    Estimate the input tokens billed for one image, following OpenAI's tiling rules.
+
+    Args:
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+        detail (str): The `detail` level sent with the image.
+
+    Returns:
+        int: Estimated image tokens.
+    """
+    if detail == "low":
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return 85 + 170 * tiles
+
+
+def estimate_request_tokens(messages: List[dict], max_output_tokens: int) -> int:
+    """
+    Estimate the tokens a chat completion request counts against the TPM budget.
+
+    The provider reserves `max_tokens` for the completion when the request is
+    admitted, so the output reservation is included in the estimate.
+
+    Args:
+        messages (List[dict]): The chat messages, as built by `build_ocr_messages`.
+        max_output_tokens (int): The `max_tokens` value sent with the request.
+
+    Returns:
+        int: Estimated prompt, image and completion tokens.
+    """
+    tokens = max_output_tokens
+    for message in messages:
+        tokens += MESSAGE_OVERHEAD_TOKENS
+        content = message["content"]
+        parts = [{"type": "text", "text": content}] if isinstance(content, str) else content
+        for part in parts:
+            if part["type"] == "text":
+                tokens += math.ceil(len(part["text"]) / CHARS_PER_TOKEN)
+            elif part["type"] == "image_url":
+                image_url = part["image_url"]
+                size = image_dimensions(image_url["url"])
+                detail = image_url.get("detail", "auto")
+                tokens += estimate_image_tokens(*size, detail) if size else DEFAULT_IMAGE_TOKENS
+    return tokens
+
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """
+    Parse rate limit reset headers such as `1s`, `6m0s` or `250ms` into seconds.
+
+    Args:
+        value (str): The header value.
+
+    Returns:
+        Optional[float]: Seconds until the limit resets, or None if unparseable.
+    """
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+# ----------------------------
+# Token Buckets
+# ----------------------------
+
+class TokenBucket:
+    """A continuously refilling token bucket."""
+
+    def __init__(self, capacity: float, per_minute: float):
+        self.capacity = capacity
+        self.rate = per_minute / 60.0
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken from the bucket."""
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.refill()
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, remaining: float) -> None:
+        """Align the bucket with the provider's view of the remaining quota."""
+        self.refill()
+        self.level = min(self.level, remaining)
+
+
+class DeploymentLimiter:
+    """RPM and TPM budgets, an in-flight cap and a circuit breaker for one model deployment."""
+
+    def __init__(self, deployment: str, rpm: int, tpm: int, max_in_flight: int):
+        self.deployment = deployment
+        self.requests = TokenBucket(rpm, rpm)
+        self.tokens = TokenBucket(tpm, tpm)
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.lock = asyncio.Lock()
+        self.blocked_until = 0.0
+        self.circuit = CircuitBreaker(
+            deployment, settings.OCR_CIRCUIT_FAILURE_THRESHOLD, settings.OCR_CIRCUIT_RESET_SECONDS
+        )
+
+    async def acquire(self, tokens: int) -> None:
+        # The lock keeps admission FIFO, so one large batch cannot be starved
+        # by a stream of smaller ones.
+        async with self.lock:
+            while True:
+                wait = max(
+                    self.blocked_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(tokens),
+                )
+                if wait <= 0:
+                    break
+                logger.debug(f"Rate limiter for {self.deployment} waiting {wait:.2f}s.")
+                await asyncio.sleep(wait)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+
+# ----------------------------
+# Circuit Breaker
+# ----------------------------
+
+class CircuitOpenError(HTTPException):
+    """Raised instead of sending a request while a deployment's circuit is open; never retried."""
+
+    def __init__(self, deployment: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"OCR service for {deployment} is unavailable; not retrying for {retry_after:.0f}s.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+class CircuitBreaker:
+    """
+    Fails requests to a deployment fast while the provider is down.
+
+    After `OCR_CIRCUIT_FAILURE_THRESHOLD` consecutive availability failures
+    (server errors, timeouts, connection errors) the circuit opens and every
+    request fails immediately for `OCR_CIRCUIT_RESET_SECONDS`. Then one trial
+    request is let through while the others wait for it: success closes the
+    circuit, failure opens it for another period. Rate limiting and client
+    errors show the provider is up and count as successes.
+    """
+
+    def __init__(self, deployment: str, threshold: int, reset_seconds: float):
+        self.deployment = deployment
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.trial_finished = asyncio.Event()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets a trial request through, 0 unless it is open."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    async def check(self) -> None:
+        """
+        Wait until a request may be sent.
+
+        While the circuit is half-open, the first caller becomes the trial
+        request and the others wait for its outcome.
+
+        Raises:
+            CircuitOpenError: If the circuit is (or, after a failed trial, is again) open.
+        """
+        while self.opened_at is not None:
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(self.deployment, remaining)
+            if not self.trial_in_flight:
+                self.trial_in_flight = True
+                self.trial_finished.clear()
+                return
+            await self.trial_finished.wait()
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info(f"Circuit for {self.deployment} closed.")
+        self.failures = 0
+        self.opened_at = None
+        self.end_trial()
+
+    def abandon(self) -> None:
+        """Forget a request that ended without telling anything about the provider, e.g. cancelled."""
+        self.end_trial()
+
+    def end_trial(self) -> None:
+        self.trial_in_flight = False
+        self.trial_finished.set()
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        half_open = self.trial_in_flight
+        self.end_trial()
+        if half_open or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            logger.warning(
+                f"Circuit for {self.deployment} opened after {self.failures} failures; "
+                f"failing fast for {self.reset_seconds:.0f}s."
+            )
+
+# ----------------------------
+# Scheduler
+# ----------------------------
+
+class RateLimitScheduler:
+    """
+    Process-wide admission control for OpenAI requests.
+
+    Each deployment gets its own RPM/TPM token buckets, sized from
+    `OPENAI_RATE_LIMITS` (falling back to `OPENAI_RPM_LIMIT`/`OPENAI_TPM_LIMIT`),
+    and a cap on concurrent requests. Rate limit response headers are fed back so
+    the buckets track the provider's remaining quota, which is shared with every
+    other process using the same key.
+    """
+
+    def __init__(self):
+        self.limiters: Dict[str, DeploymentLimiter] = {}
+
+    def limiter_for(self, deployment: str) -> DeploymentLimiter:
+        if deployment not in self.limiters:
+            limits = settings.OPENAI_RATE_LIMITS.get(deployment, {})
+            self.limiters[deployment] = DeploymentLimiter(
+                deployment,
+                rpm=limits.get("rpm", settings.OPENAI_RPM_LIMIT),
+                tpm=limits.get("tpm", settings.OPENAI_TPM_LIMIT),
+                max_in_flight=limits.get("max_in_flight", settings.OCR_MAX_CONCURRENT_REQUESTS),
+            )
+        return self.limiters[deployment]
+
+    @asynccontextmanager
+    async def in_flight(self, deployment: str) -> AsyncIterator[None]:
+        """
+        Hold one of the deployment's concurrent request slots, including retries
+        and the time spent reading a streamed response.
+
+        Args:
+            deployment (str): The model deployment the request is sent to.
+        """
+        async with self.limiter_for(deployment).in_flight:
+            yield
+
+    def circuit(self, deployment: str) -> CircuitBreaker:
+        return self.limiter_for(deployment).circuit
+
+    def circuit_states(self) -> Dict[str, str]:
+        """Circuit state (closed, open or half_open) of every deployment used so far."""
+        return {deployment: limiter.circuit.state for deployment, limiter in self.limiters.items()}
+
+    def circuit_retry_after(self) -> Optional[float]:
+        """
+        Seconds until every open circuit lets a trial request through.
+
+        Returns:
+            Optional[float]: The longest wait, 0 while a circuit is half-open,
+            or None if every circuit is closed.
+        """
+        waits = [
+            limiter.circuit.retry_after
+            for limiter in self.limiters.values()
+            if limiter.circuit.state != "closed"
+        ]
+        return max(waits) if waits else None
+
+    async def admit(self, deployment: str, tokens: int) -> None:
+        """
+        Wait until a request of `tokens` estimated tokens fits the deployment's budget.
+
+        Called once per attempt, so a retry after a 429 honours the pause set by `penalize`.
+
+        Args:
+            deployment (str): The model deployment the request is sent to.
+            tokens (int): Estimated tokens, see `estimate_request_tokens`.
+        """
+        await self.limiter_for(deployment).acquire(tokens)
+
+    def update_from_headers(self, deployment: str, headers: Mapping[str, str]) -> None:
+        """
+        Feed `x-ratelimit-*` response headers back into the deployment's buckets.
+
+        Args:
+            deployment (str): The model deployment that answered.
+            headers (Mapping[str, str]): The HTTP response headers.
+        """
+        limiter = self.limiter_for(deployment)
+        for kind, bucket in (("requests", limiter.requests), ("tokens", limiter.tokens)):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            try:
+                remaining_value = float(remaining)
+            except ValueError:
+                logger.debug(f"Ignoring malformed rate limit header: {remaining}")
+                continue
+            bucket.sync(remaining_value)
+            reset = headers.get(f"x-ratelimit-reset-{kind}")
+            reset_seconds = parse_reset_duration(reset) if reset else None
+            if remaining_value <= 0 and reset_seconds:
+                limiter.blocked_until = max(limiter.blocked_until, time.monotonic() + reset_seconds)
+
+    def penalize(self, deployment: str, retry_after: Optional[float]) -> None:
+        """
+        Pause admissions after the provider rejected a request with a 429.
+
+        Args:
+            deployment (str): The model deployment that returned 429.
+            retry_after (Optional[float]): Server supplied delay in seconds, if any.
+        """
+        limiter = self.limiter_for(deployment)
+        delay = retry_after if retry_after is not None else 60.0 / max(limiter.requests.capacity, 1)
+        limiter.blocked_until = max(limiter.blocked_until, time.monotonic() + delay)
+        limiter.tokens.sync(0)
+        logger.warning(f"Rate limited on {deployment}; pausing admissions for {delay:.2f}s.")
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Read `retry-after-ms` / `retry-after` from response headers.
+
+    Args:
+        headers (Mapping[str, str]): The HTTP response headers.
+
+    Returns:
+        Optional[float]: The delay in seconds, or None if absent.
+    """
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+# Process-wide scheduler shared by every OCR request
+rate_limiter = RateLimitScheduler()
@@ -0,0 +1,307 @@
+import math
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+
+from app.core.config import settings
+from app.gptocr.hybridocr import TesseractReading, load_tesseract, read_page
+from app.gptocr.imageencoding import ImageEncoding, encode_pixmap, rasterize
+from app.gptocr.logger import logger
+from app.gptocr.pagefilter import is_blank, page_statistics
+from app.gptocr.ratelimiter import estimate_image_tokens
+from app.gptocr.textlayer import extract_text_layer
+
+# ----------------------------
+# Shared Page Buffers
+# ----------------------------
+
+class SharedPage:
+    """
+    Handle to one page's image data URL stored in a shared memory segment.
+
+    Render workers base64-encode pages themselves and write the data URLs into
+    shared memory, so only these small handles are pickled back to the parent.
+    The string is materialized in the parent only when `data_url()` is called
+    while building the request.
+    """
+
+    __slots__ = ("shm_name", "offset", "length", "detail", "image_tokens", "ink", "phash", "thumbnail", "tesseract")
+
+    def __init__(
+        self,
+        shm_name: str,
+        offset: int,
+        length: int,
+        detail: Optional[str] = None,
+        image_tokens: Optional[int] = None,
+        ink: Optional[float] = None,
+        phash: Optional[int] = None,
+        thumbnail: Optional[bytes] = None,
+        tesseract: Optional[TesseractReading] = None,
+    ):
+        self.shm_name = shm_name
+        self.offset = offset
+        self.length = length
+        self.detail = detail
+        self.image_tokens = image_tokens
+        self.ink = ink
+        self.phash = phash
+        self.thumbnail = thumbnail
+        # In hybrid mode, the Tesseract reading that was not good enough
+        self.tesseract = tesseract
+
+    def data_url(self) -> str:
+        segment = attached_segments.get(self.shm_name)
+        if segment is None:
+            segment = attached_segments[self.shm_name] = shared_memory.SharedMemory(name=self.shm_name)
+        return bytes(segment.buf[self.offset : self.offset + self.length]).decode("ascii")
+
+
+class TextLayerPage:
+    """A page whose markdown was taken from the PDF's embedded text instead of rendered."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class TesseractPage:
+    """A page Tesseract read with enough confidence and coverage to skip the model; see `OCR_HYBRID_ENABLED`."""
+
+    __slots__ = ("reading",)
+
+    def __init__(self, reading: TesseractReading):
+        self.reading = reading
+
+
+class BlankPage:
+    """A page skipped because it has (almost) no ink; see `OCR_BLANK_PAGE_MAX_INK`."""
+
+    __slots__ = ("ink",)
+
+    def __init__(self, ink: float):
+        self.ink = ink
+
+
+# Segments the parent process has mapped, by name
+attached_segments: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def release_pages(pages: Iterable[object]) -> None:
+    """
+    Unmap and unlink the shared memory behind a document's pages.
+
+    Args:
+        pages (Iterable[object]): Page images; anything that is not a SharedPage is ignored.
+    """
+    for name in {page.shm_name for page in pages if isinstance(page, SharedPage)}:
+        segment = attached_segments.pop(name, None)
+        try:
+            if segment is None:
+                segment = shared_memory.SharedMemory(name=name)
+            segment.close()
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+class SegmentTracker:
+    """
+    Reference counts the pages handed out from each shared memory segment so a
+    range's segment can be unlinked as soon as the last of its pages is done.
+    """
+
+    def __init__(self):
+        self.pending: Dict[str, int] = {}
+
+    def add(self, pages: Iterable[object]) -> None:
+        for page in pages:
+            if isinstance(page, SharedPage):
+                self.pending[page.shm_name] = self.pending.get(page.shm_name, 0) + 1
+
+    def done(self, pages: Iterable[object]) -> None:
+        for page in pages:
+            if not isinstance(page, SharedPage) or page.shm_name not in self.pending:
+                continue
+            self.pending[page.shm_name] -= 1
+            if self.pending[page.shm_name] == 0:
+                del self.pending[page.shm_name]
+                release_pages([page])
+
+    def release_all(self) -> None:
+        for name in list(self.pending):
+            release_pages([SharedPage(name, 0, 0)])
+        self.pending.clear()
+
+# ----------------------------
+# Worker Side
+# ----------------------------
+
+def warm_worker() -> None:
+    """Pool initializer: make sure PyMuPDF (and Tesseract in hybrid mode) is loaded before the first real task."""
+    fitz.open().close()
+    if settings.OCR_HYBRID_ENABLED:
+        load_tesseract()
+
+
+def render_page_range(
+    pdf_path: str,
+    start: int,
+    end: int,
+    encoding: ImageEncoding,
+    use_text_layer: bool = False,
+    use_tesseract: bool = False,
+) -> List[Tuple[int, Union[SharedPage, TextLayerPage, BlankPage, TesseractPage]]]:
+    """
+    Render a contiguous range of PDF pages, opening the document once, and
+    place their image data URLs in a single shared memory segment.
+
+    The segment is left for the parent to unlink with `release_pages`. Ink
+    coverage, a perceptual hash and a thumbnail are computed for every rendered page;
+    blank pages are returned as `BlankPage` without being encoded.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        start (int): First page to render (0-based, inclusive).
+        end (int): Last page to render (0-based, exclusive).
+        encoding (ImageEncoding): Rendering and encoding settings.
+        use_text_layer (bool): Return pages with a usable embedded text layer
+            as `TextLayerPage` instead of rendering them.
+        use_tesseract (bool): Read each page that is neither answered by the
+            text layer nor skipped as blank with Tesseract, and return it as
+            `TesseractPage` when the reading is accepted.
+
+    Returns:
+        List[Tuple[int, Union[SharedPage, TextLayerPage, BlankPage, TesseractPage]]]: (page number
+        starting at 1, page) for each page.
+    """
+    skipped: Dict[int, Union[TextLayerPage, BlankPage, TesseractPage]] = {}
+    encoded = []
+    with fitz.open(pdf_path) as doc:
+        for page_num in range(start, end):
+            page = doc.load_page(page_num)
+            text = extract_text_layer(page) if use_text_layer else None
+            if text is not None:
+                skipped[page_num] = TextLayerPage(text)
+                continue
+            pix = rasterize(page, encoding)
+            ink, phash, thumbnail = page_statistics(pix)
+            if is_blank(ink):
+                skipped[page_num] = BlankPage(ink)
+                continue
+            reading = read_page(page) if use_tesseract else None
+            if reading:
+                logger.debug(
+                    f"Tesseract read page {page_num + 1} of {pdf_path} with confidence {reading.confidence} and "
+                    f"coverage {reading.coverage} in {reading.duration_ms} ms; "
+                    f"{'accepted' if reading.accepted else 'sending it to the model'}."
+                )
+            if reading and reading.accepted:
+                skipped[page_num] = TesseractPage(reading)
+                continue
+            url, detail = encode_pixmap(pix, encoding)
+            image_tokens = estimate_image_tokens(pix.width, pix.height, detail)
+            encoded.append((page_num, url, detail, image_tokens, ink, phash, thumbnail, reading))
+            del pix
+
+    pages: List[Tuple[int, Union[SharedPage, TextLayerPage, BlankPage, TesseractPage]]] = [
+        (page_num + 1, page) for page_num, page in skipped.items()
+    ]
+    if encoded:
+        segment = shared_memory.SharedMemory(create=True, size=sum(len(item[1]) for item in encoded))
+        offset = 0
+        for page_num, url, *page_info in encoded:
+            segment.buf[offset : offset + len(url)] = url
+            pages.append((page_num + 1, SharedPage(segment.name, offset, len(url), *page_info)))
+            offset += len(url)
+        segment.close()
+        logger.debug(f"Rendered {len(encoded)} of pages {start + 1}-{end} of {pdf_path} into {segment.name}.")
+    pages.sort(key=lambda item: item[0])
+    return pages
+
+# ----------------------------
+# Render Pool
+# ----------------------------
+
+class RenderPool:
+    """
+    Long-lived process pool for PDF rendering.
+
+    Workers are spawned and warmed up once at application startup, keep
+    PyMuPDF imported, and receive page ranges rather than single pages so
+    each task parses the document's xref only once. The number of documents
+    converted at the same time is bounded separately by
+    `MAX_CONCURRENT_PDF_CONVERSION`.
+    """
+
+    def __init__(self):
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.lock = threading.Lock()
+        self.conversions = threading.BoundedSemaphore(settings.MAX_CONCURRENT_PDF_CONVERSION)
+
+    @property
+    def size(self) -> int:
+        return settings.PDF_RENDER_POOL_SIZE or multiprocessing.cpu_count()
+
+    def start(self) -> None:
+        """Create the worker processes and wait until every one of them is ready."""
+        with self.lock:
+            if self.executor is not None:
+                return
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_worker,
+            )
+            # Process pools start workers on demand; submit one task per worker
+            # so the spawn cost is paid now instead of on the first upload.
+            for future in [self.executor.submit(warm_worker) for _ in range(self.size)]:
+                future.result()
+        logger.info(f"Started PDF render pool with {self.size} workers.")
+
+    def shutdown(self) -> None:
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True, cancel_futures=True)
+                self.executor = None
+                logger.info("Shut down PDF render pool.")
+
+    def page_ranges(self, page_count: int, first_page: int = 0) -> List[Tuple[int, int]]:
+        """
+        Split a document into contiguous page ranges, one task each.
+
+        Ranges are small enough to spread a document over every worker but no
+        larger than `PDF_RENDER_CHUNK_PAGES`, so large documents still interleave
+        fairly with other uploads.
+
+        Args:
+            page_count (int): Number of pages in the document, or the end of the pages to split.
+            first_page (int): Index of the first page to split, for a shard of a document.
+
+        Returns:
+            List[Tuple[int, int]]: (start, end) page indices, end exclusive.
+        """
+        chunk = max(1, min(settings.PDF_RENDER_CHUNK_PAGES, math.ceil((page_count - first_page) / self.size)))
+        return [(start, min(start + chunk, page_count)) for start in range(first_page, page_count, chunk)]
+
+    def submit(
+        self,
+        pdf_path: str,
+        start: int,
+        end: int,
+        encoding: ImageEncoding,
+        use_text_layer: bool = False,
+        use_tesseract: bool = False,
+    ) -> Future:
+        if self.executor is None:
+            self.start()
+        return self.executor.submit(
+            render_page_range, pdf_path, start, end, encoding, use_text_layer, use_tesseract
+        )
+
+# Process-wide render pool, started and stopped with the application
+render_pool = RenderPool()
@@ -0,0 +1,78 @@
+from typing import List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from app.core.config import settings
+
+# ----------------------------
+# Embedded Text Layer
+# ----------------------------
+
+def image_coverage(page: fitz.Page) -> float:
+    """
+    Fraction of the page area covered by raster images.
+
+    Args:
+        page (fitz.Page): The page to inspect.
+
+    Returns:
+        float: Covered fraction between 0 and 1 (overlapping images can exceed 1).
+    """
+    page_area = abs(page.rect) or 1.0
+    covered = 0.0
+    for info in page.get_image_info():
+        covered += abs(fitz.Rect(info["bbox"]) & page.rect)
+    return covered / page_area
+
+
+def text_is_reliable(text: str) -> bool:
+    """
+    Check that extracted text looks like real text rather than broken font mappings.
+
+    PDFs with missing ToUnicode maps extract as replacement characters or
+    control codes; those pages still need vision OCR.
+    """
+    visible = [char for char in text if not char.isspace()]
+    if len(visible) < settings.OCR_TEXT_LAYER_MIN_CHARS:
+        return False
+    broken = sum(1 for char in visible if char == "�" or not char.isprintable())
+    alphanumeric = sum(1 for char in visible if char.isalnum())
+    return broken / len(visible) < 0.01 and alphanumeric / len(visible) > 0.5
+
+
+def extract_text_layer(page: fitz.Page) -> Optional[str]:
+    """
+    Return the page's embedded text as markdown, if it can stand in for vision OCR.
+
+    A page qualifies when it carries at least `OCR_TEXT_LAYER_MIN_CHARS` of
+    clean text and raster images cover no more than
+    `OCR_TEXT_LAYER_MAX_IMAGE_COVERAGE` of it; scans with an invisible OCR
+    layer or image-heavy pages are left to the model. Tables found by
+    PyMuPDF are emitted as markdown tables, in reading order with the
+    surrounding text blocks.
+
+    Args:
+        page (fitz.Page): The page to extract.
+
+    Returns:
+        Optional[str]: Markdown for the page, or None if it needs vision OCR.
+    """
+    if image_coverage(page) > settings.OCR_TEXT_LAYER_MAX_IMAGE_COVERAGE:
+        return None
+    if not text_is_reliable(page.get_text("text")):
+        return None
+
+    tables = page.find_tables().tables
+    table_rects = [fitz.Rect(table.bbox) for table in tables]
+    parts: List[Tuple[float, float, str]] = [
+        (rect.y0, rect.x0, table.to_markdown().strip()) for rect, table in zip(table_rects, tables)
+    ]
+    for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks", sort=True):
+        if block_type != 0 or not text.strip():
+            continue
+        block = fitz.Rect(x0, y0, x1, y1)
+        if any(abs(block & rect) > 0.5 * abs(block) for rect in table_rects):
+            continue
+        parts.append((y0, x0, " ".join(line.strip() for line in text.splitlines() if line.strip())))
+    parts.sort(key=lambda part: (part[0], part[1]))
+    return "\n\n".join(text for _, _, text in parts)
@@ -0,0 +1,293 @@
+import asyncio
+import hashlib
+import ipaddress
+import json
+import os
+import posixpath
+import tempfile
+from typing import Dict, NamedTuple, Optional, Union
+
+import httpx
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.uploads import sniff_content_type
+from app.gptocr.logger import logger
+from app.gptocr.model.gptmodel import OCRResponse
+from app.gptocr.ocrcache import ocr_cache
+from app.gptocr.prompts import DOCUMENT_TYPES, get_prompt
+from app.gptocr.utilityFunction import render_settings_key
+
+# ----------------------------
+# URL Ingestion
+# ----------------------------
+
+class RemoteDocument(NamedTuple):
+    """A document fetched by `URLFetcher.fetch`."""
+    url: str
+    filename: str
+    # Downloaded file, None when `result` was reused; the caller deletes it
+    path: Optional[str] = None
+    # ETag and Last-Modified of the download, if the server sent them
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    # OCR result of an earlier download the server confirmed is unchanged
+    result: Optional[OCRResponse] = None
+
+
+def url_filename(url: str) -> str:
+    """Name to record for a document fetched from `url`."""
+    parsed = httpx.URL(url)
+    return (posixpath.basename(parsed.path) or parsed.host or url)[:255]
+
+
+def remote_result_key(url: str, use_text_layer: bool) -> str:
+    """
+    Cache key of the OCR result of a remote document.
+
+    Covers everything besides the document itself that determines the
+    result; the document is covered by the stored ETag/Last-Modified.
+    """
+    prompts = "\0".join(get_prompt(document_type) for document_type in (None, *DOCUMENT_TYPES))
+    hybrid = (
+        f"{settings.OCR_HYBRID_MIN_CONFIDENCE}:{settings.OCR_HYBRID_MIN_COVERAGE}:{settings.TESSERACT_LANG}"
+        if settings.OCR_HYBRID_ENABLED
+        else ""
+    )
+    digest = hashlib.sha256()
+    parts = ("url", url, str(use_text_layer), hybrid, settings.OPENAI_DEPLOYMENT_ID, render_settings_key(), prompts)
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def is_public_address(address: Union[ipaddress.IPv4Address, ipaddress.IPv6Address]) -> bool:
+    if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    # is_global excludes private, loopback, link-local, shared and reserved ranges
+    return address.is_global and not address.is_multicast
+
+
+async def check_url(url: httpx.URL) -> None:
+    """
+    Reject URLs the server must not fetch on a user's behalf.
+
+    Only http and https are allowed, and every address the host resolves to
+    must be public, so users cannot reach loopback, private networks or
+    link-local services such as cloud metadata endpoints through the
+    fetcher. `URL_FETCH_ALLOW_PRIVATE_HOSTS` lifts the address check.
+
+    Raises:
+        HTTPException: If the URL is not allowed or its host does not resolve.
+    """
+    if url.scheme not in ("http", "https") or not url.host:
+        raise HTTPException(status_code=400, detail="Only http and https URLs can be fetched.")
+    if settings.URL_FETCH_ALLOW_PRIVATE_HOSTS:
+        return
+    try:
+        addresses = [ipaddress.ip_address(url.host)]
+    except ValueError:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(url.host, url.port or None)
+        except OSError as e:
+            raise HTTPException(status_code=400, detail=f"Could not resolve host {url.host}: {e}")
+        addresses = [ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos]
+    if not addresses or not all(is_public_address(address) for address in addresses):
+        logger.warning(f"Refused to fetch {url}: {url.host} is not a public address.")
+        raise HTTPException(status_code=400, detail="URL points to a host that cannot be fetched.")
+
+
+def document_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Document exceeds the limit of {settings.MAX_UPLOAD_BYTES // (1024 * 1024)} MB.",
+    )
+
+
+class URLFetcher:
+    """
+    Downloads documents by URL over one shared, keep-alive connection pool.
+
+    Downloads are streamed to a temporary file in `UPLOAD_CHUNK_BYTES`
+    chunks and stopped as soon as they pass `MAX_UPLOAD_BYTES` or turn out
+    not to be a PDF. At most `URL_FETCH_MAX_PER_HOST` downloads run against
+    one host at a time. Only public http(s) URLs are fetched, see
+    `check_url`. When a remote document was OCR'd before and its
+    server sent an ETag or Last-Modified, the next fetch is a conditional
+    request and a 304 Not Modified reuses the stored result.
+    """
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.URL_FETCH_TIMEOUT, connect=settings.URL_FETCH_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.URL_FETCH_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.URL_FETCH_MAX_CONNECTIONS,
+            ),
+            # Redirects are followed in `open`, which checks every hop
+            follow_redirects=False,
+        )
+        self.host_slots: Dict[str, asyncio.Semaphore] = {}
+        self.counters: Dict[str, int] = {"downloads": 0, "not_modified": 0, "bytes": 0}
+
+    async def close(self) -> None:
+        """
+        Close the underlying HTTP connection pool. Called on application shutdown.
+        """
+        await self.client.aclose()
+        logger.info("Closed URL fetch connection pool.")
+
+    async def open(self, url: str, headers: Dict[str, str]) -> httpx.Response:
+        """
+        Send a streamed GET, following up to `URL_FETCH_MAX_REDIRECTS` redirects.
+
+        Every URL on the way is checked with `check_url` before it is requested.
+        The caller closes the returned response.
+
+        Raises:
+            HTTPException: If a URL is not allowed or there are too many redirects.
+        """
+        request_url = httpx.URL(url)
+        for _ in range(settings.URL_FETCH_MAX_REDIRECTS + 1):
+            await check_url(request_url)
+            response = await self.client.send(
+                self.client.build_request("GET", request_url, headers=headers), stream=True
+            )
+            if not (response.is_redirect and "Location" in response.headers):
+                return response
+            await response.aclose()
+            request_url = request_url.join(response.headers["Location"])
+        raise HTTPException(status_code=400, detail=f"Too many redirects while downloading the PDF from {url}.")
+
+    def host_slot(self, url: str) -> asyncio.Semaphore:
+        host = httpx.URL(url).netloc.decode()
+        if host not in self.host_slots:
+            self.host_slots[host] = asyncio.Semaphore(settings.URL_FETCH_MAX_PER_HOST)
+        return self.host_slots[host]
+
+    async def fetch(self, url: str, use_text_layer: Optional[bool] = None) -> RemoteDocument:
+        """
+        Fetch a PDF by URL.
+
+        Args:
+            url (str): The URL of the PDF.
+            use_text_layer (Optional[bool]): Text layer setting of the OCR the document is
+                fetched for; when given, a stored result for the same setting may be reused.
+
+        Returns:
+            RemoteDocument: The downloaded file, or the reused result.
+
+        Raises:
+            HTTPException: If the URL is not allowed, or the download fails, is too large or is not a PDF.
+        """
+        filename = url_filename(url)
+        stored = None
+        if use_text_layer is not None:
+            cached = await ocr_cache.get(remote_result_key(url, use_text_layer))
+            stored = json.loads(cached) if cached else None
+
+        headers = {}
+        if stored and stored.get("etag"):
+            headers["If-None-Match"] = stored["etag"]
+        if stored and stored.get("last_modified"):
+            headers["If-Modified-Since"] = stored["last_modified"]
+
+        async with self.host_slot(url):
+            try:
+                response = await self.open(url, headers)
+                try:
+                    if response.status_code == 304 and stored:
+                        self.counters["not_modified"] += 1
+                        logger.info(f"{url} is unchanged; reusing its OCR result.")
+                        return RemoteDocument(
+                            url=url,
+                            filename=filename,
+                            etag=stored.get("etag"),
+                            last_modified=stored.get("last_modified"),
+                            result=OCRResponse.model_validate(stored["response"]),
+                        )
+                    response.raise_for_status()
+                    path = await self.download(url, response)
+                    return RemoteDocument(
+                        url=url,
+                        filename=filename,
+                        path=path,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                    )
+                finally:
+                    await response.aclose()
+            except httpx.TimeoutException:
+                logger.error(f"Timeout while downloading PDF from {url}.")
+                raise HTTPException(
+                    status_code=504, detail="Timeout occurred while downloading the PDF."
+                )
+            except httpx.HTTPStatusError as e:
+                logger.error(f"HTTP error while downloading PDF from {url}: {e}")
+                raise HTTPException(
+                    status_code=400, detail=f"HTTP error occurred: {e}"
+                )
+            except (httpx.HTTPError, httpx.InvalidURL) as e:
+                logger.error(f"Error while downloading PDF from {url}: {e}")
+                raise HTTPException(
+                    status_code=400, detail=f"Failed to download PDF: {e}"
+                )
+
+    async def download(self, url: str, response: httpx.Response) -> str:
+        content_length = response.headers.get("Content-Length", "")
+        if content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_BYTES:
+            raise document_too_large()
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+            path = tmp_file.name
+        size = 0
+        try:
+            with open(path, "wb") as out:
+                async for chunk in response.aiter_bytes(settings.UPLOAD_CHUNK_BYTES):
+                    if size == 0 and sniff_content_type(chunk) != "application/pdf":
+                        logger.warning(f"URL {url} does not point to a PDF.")
+                        raise HTTPException(
+                            status_code=400, detail="URL does not point to a valid PDF file."
+                        )
+                    size += len(chunk)
+                    if size > settings.MAX_UPLOAD_BYTES:
+                        raise document_too_large()
+                    await asyncio.to_thread(out.write, chunk)
+            if not size:
+                raise HTTPException(status_code=400, detail="URL does not point to a valid PDF file.")
+        except BaseException:
+            os.remove(path)
+            raise
+        self.counters["downloads"] += 1
+        self.counters["bytes"] += size
+        logger.info(f"Downloaded PDF from {url}, size: {size} bytes.")
+        return path
+
+    async def store_result(self, document: RemoteDocument, use_text_layer: bool, response: OCRResponse) -> None:
+        """
+        Keep the OCR result of a downloaded document for conditional re-fetches.
+
+        Nothing is stored when the server sent neither ETag nor Last-Modified,
+        or when pages failed.
+        """
+        if not (document.etag or document.last_modified) or response.failed_pages:
+            return
+        entry = {
+            "etag": document.etag,
+            "last_modified": document.last_modified,
+            "response": response.model_dump(mode="json"),
+        }
+        await ocr_cache.set(remote_result_key(document.url, use_text_layer), json.dumps(entry))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Download counters.
+
+        Returns:
+            Dict[str, int]: Full downloads, 304 answers and bytes downloaded since startup.
+        """
+        return dict(self.counters)
+
+# Process-wide URL fetcher
+url_fetcher = URLFetcher()
@@ -1,93 +1,110 @@
 import asyncio
 import base64
-from typing import Any, Callable, List, Tuple
+import random
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, List, Mapping, Optional, Tuple, Union
 
 import fitz  # PyMuPDF
 from fastapi import HTTPException
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import Future, as_completed
+from app.gptocr.imageencoding import ImageEncoding
 from app.gptocr.logger import logger
+from app.gptocr.ratelimiter import CircuitOpenError, retry_after_seconds
+from app.gptocr.renderpool import (
+    BlankPage,
+    SegmentTracker,
+    SharedPage,
+    TesseractPage,
+    TextLayerPage,
+    release_pages,
+    render_pool,
+)
 from app.core.config import settings
 
 # ----------------------------
 # Utility Functions
 # ----------------------------
 
-def convert_page_to_image(args: Tuple[str, int, int]) -> Tuple[int, bytes]:
+# A page image is either an already encoded data URL or a handle to one in shared memory.
+PageImage = Union[str, SharedPage]
+# What the render pool hands back for a page: an image to OCR, its embedded
+# text, an accepted Tesseract reading, or a blank marker.
+RenderedPage = Union[SharedPage, TextLayerPage, BlankPage, TesseractPage]
+
+# Rate limited, provider unavailable, timed out: worth another attempt.
+RETRYABLE_STATUS_CODES = {429, 503, 504}
+
+def render_settings_key(encoding: Optional[ImageEncoding] = None) -> str:
     """
-    Convert a single PDF page to PNG image bytes using PyMuPDF.
+    Describe how page images are rendered, for use in OCR cache keys.
 
     Args:
-        args (Tuple[str, int, int]): A tuple containing:
-            - pdf_path (str): Path to the PDF file.
-            - page_num (int): Page number to convert (0-based).
-            - zoom (int): Zoom factor for rendering.
+        encoding (Optional[ImageEncoding]): Render settings, defaults to the configured ones.
 
     Returns:
-        Tuple[int, bytes]: A tuple of page number and image bytes.
-
-    Raises:
-        Exception: If rendering fails.
+        str: A stable description of the renderer and its settings.
     """
-    pdf_path, page_num, zoom = args
-    try:
-        doc = fitz.open(pdf_path)
-        page = doc.load_page(page_num)
-        matrix = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=matrix)
-        image_bytes = pix.tobytes("png")
-        logger.debug(
-            f"Rendered page {page_num + 1}/{doc.page_count}, size: {len(image_bytes)} bytes."
-        )
-        doc.close()
-        return (page_num + 1, image_bytes)  # Page numbers start at 1
-    except Exception as e:
-        logger.error(f"Error rendering page {page_num + 1}: {e}")
-        raise
+    return (encoding or ImageEncoding.from_settings()).cache_key()
 
-def convert_pdf_to_images_pymupdf(pdf_path: str, zoom: int = 2) -> List[Tuple[int, bytes]]:
+def convert_pdf_to_images_pymupdf(
+    pdf_path: str, encoding: Optional[ImageEncoding] = None, use_text_layer: bool = False
+) -> List[Tuple[int, Union[SharedPage, TextLayerPage, BlankPage]]]:
     """
-    Convert a PDF file to a list of PNG image bytes using PyMuPDF with multiprocessing.
+    Convert a PDF file to image data URLs using the shared PyMuPDF render pool.
+
+    The workers encode the pages and leave them in shared memory; the caller
+    must free them with `release_pages` once OCR is done. With
+    `OCR_SKIP_BLANK_PAGES`, blank pages come back as `BlankPage` instead.
 
     Args:
         pdf_path (str): Path to the PDF file.
-        zoom (int): Zoom factor for rendering.
+        encoding (Optional[ImageEncoding]): Render settings, defaults to the configured ones.
+        use_text_layer (bool): Return pages with a usable embedded text layer as
+            `TextLayerPage` instead of rendering them.
 
     Returns:
-        List[Tuple[int, bytes]]: List of tuples containing page number and PNG image bytes.
+        List[Tuple[int, Union[SharedPage, TextLayerPage, BlankPage]]]: List of tuples containing page
+        number and a shared page handle, the embedded text, or a `BlankPage` for a blank page.
 
     Raises:
         HTTPException: If conversion fails.
     """
+    encoding = encoding or ImageEncoding.from_settings()
     try:
         doc = fitz.open(pdf_path)
         page_count = doc.page_count
         doc.close()
         logger.info(f"PDF loaded with {page_count} pages.")
 
-        # Prepare arguments for each page
-        args_list = [(pdf_path, i, zoom) for i in range(page_count)]
-
-        image_bytes_list: List[Tuple[int, bytes]] = []  # List of (page_num, image_bytes)
+        image_bytes_list: List[Tuple[int, Union[SharedPage, TextLayerPage, BlankPage]]] = []  # (page_num, page)
 
-        with ProcessPoolExecutor(max_workers=settings.MAX_CONCURRENT_PDF_CONVERSION) as executor:
-        #with ProcessPoolExecutor(max_workers=4) as executor:
-            # Submit all tasks
-            future_to_page = {
-                executor.submit(convert_page_to_image, args): args[1]
-                for args in args_list
+        # Bound the number of documents rendering at once; the pool itself is shared.
+        with render_pool.conversions:
+            future_to_range = {
+                render_pool.submit(pdf_path, start, end, encoding, use_text_layer): (start, end)
+                for start, end in render_pool.page_ranges(page_count)
             }
 
-            for future in as_completed(future_to_page):
-                page_num = future_to_page[future]
-                try:
-                    page_num_result, image_bytes = future.result()
-                    image_bytes_list.append((page_num_result, image_bytes))
-                except Exception as e:
-                    logger.error(f"Failed to convert page {page_num + 1}: {e}")
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Failed to convert page {page_num + 1} to image.",
-                    )
+            collected = set()
+            try:
+                for future in as_completed(future_to_range):
+                    start, end = future_to_range[future]
+                    try:
+                        image_bytes_list.extend(future.result())
+                        collected.add(future)
+                    except Exception as e:
+                        logger.error(f"Failed to convert pages {start + 1}-{end}: {e}")
+                        raise HTTPException(
+                            status_code=500,
+                            detail=f"Failed to convert pages {start + 1}-{end} to images.",
+                        )
+            except BaseException:
+                # Free the pages rendered so far, and those of ranges still rendering once they land.
+                release_pages(image for _, image in image_bytes_list)
+                for future in future_to_range:
+                    if future not in collected and not future.cancel():
+                        future.add_done_callback(release_range)
+                raise
 
         # Sort the list by page number to maintain order
         image_bytes_list.sort(key=lambda x: x[0])
@@ -103,6 +120,131 @@ def convert_pdf_to_images_pymupdf(pdf_path: str, zoom: int = 2) -> List[Tuple[in
             status_code=500, detail=f"Failed to convert PDF to images: {e}"
         )
 
+def count_pdf_pages(pdf_path: str) -> int:
+    """
+    Open a PDF just far enough to count its pages.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+
+    Returns:
+        int: Number of pages.
+
+    Raises:
+        HTTPException: If the file cannot be opened as a document.
+    """
+    try:
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+    except Exception as e:
+        logger.error(f"Failed to open PDF {pdf_path}: {e}")
+        raise HTTPException(status_code=400, detail=f"Failed to open PDF: {e}")
+
+async def iter_rendered_pages(
+    pdf_path: str,
+    page_count: int,
+    tracker: SegmentTracker,
+    encoding: Optional[ImageEncoding] = None,
+    use_text_layer: bool = False,
+    page_range: Optional[Tuple[int, int]] = None,
+) -> AsyncIterator[Tuple[int, RenderedPage]]:
+    """
+    Render a PDF on the shared render pool and yield pages in order as their ranges finish.
+
+    At most `OCR_PIPELINE_RENDER_AHEAD` page ranges are rendering or waiting to
+    be consumed at once, so a slow consumer pauses rendering instead of letting
+    rendered pages pile up in memory. With `OCR_HYBRID_ENABLED`, pages that
+    Tesseract reads well enough are yielded as `TesseractPage`.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        page_count (int): Number of pages, see `count_pdf_pages`.
+        tracker (SegmentTracker): Takes ownership of each range's shared memory
+            before its pages are yielded; the consumer marks pages done on it.
+        encoding (Optional[ImageEncoding]): Render settings, defaults to the configured ones.
+        use_text_layer (bool): Yield pages with a usable embedded text layer as
+            `TextLayerPage` instead of rendering them.
+        page_range (Optional[Tuple[int, int]]): (start, end) page indices, end
+            exclusive, to render only part of the document; defaults to every page.
+
+    Yields:
+        Tuple[int, RenderedPage]: Page number and shared page handle or embedded text.
+
+    Raises:
+        HTTPException: If rendering fails.
+    """
+    encoding = encoding or ImageEncoding.from_settings()
+    pending: Deque[Tuple[Tuple[int, int], Future]] = deque()
+    # Same per-document bound as the blocking conversion, without tying up a thread.
+    while not render_pool.conversions.acquire(blocking=False):
+        await asyncio.sleep(0.05)
+    try:
+        first_page, end_page = page_range or (0, page_count)
+        for task_range in render_pool.page_ranges(end_page, first_page):
+            future = render_pool.submit(
+                pdf_path, *task_range, encoding, use_text_layer, settings.OCR_HYBRID_ENABLED
+            )
+            pending.append((task_range, future))
+            while len(pending) >= settings.OCR_PIPELINE_RENDER_AHEAD:
+                for page in await next_rendered_range(pending, tracker):
+                    yield page
+        while pending:
+            for page in await next_rendered_range(pending, tracker):
+                yield page
+    finally:
+        render_pool.conversions.release()
+        # Ranges that are already rendering cannot be cancelled; free their pages when they land.
+        for _, future in pending:
+            if not future.cancel():
+                future.add_done_callback(release_range)
+
+async def next_rendered_range(
+    pending: Deque[Tuple[Tuple[int, int], Future]], tracker: SegmentTracker
+) -> List[Tuple[int, RenderedPage]]:
+    (start, end), future = pending[0]
+    try:
+        pages = await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to convert pages {start + 1}-{end}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to convert pages {start + 1}-{end} to images.",
+        )
+    pending.popleft()
+    tracker.add(image for _, image in pages)
+    return pages
+
+async def render_classifier_image(pdf_path: str) -> Optional[str]:
+    """
+    Render the first page small enough for a single low-detail tile, for `classify_document`.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+
+    Returns:
+        Optional[str]: JPEG data URL of page 1, or None if the page is blank.
+    """
+    encoding = ImageEncoding.from_settings()._replace(
+        image_format="jpeg",
+        quality=70,
+        grayscale=False,
+        max_long_edge=settings.OCR_CLASSIFIER_IMAGE_EDGE,
+        max_short_edge=0,
+        detail="low",
+    )
+    pages = await asyncio.wrap_future(render_pool.submit(pdf_path, 0, 1, encoding))
+    try:
+        page = pages[0][1] if pages else None
+        return page.data_url() if isinstance(page, SharedPage) else None
+    finally:
+        release_pages(image for _, image in pages)
+
+def release_range(future: Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        release_pages(image for _, image in future.result())
+
 def encode_image_to_base64(image_bytes: bytes) -> str:
     """
     Encode image bytes to a base64 data URL.
@@ -130,30 +272,63 @@ def encode_image_to_base64(image_bytes: bytes) -> str:
             status_code=500, detail="Failed to encode image to base64."
         )
 
-def encode_images(image_bytes_list: List[Tuple[int, bytes]]) -> List[Tuple[int, str]]:
+def encode_images(image_bytes_list: List[Tuple[int, Union[bytes, SharedPage]]]) -> List[Tuple[int, PageImage]]:
     """
     Encode a list of image bytes to base64 data URLs along with their page numbers.
 
+    Pages rendered by the render pool are already encoded in shared memory and
+    are passed through untouched; they are read when the request is built.
+
     Args:
-        image_bytes_list (List[Tuple[int, bytes]]): List of tuples containing page numbers and image bytes.
+        image_bytes_list (List[Tuple[int, Union[bytes, SharedPage]]]): List of tuples containing page numbers and image bytes or shared page handles.
 
     Returns:
-        List[Tuple[int, str]]: List of tuples containing page numbers and base64-encoded image URLs.
+        List[Tuple[int, PageImage]]: List of tuples containing page numbers and base64-encoded image URLs or handles.
     """
-    encoded_urls = [(page_num, encode_image_to_base64(img_bytes)) for page_num, img_bytes in image_bytes_list]
+    encoded_urls = [
+        (page_num, img if isinstance(img, SharedPage) else encode_image_to_base64(img))
+        for page_num, img in image_bytes_list
+    ]
     logger.info(f"Encoded {len(encoded_urls)} images to base64 data URLs.")
     return encoded_urls
 
-def create_batches(items: List[Tuple[int, str]], batch_size: int) -> List[List[Tuple[int, str]]]:
+def resolve_image_url(image: PageImage) -> str:
+    """
+    Return the data URL for a page image, reading it from shared memory if needed.
+
+    Args:
+        image (PageImage): A data URL or a shared page handle.
+
+    Returns:
+        str: The base64 data URL.
+    """
+    return image.data_url() if isinstance(image, SharedPage) else image
+
+def image_url_part(image: PageImage) -> dict:
+    """
+    Build the `image_url` message part for a page, with its `detail` level if one was chosen.
+
+    Args:
+        image (PageImage): A data URL or a shared page handle.
+
+    Returns:
+        dict: The `image_url` content part.
+    """
+    image_url = {"url": resolve_image_url(image)}
+    if isinstance(image, SharedPage) and image.detail:
+        image_url["detail"] = image.detail
+    return {"type": "image_url", "image_url": image_url}
+
+def create_batches(items: List[Tuple[int, PageImage]], batch_size: int) -> List[List[Tuple[int, PageImage]]]:
     """
     Split a list of items into batches.
 
     Args:
-        items (List[Tuple[int, str]]): The list of tuples containing page numbers and image URLs.
+        items (List[Tuple[int, PageImage]]): The list of tuples containing page numbers and image URLs.
         batch_size (int): The maximum size of each batch.
 
     Returns:
-        List[List[Tuple[int, str]]]: A list of batches.
+        List[List[Tuple[int, PageImage]]]: A list of batches.
     """
     batches = [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
     logger.info(
@@ -163,20 +338,27 @@ def create_batches(items: List[Tuple[int, str]], batch_size: int) -> List[List[T
 
 async def retry_with_backoff(
     func: Callable[..., Any],
-    max_retries: int = 10,
-    base_delay: int = 1,
-    max_delay: int = 120,
+    max_retries: Optional[int] = None,
+    base_delay: Optional[float] = None,
+    max_delay: Optional[float] = None,
     *args,
     **kwargs
 ) -> Any:
     """
-    Retry a coroutine function with exponential backoff.
+    Retry a coroutine function with exponential backoff and full jitter.
+
+    Rate limiting (429), provider unavailability (503) and timeouts (504) are
+    retried; other errors are raised at once. When the error carries a
+    `Retry-After` header, that delay is used (plus a little jitter) instead
+    of the backoff. Jitter spreads retries of concurrent batches out instead
+    of having all of them wake up and hit the provider at the same moment.
+    An open circuit (`CircuitOpenError`) is never retried.
 
     Args:
         func (Callable): The coroutine function to retry.
-        max_retries (int): Maximum number of retries.
-        base_delay (int): Initial delay in seconds.
-        max_delay (int): Maximum delay in seconds.
+        max_retries (Optional[int]): Maximum number of attempts, defaults to `OCR_RETRY_MAX_ATTEMPTS`.
+        base_delay (Optional[float]): Initial delay in seconds, defaults to `OCR_RETRY_BASE_DELAY`.
+        max_delay (Optional[float]): Maximum delay in seconds, defaults to `OCR_RETRY_MAX_DELAY`.
         *args: Positional arguments for the function.
         **kwargs: Keyword arguments for the function.
 
@@ -184,25 +366,31 @@ async def retry_with_backoff(
         Any: The result of the function if successful.
 
     Raises:
-        HTTPException: If all retries fail.
+        HTTPException: The last error if all attempts fail, or the first one that is not retryable.
     """
+    max_retries = max_retries or settings.OCR_RETRY_MAX_ATTEMPTS
+    base_delay = base_delay or settings.OCR_RETRY_BASE_DELAY
+    max_delay = max_delay or settings.OCR_RETRY_MAX_DELAY
     for attempt in range(1, max_retries + 1):
         try:
             return await func(*args, **kwargs)
+        except CircuitOpenError:
+            raise
         except HTTPException as he:
-            if he.status_code == 429:
-                delay = min(base_delay * (2 ** (attempt - 1)), max_delay)
-                logger.warning(
-                    f"Rate limit encountered. Retrying in {delay} seconds... (Attempt {attempt}/{max_retries})"
-                )
-                await asyncio.sleep(delay)
-            else:
+            if he.status_code not in RETRYABLE_STATUS_CODES or attempt == max_retries:
                 logger.error(f"HTTPException during retry: {he.detail}")
                 raise
+            delay = retry_delay(attempt, base_delay, max_delay, he.headers)
+            logger.warning(
+                f"{he.detail} Retrying in {delay:.2f} seconds... (Attempt {attempt}/{max_retries})"
+            )
+            await asyncio.sleep(delay)
         except asyncio.TimeoutError:
-            delay = min(base_delay * (2 ** (attempt - 1)), max_delay)
+            if attempt == max_retries:
+                break
+            delay = retry_delay(attempt, base_delay, max_delay)
             logger.warning(
-                f"Timeout. Retrying in {delay} seconds... (Attempt {attempt}/{max_retries})"
+                f"Timeout. Retrying in {delay:.2f} seconds... (Attempt {attempt}/{max_retries})"
             )
             await asyncio.sleep(delay)
         except Exception as e:
@@ -213,5 +401,25 @@ async def retry_with_backoff(
             )
     logger.error("Exceeded maximum retries.")
     raise HTTPException(
-        status_code=429, detail="Maximum retry attempts exceeded."
+        status_code=504, detail="Timeout occurred while communicating with OCR service."
     )
+
+def retry_delay(
+    attempt: int, base_delay: float, max_delay: float, headers: Optional[Mapping[str, str]] = None
+) -> float:
+    """
+    Delay before the next attempt: the server's `Retry-After` hint if it sent one, else full jitter backoff.
+
+    Args:
+        attempt (int): The attempt that just failed, starting at 1.
+        base_delay (float): Initial delay in seconds.
+        max_delay (float): Maximum backoff in seconds.
+        headers (Optional[Mapping[str, str]]): Headers of the error, if any.
+
+    Returns:
+        float: Seconds to wait.
+    """
+    hint = retry_after_seconds({key.lower(): value for key, value in headers.items()}) if headers else None
+    if hint is not None:
+        return hint + random.uniform(0, base_delay)
+    return random.uniform(0, min(base_delay * (2 ** (attempt - 1)), max_delay))
@@ -0,0 +1,107 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+from app.gptocr.model.gptmodel import OCRResponse
+from app.gptocr.ocrbatchprocess import classify_pdf, merge_ocr_responses, ocr_document, ocr_pages
+from app.gptocr.utilityFunction import count_pdf_pages
+from app.models import ExtrJob
+
+# ----------------------------
+# Job Handlers
+# ----------------------------
+
+# The extractors behind the synchronous routes, by job kind. The Google and
+# Tesseract extractors are blocking and run on a thread; their modules are
+# imported on first use so workers that only run GPT OCR do not need their
+# dependencies.
+#
+# A handler may return a ShardPlan instead of a result to split its job into
+# page-range shards; SHARD_HANDLERS then runs each shard and MERGERS combines
+# their results into the job's result.
+
+class ShardPlan(NamedTuple):
+    # Options of each shard job
+    shards: List[Dict[str, Any]]
+
+
+async def run_gptocr(job: ExtrJob) -> Any:
+    """Vision OCR, as `/gptfiles/ocr`; documents over `JOB_SHARD_PAGES` are sharded."""
+    text_layer = job.options.get("text_layer")
+    use_text_layer = settings.OCR_TEXT_LAYER_ENABLED if text_layer is None else text_layer
+    page_count = count_pdf_pages(job.file_path)
+    shard_pages = settings.JOB_SHARD_PAGES
+    if not shard_pages or page_count <= shard_pages:
+        response = await ocr_document(job.file_path, page_count, use_text_layer)
+        return response.model_dump()
+
+    # Classify once so every shard uses the same prompt
+    document_type = await classify_pdf(job.file_path)
+    return ShardPlan(
+        [
+            {
+                "page_count": page_count,
+                "first_page": first_page,
+                "end_page": min(first_page + shard_pages, page_count),
+                "text_layer": use_text_layer,
+                "document_type": document_type,
+            }
+            for first_page in range(0, page_count, shard_pages)
+        ]
+    )
+
+
+async def run_gptocr_shard(job: ExtrJob) -> Any:
+    """Vision OCR of one page range of a sharded document."""
+    options = job.options
+    response = await ocr_pages(
+        job.file_path,
+        options["page_count"],
+        options["text_layer"],
+        page_range=(options["first_page"], options["end_page"]),
+        document_type=options["document_type"],
+    )
+    return response.model_dump()
+
+
+def merge_gptocr(results: List[Any]) -> Any:
+    return merge_ocr_responses([OCRResponse.model_validate(result) for result in results]).model_dump()
+
+
+async def run_google(job: ExtrJob) -> Any:
+    """Google Document AI, as `/files/upload`."""
+    from app.googleapi.documentocr import process_document
+
+    return jsonable_encoder(await asyncio.to_thread(process_document, job.file_path))
+
+
+async def run_tesseract(job: ExtrJob) -> Any:
+    """Tesseract and a summary by the model, as `/files/uploadts`."""
+    from app.tesractopenaiapi.openaiextractor import process_document_invoice
+
+    return jsonable_encoder(await process_document_invoice(job.file_path))
+
+
+async def run_tesseract_preprocessed(job: ExtrJob) -> Any:
+    """Tesseract on preprocessed images, as `/files/uploadtspp`."""
+    from app.tesractopenaiapi.openaiextractor_imgpp import process_invoice
+
+    return jsonable_encoder(await process_invoice(job.file_path))
+
+
+HANDLERS: Dict[str, Callable[[ExtrJob], Awaitable[Any]]] = {
+    "gptocr": run_gptocr,
+    "google": run_google,
+    "tesseract": run_tesseract,
+    "tesseract_pp": run_tesseract_preprocessed,
+}
+
+SHARD_HANDLERS: Dict[str, Callable[[ExtrJob], Awaitable[Any]]] = {
+    "gptocr": run_gptocr_shard,
+}
+
+MERGERS: Dict[str, Callable[[List[Any]], Any]] = {
+    "gptocr": merge_gptocr,
+}
@@ -0,0 +1,308 @@
+import os
+import uuid
+from datetime import timedelta
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy import update
+from sqlmodel import Session, and_, or_, select
+
+from app.core.config import settings
+from app.models import ExtrJob, ExtrJobResult, utcnow
+
+# ----------------------------
+# Postgres Job Queue
+# ----------------------------
+
+# Statuses after which a job is never picked up again
+FINAL_STATUSES = ("succeeded", "failed")
+
+
+def enqueue_job(
+    session: Session,
+    *,
+    owner_id: uuid.UUID,
+    kind: str,
+    filename: str,
+    file_path: str,
+    options: Optional[dict[str, Any]] = None,
+    job_id: Optional[uuid.UUID] = None,
+) -> ExtrJob:
+    """
+    Add a job to the queue.
+
+    Args:
+        session (Session): Database session.
+        owner_id (uuid.UUID): The submitting user.
+        kind (str): The extractor to run, a key of `app.jobs.handlers.HANDLERS`.
+        filename (str): Original file name, for display.
+        file_path (str): The stored upload under `JOB_STORAGE_DIR`.
+        options (Optional[dict[str, Any]]): Extractor options.
+        job_id (Optional[uuid.UUID]): Id to use, if the upload was stored under it already.
+
+    Returns:
+        ExtrJob: The queued job.
+    """
+    job = ExtrJob(
+        id=job_id or uuid.uuid4(),
+        owner_id=owner_id,
+        kind=kind,
+        filename=filename,
+        file_path=file_path,
+        options=options or {},
+    )
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def claim_job(session: Session, worker_id: str) -> Optional[ExtrJob]:
+    """
+    Claim the oldest runnable job for a worker.
+
+    Runnable jobs are queued ones whose `run_after` has passed and running
+    ones whose heartbeat is older than `JOB_STALE_AFTER`, i.e. whose worker died. `FOR UPDATE SKIP LOCKED`
+    lets any number of workers poll the table at once without waiting on
+    each other's rows or claiming the same job twice. A stale job that has
+    used up `JOB_MAX_ATTEMPTS` is marked failed instead, so a document that
+    crashes workers cannot take them all down in turn.
+
+    Args:
+        session (Session): Database session.
+        worker_id (str): Identifies the claiming worker.
+
+    Returns:
+        Optional[ExtrJob]: The claimed job, now running, or None if there is nothing to do.
+    """
+    while True:
+        now = utcnow()
+        stale = now - timedelta(seconds=settings.JOB_STALE_AFTER)
+        statement = (
+            select(ExtrJob)
+            .where(
+                or_(
+                    and_(
+                        ExtrJob.status == "queued",
+                        or_(ExtrJob.run_after.is_(None), ExtrJob.run_after <= now),
+                    ),
+                    and_(ExtrJob.status == "running", ExtrJob.heartbeat_at < stale),
+                )
+            )
+            .order_by(ExtrJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = session.exec(statement).first()
+        if job is None:
+            session.commit()
+            return None
+        if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+            job.status = "failed"
+            job.error = f"Gave up after {job.attempts} attempts; the worker stopped responding."
+            job.finished_at = now
+            session.add(job)
+            session.commit()
+            if job.parent_id is None:
+                remove_job_file(job.file_path)
+            else:
+                finish_parent(session, job.parent_id)
+            continue
+        job.status = "running"
+        job.worker_id = worker_id
+        job.attempts += 1
+        job.started_at = now
+        job.heartbeat_at = now
+        job.run_after = None
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        return job
+
+
+def heartbeat_job(session: Session, job_id: uuid.UUID, worker_id: str) -> bool:
+    """
+    Record that a worker is still running a job.
+
+    Returns:
+        bool: False if the job is no longer this worker's (it was reclaimed as stale).
+    """
+    result = session.execute(
+        update(ExtrJob)
+        .where(ExtrJob.id == job_id, ExtrJob.worker_id == worker_id, ExtrJob.status == "running")
+        .values(heartbeat_at=utcnow())
+    )
+    session.commit()
+    return result.rowcount > 0
+
+
+def complete_job(session: Session, job_id: uuid.UUID, worker_id: str, result: Any) -> bool:
+    """
+    Store a job's result and mark it succeeded.
+
+    Returns:
+        bool: False if the job is no longer this worker's; the result is then discarded.
+    """
+    outcome = session.execute(
+        update(ExtrJob)
+        .where(ExtrJob.id == job_id, ExtrJob.worker_id == worker_id, ExtrJob.status == "running")
+        .values(status="succeeded", error=None, finished_at=utcnow())
+    )
+    if outcome.rowcount == 0:
+        session.rollback()
+        return False
+    session.merge(ExtrJobResult(job_id=job_id, result=result))
+    session.commit()
+    return True
+
+
+def fail_job(
+    session: Session,
+    job_id: uuid.UUID,
+    worker_id: str,
+    error: str,
+    retry: bool,
+    delay: float = 0.0,
+    count_attempt: bool = True,
+) -> Optional[str]:
+    """
+    Record a failed attempt: queue the job again if `retry` and attempts are left, else fail it.
+
+    Args:
+        session (Session): Database session.
+        job_id (uuid.UUID): The failed job.
+        worker_id (str): The worker that ran it.
+        error (str): What went wrong.
+        retry (bool): Whether the error is worth another attempt.
+        delay (float): Seconds before a retried job may be claimed again.
+        count_attempt (bool): False to give the attempt back, e.g. when the
+            request was never sent because the circuit was open.
+
+    Returns:
+        Optional[str]: The job's new status, or None if it is no longer this worker's.
+    """
+    job = session.get(ExtrJob, job_id, with_for_update=True)
+    if job is None or job.worker_id != worker_id or job.status != "running":
+        session.rollback()
+        return None
+    job.error = error
+    if not count_attempt:
+        job.attempts -= 1
+    if retry and job.attempts < settings.JOB_MAX_ATTEMPTS:
+        job.status = "queued"
+        job.run_after = utcnow() + timedelta(seconds=delay)
+    else:
+        job.status = "failed"
+        job.finished_at = utcnow()
+    session.add(job)
+    session.commit()
+    return job.status
+
+
+# ----------------------------
+# Sharded Jobs
+# ----------------------------
+
+def split_job(session: Session, job_id: uuid.UUID, worker_id: str, shard_options: List[dict[str, Any]]) -> bool:
+    """
+    Queue a running job's shards and park the job as waiting until they finish.
+
+    Shards are ordinary jobs with `parent_id` set, so every worker claims,
+    heartbeats and retries them the same way, on whichever host it runs.
+
+    Args:
+        session (Session): Database session.
+        job_id (uuid.UUID): The job being split.
+        worker_id (str): The worker running it.
+        shard_options (List[dict[str, Any]]): Options of each shard, e.g. its page range.
+
+    Returns:
+        bool: False if the job is no longer this worker's; nothing is queued then.
+    """
+    job = session.get(ExtrJob, job_id, with_for_update=True)
+    if job is None or job.worker_id != worker_id or job.status != "running":
+        session.rollback()
+        return False
+    for options in shard_options:
+        session.add(
+            ExtrJob(
+                parent_id=job.id,
+                owner_id=job.owner_id,
+                kind=job.kind,
+                filename=job.filename,
+                file_path=job.file_path,
+                options=options,
+            )
+        )
+    job.status = "waiting"
+    session.add(job)
+    session.commit()
+    return True
+
+
+def finish_parent(
+    session: Session, parent_id: uuid.UUID, merge: Optional[Callable[[List[Any]], Any]] = None
+) -> Optional[str]:
+    """
+    Settle a waiting job once its shards are done.
+
+    Called after every shard that reaches a final status. The parent row is
+    locked, so when the last two shards finish at the same time exactly one
+    of them merges. The first failed shard fails the parent and cancels the
+    shards that have not started yet; shard results are dropped once merged.
+
+    Args:
+        session (Session): Database session.
+        parent_id (uuid.UUID): The job the shards belong to.
+        merge (Optional[Callable[[List[Any]], Any]]): Combines the shards' results
+            into the job's result. Only needed once every shard succeeded.
+
+    Returns:
+        Optional[str]: The job's final status, or None while shards are outstanding.
+    """
+    parent = session.get(ExtrJob, parent_id, with_for_update=True)
+    if parent is None or parent.status != "waiting":
+        session.rollback()
+        return None
+    shards = session.exec(select(ExtrJob).where(ExtrJob.parent_id == parent_id)).all()
+    failed = [shard for shard in shards if shard.status == "failed"]
+    if not failed and any(shard.status != "succeeded" for shard in shards):
+        session.rollback()
+        return None
+
+    now = utcnow()
+    error = None
+    if not failed:
+        results = session.exec(
+            select(ExtrJobResult).where(ExtrJobResult.job_id.in_([shard.id for shard in shards]))
+        ).all()
+        try:
+            if merge is None:
+                raise ValueError("No merge step for these shards.")
+            session.merge(ExtrJobResult(job_id=parent.id, result=merge([result.result for result in results])))
+        except Exception as e:
+            error = f"Failed to merge shard results: {getattr(e, 'detail', None) or e}"
+        else:
+            for result in results:
+                session.delete(result)
+    else:
+        error = failed[0].error or "A shard failed."
+        for shard in shards:
+            if shard.status == "queued":
+                shard.status = "failed"
+                shard.error = "Cancelled after another shard failed."
+                shard.finished_at = now
+                session.add(shard)
+    parent.status = "failed" if error else "succeeded"
+    parent.error = error
+    parent.finished_at = now
+    session.add(parent)
+    session.commit()
+    remove_job_file(parent.file_path)
+    return parent.status
+
+
+def remove_job_file(file_path: str) -> None:
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from typing import Any, Callable, Mapping, Optional
+
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.gptocr.ocrservice import ocr_service
+from app.gptocr.ratelimiter import rate_limiter
+from app.gptocr.renderpool import render_pool
+from app.gptocr.utilityFunction import RETRYABLE_STATUS_CODES, retry_delay
+from app.jobs.handlers import HANDLERS, MERGERS, SHARD_HANDLERS, ShardPlan
+from app.jobs.queue import (
+    claim_job,
+    complete_job,
+    fail_job,
+    finish_parent,
+    heartbeat_job,
+    remove_job_file,
+    split_job,
+)
+from app.models import ExtrJob
+from app.tesractopenaiapi.tesseractengine import tesseract_engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------
+# Job Worker
+# ----------------------------
+
+class Worker:
+    """
+    Runs queued extraction jobs, `JOB_WORKER_CONCURRENCY` at a time.
+
+    Every slot polls the queue on its own, so a slow document only holds up
+    its own slot. Shards of a large document are claimed like any other job,
+    so every worker on every host helps with it. Database calls are blocking
+    and run on a thread.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None):
+        self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        """Stop claiming jobs; running jobs are finished first."""
+        if not self.stopping.is_set():
+            logger.info("Worker %s stopping after its running jobs", self.worker_id)
+            self.stopping.set()
+
+    async def run(self) -> None:
+        logger.info("Worker %s started with %d slots", self.worker_id, self.concurrency)
+        await asyncio.gather(*(self.run_slot() for _ in range(self.concurrency)))
+
+    async def run_slot(self) -> None:
+        while not self.stopping.is_set():
+            processed = await self.run_once()
+            if not processed:
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self) -> bool:
+        """
+        Claim and process one job.
+
+        Returns:
+            bool: Whether a job was found.
+        """
+        job = await asyncio.to_thread(self.with_session, claim_job, self.worker_id)
+        if job is None:
+            return False
+        await self.process(job)
+        return True
+
+    def with_session(self, func: Callable[..., Any], *args: Any) -> Any:
+        with Session(engine) as session:
+            return func(session, *args)
+
+    async def process(self, job: ExtrJob) -> None:
+        logger.info("Job %s (%s) started, attempt %d", job.id, job.kind, job.attempts)
+        work = asyncio.create_task(self.run_handler(job))
+        heartbeat = asyncio.create_task(self.heartbeat(job.id))
+        try:
+            await asyncio.wait((work, heartbeat), return_when=asyncio.FIRST_COMPLETED)
+            if not work.done():
+                # The heartbeat found the job reclaimed as stale; its new owner runs it now
+                logger.warning("Job %s was reclaimed by another worker; cancelling it", job.id)
+                work.cancel()
+                await asyncio.gather(work, return_exceptions=True)
+                return
+            result = work.result()
+        except HTTPException as he:
+            # While the OCR circuit is open nothing was sent; wait it out without using an attempt
+            circuit_wait = rate_limiter.circuit_retry_after() if he.status_code == 503 else None
+            headers = he.headers
+            if circuit_wait is not None and not headers:
+                headers = {"Retry-After": str(circuit_wait)}
+            await self.fail(
+                job,
+                str(he.detail),
+                retry=he.status_code in RETRYABLE_STATUS_CODES,
+                headers=headers,
+                count_attempt=circuit_wait is None,
+            )
+        except Exception as e:
+            logger.exception("Job %s failed: %s", job.id, e)
+            await self.fail(job, str(e) or type(e).__name__, retry=False)
+        else:
+            if isinstance(result, ShardPlan):
+                if await asyncio.to_thread(self.with_session, split_job, job.id, self.worker_id, result.shards):
+                    logger.info("Job %s split into %d shards", job.id, len(result.shards))
+            elif await asyncio.to_thread(self.with_session, complete_job, job.id, self.worker_id, result):
+                logger.info("Job %s succeeded", job.id)
+                await self.finished(job)
+            else:
+                logger.warning("Job %s was reclaimed by another worker; result discarded", job.id)
+        finally:
+            heartbeat.cancel()
+            work.cancel()
+
+    async def run_handler(self, job: ExtrJob) -> Any:
+        handler = (SHARD_HANDLERS if job.parent_id else HANDLERS).get(job.kind)
+        if handler is None:
+            raise ValueError(f"Unknown job kind {job.kind!r}")
+        return await handler(job)
+
+    async def finished(self, job: ExtrJob) -> None:
+        """Clean up after a job reached a final status; for a shard, settle its parent."""
+        if job.parent_id is None:
+            remove_job_file(job.file_path)
+            return
+        status = await asyncio.to_thread(
+            self.with_session, finish_parent, job.parent_id, MERGERS.get(job.kind)
+        )
+        if status is not None:
+            logger.info("Sharded job %s finished: %s", job.parent_id, status)
+
+    async def fail(
+        self,
+        job: ExtrJob,
+        error: str,
+        retry: bool,
+        headers: Optional[Mapping[str, str]] = None,
+        count_attempt: bool = True,
+    ) -> None:
+        """
+        Record a failed attempt. A retried job waits for backoff with full jitter,
+        or the error's `Retry-After`, before any worker claims it again.
+        """
+        delay = retry_delay(job.attempts, settings.JOB_RETRY_BASE_DELAY, settings.JOB_RETRY_MAX_DELAY, headers)
+        status = await asyncio.to_thread(
+            self.with_session, fail_job, job.id, self.worker_id, error, retry, delay, count_attempt
+        )
+        if status == "queued":
+            logger.warning(
+                "Job %s attempt %d failed, retrying in %.0fs%s: %s",
+                job.id, job.attempts, delay, "" if count_attempt else " (circuit open, attempt not counted)", error,
+            )
+        else:
+            logger.warning("Job %s attempt %d failed (%s): %s", job.id, job.attempts, status, error)
+        if status == "failed":
+            await self.finished(job)
+
+    async def heartbeat(self, job_id: uuid.UUID) -> None:
+        """Refresh the job's heartbeat; returns once the job is no longer this worker's."""
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT_INTERVAL)
+            try:
+                if not await asyncio.to_thread(self.with_session, heartbeat_job, job_id, self.worker_id):
+                    return
+            except Exception as e:
+                logger.warning("Heartbeat for job %s failed: %s", job_id, e)
+
+
+async def serve() -> None:
+    worker = Worker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await ocr_service.close()
+
+
+def main() -> None:
+    render_pool.start()
+    try:
+        asyncio.run(serve())
+    finally:
+        render_pool.shutdown()
+        tesseract_engine.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,19 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.llmclients import llm_clients
+from app.core.uploads import UploadLimitMiddleware
+from app.gptocr.renderpool import render_pool
+from app.gptocr.urlfetch import url_fetcher
+from app.tesractopenaiapi.tesseractengine import tesseract_engine
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,8 +23,21 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    llm_clients.start()
+    await run_in_threadpool(render_pool.start)
+    yield
+    await run_in_threadpool(render_pool.shutdown)
+    await run_in_threadpool(tesseract_engine.shutdown)
+    await llm_clients.close()
+    await url_fetcher.close()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
@@ -30,4 +52,7 @@ if settings.all_cors_origins:
         allow_headers=["*"],
     )
 
+# Reject oversized and non-document uploads before their body is read
+app.add_middleware(UploadLimitMiddleware)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
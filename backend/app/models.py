@@ -1,7 +1,9 @@
 import uuid
+from datetime import datetime, timezone
+from typing import Any
 
 from pydantic import EmailStr
-from sqlmodel import Field, Relationship, SQLModel
+from sqlmodel import JSON, Column, DateTime, Field, Relationship, SQLModel, Text
 
 
 # Shared properties
@@ -45,6 +47,7 @@ class User(UserBase, table=True):
     hashed_password: str
     items: list["Item"] = Relationship(back_populates="owner", cascade_delete=True)
     extrs: list["Extr"] = Relationship(back_populates="owner", cascade_delete=True)
+    extr_jobs: list["ExtrJob"] = Relationship(back_populates="owner", cascade_delete=True)
 
 
 
@@ -136,4 +139,95 @@ class Extr(ExtrBase, table=True):
     owner_id: uuid.UUID = Field(
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
     )
-    owner: User | None = Relationship(back_populates="extrs")
\ No newline at end of file
+    owner: User | None = Relationship(back_populates="extrs")
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# Asynchronous extraction jobs, claimed by workers (app.jobs.worker)
+class ExtrJobBase(SQLModel):
+    # Which extractor runs the job, see app.jobs.handlers.HANDLERS
+    kind: str = Field(max_length=32)
+    filename: str = Field(min_length=1, max_length=255)
+
+
+class ExtrJob(ExtrJobBase, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    owner_id: uuid.UUID = Field(
+        foreign_key="user.id", nullable=False, ondelete="CASCADE"
+    )
+    owner: User | None = Relationship(back_populates="extr_jobs")
+    # Set on the page-range shards of a large job; their options hold the range
+    parent_id: uuid.UUID | None = Field(
+        default=None, foreign_key="extrjob.id", ondelete="CASCADE", index=True
+    )
+    # queued -> running -> succeeded | failed, or running -> waiting while
+    # the job's shards run
+    status: str = Field(default="queued", max_length=16, index=True)
+    # Stored upload, on storage shared by the API and the workers
+    file_path: str = Field(max_length=1024)
+    options: dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
+    attempts: int = 0
+    worker_id: str | None = Field(default=None, max_length=255)
+    error: str | None = Field(default=None, sa_column=Column(Text))
+    created_at: datetime = Field(default_factory=utcnow, index=True, sa_type=DateTime(timezone=True))
+    started_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+    # Refreshed by the worker while the job runs; a stale heartbeat means the
+    # worker died and the job can be claimed again
+    heartbeat_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+    # A job queued again after a failed attempt is not claimed before this
+    run_after: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+    finished_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+
+
+# Kept apart from ExtrJob so the queue table stays narrow for claiming
+class ExtrJobResult(SQLModel, table=True):
+    job_id: uuid.UUID = Field(
+        foreign_key="extrjob.id", primary_key=True, ondelete="CASCADE"
+    )
+    result: Any = Field(default=None, sa_column=Column(JSON))
+
+
+# Properties to return via API, id is always required
+class ExtrJobPublic(ExtrJobBase):
+    id: uuid.UUID
+    status: str
+    attempts: int
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    shards_total: int = 0
+    shards_succeeded: int = 0
+
+
+class ExtrJobsPublic(SQLModel):
+    data: list[ExtrJobPublic]
+    count: int
+
+
+class ExtrJobResultPublic(SQLModel):
+    job_id: uuid.UUID
+    status: str
+    result: Any = None
+    error: str | None = None
+
+
+# OCR output of one page, saved as soon as the page is done so an
+# interrupted document resumes where it stopped, see app.gptocr.checkpoint
+class OCRPageCheckpoint(SQLModel, table=True):
+    # SHA-256 of the uploaded file
+    document_hash: str = Field(max_length=64, primary_key=True)
+    page: int = Field(primary_key=True)
+    text: str = Field(sa_column=Column(Text, nullable=False))
+    # How the page was answered: ocr, text_layer, blank or duplicate
+    source: str = Field(max_length=16)
+    # A checkpoint is only reused with the same model, prompt and rendering
+    model: str = Field(max_length=255)
+    document_type: str | None = Field(default=None, max_length=32)
+    render_settings: str = Field(max_length=255)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    created_at: datetime = Field(default_factory=utcnow, index=True, sa_type=DateTime(timezone=True))
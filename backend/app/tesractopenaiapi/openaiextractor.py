@@ -1,44 +1,16 @@
-from pdf2image import convert_from_path # type: ignore
 from PIL import Image # type: ignore
-import pytesseract # type: ignore
-from openai import OpenAI
+from fastapi.concurrency import run_in_threadpool
 import re
 import json
 from app.models import Message
+from app.tesractopenaiapi.summarizer import document_summarizer
+from app.tesractopenaiapi.tesseractengine import tesseract_engine
 
-def summarize_content(content, character_limit=500):
-        client = OpenAI()
-        prompt = (
-            f"You are an AI assistant tasked with extracting relavant information only" # from the utility bill. "
-            f"Please provide a concise summary in {character_limit} characters or less in JSON form. Reply with only the answer in JSON form and include no other commentary:"
-        )
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": content}]
-            )
-            summary = response.choices[0].message.content
-            return summary
-        except Exception as e:
-            print(f"An error occurred during summarization: {e}")
-            return None
-
-def process_document_invoice(file_path: str):
+async def process_document_invoice(file_path: str):
     print(f"Processing document at {file_path}...")
-    images = convert_from_path(file_path)
-
-    print(f"Extracted {len(images)} pages from the document.")
-    for i, image in enumerate(images):
-        image.save(f'page_{i}.jpg', 'JPEG')
-
     print("Extracting text from the document...")
-    extracted_text = []
-    for i, image in enumerate(images):
-        text = pytesseract.image_to_string(image)
-        extracted_text.append(text)
-        print(f"Extracted text from page {i}:")
+    extracted_text = await run_in_threadpool(tesseract_engine.extract_text, file_path)
+    print(f"Extracted text from {len(extracted_text)} pages.")
 
     if not extracted_text:
         print("No text was extracted from the document.")
@@ -47,7 +19,7 @@ def process_document_invoice(file_path: str):
         print("The document contains the following text TS:")
         print(extracted_text)
         
-        summary_compiled = summarize_content(extracted_text[0])
+        summary_compiled = await document_summarizer.summarize(extracted_text)
 
         json_match = re.search(r'{.*}', summary_compiled, re.DOTALL)
         print("The JSON extracted from the summary is TS:",json_match)
@@ -68,18 +40,9 @@ def process_document_invoice(file_path: str):
 
 def process_document_contract(file_path: str):
     print(f"Processing document at {file_path}...")
-    images = convert_from_path(file_path)
-
-    print(f"Extracted {len(images)} pages from the document.")
-    for i, image in enumerate(images):
-        image.save(f'page_{i}.jpg', 'JPEG')
-
     print("Extracting text from the document...")
-    extracted_text = []
-    for i, image in enumerate(images):
-        text = pytesseract.image_to_string(image)
-        extracted_text.append(text)
-        print(f"Extracted text from page {i}:")
+    extracted_text = tesseract_engine.extract_text(file_path)
+    print(f"Extracted text from {len(extracted_text)} pages.")
 
     if not extracted_text:
         print("No text was extracted from the document.")
@@ -0,0 +1,142 @@
+import asyncio
+from typing import List
+
+from app.core.config import settings
+from app.gptocr.logger import logger
+from app.gptocr.ocrcache import ocr_cache
+from app.gptocr.ocrservice import ocr_service
+from app.gptocr.ratelimiter import CHARS_PER_TOKEN, estimate_request_tokens, rate_limiter
+from app.gptocr.utilityFunction import retry_with_backoff
+
+# ----------------------------
+# Document Summarization
+# ----------------------------
+
+SUMMARY_PROMPT = (
+    "You are an AI assistant tasked with extracting relavant information only"
+    "Please provide a concise summary in {character_limit} characters or less in JSON form. "
+    "Reply with only the answer in JSON form and include no other commentary:"
+)
+MERGE_PROMPT = (
+    "You are an AI assistant tasked with extracting relavant information only. "
+    "The user message holds JSON summaries of consecutive parts of one document. "
+    "Merge them into a single concise summary of the whole document in {character_limit} characters "
+    "or less in JSON form, keeping each field once. "
+    "Reply with only the answer in JSON form and include no other commentary:"
+)
+# Summary of a document without any text, returned without asking the model
+EMPTY_SUMMARY = "{}"
+
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """Split `text` into pieces of at most `max_chars`, on line breaks where possible."""
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind("\n", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def chunk_texts(texts: List[str], max_tokens: int) -> List[str]:
+    """
+    Pack texts, in order, into as few chunks of at most `max_tokens` as possible.
+
+    Texts longer than a chunk are split on line breaks first.
+
+    Args:
+        texts (List[str]): e.g. the text of every page, already labelled.
+        max_tokens (int): Estimated token budget of one chunk.
+
+    Returns:
+        List[str]: The chunks, texts separated by a blank line.
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    chunks: List[str] = []
+    current = ""
+    for text in texts:
+        for piece in split_text(text.strip(), max_chars):
+            if current and len(current) + 2 + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class DocumentSummarizer:
+    """
+    Summarizes a whole multi-page document into JSON, map-reduce style.
+
+    The page text is packed into chunks of at most `SUMMARY_CHUNK_TOKENS`,
+    which are summarized concurrently; the chunk summaries are then merged,
+    level by level if they do not fit in one chunk either, until a single
+    summary is left. Requests go through the OCR service's shared client,
+    rate limiter and retries, and every chunk summary is cached by the
+    hash of its request, so an unchanged part of a document is not
+    summarized twice.
+    """
+
+    async def summarize(self, pages: List[str]) -> str:
+        """
+        Summarize a document.
+
+        Args:
+            pages (List[str]): Text of each page, in page order.
+
+        Returns:
+            str: The model's JSON summary, or `EMPTY_SUMMARY` if no page has any text.
+
+        Raises:
+            HTTPException: If a summary request fails after retries.
+        """
+        texts = [f"Page {page_num}:\n{text}" for page_num, text in enumerate(pages, 1) if text.strip()]
+        chunks = chunk_texts(texts, settings.SUMMARY_CHUNK_TOKENS)
+        if not chunks:
+            logger.info(f"None of the {len(pages)} pages has any text; nothing to summarize.")
+            return EMPTY_SUMMARY
+        slots = asyncio.Semaphore(settings.SUMMARY_MAX_CONCURRENT)
+        summaries = await asyncio.gather(*(self.summarize_chunk(chunk, SUMMARY_PROMPT, slots) for chunk in chunks))
+        level = 1
+        while len(summaries) > 1:
+            logger.info(f"Merging {len(summaries)} partial summaries (level {level}).")
+            parts = [f"Part {index}:\n{summary}" for index, summary in enumerate(summaries, 1)]
+            # Always merge at least two summaries per request, so every level shrinks
+            groups = chunk_texts(parts, settings.SUMMARY_CHUNK_TOKENS)
+            if len(groups) >= len(summaries):
+                groups = ["\n\n".join(parts[index : index + 2]) for index in range(0, len(parts), 2)]
+            summaries = await asyncio.gather(*(self.summarize_chunk(group, MERGE_PROMPT, slots) for group in groups))
+            level += 1
+        logger.info(f"Summarized {len(pages)} pages in {len(chunks)} chunks.")
+        return summaries[0]
+
+    async def summarize_chunk(self, text: str, prompt: str, slots: asyncio.Semaphore) -> str:
+        model = settings.SUMMARY_MODEL
+        messages = [
+            {"role": "system", "content": prompt.format(character_limit=settings.SUMMARY_CHARACTER_LIMIT)},
+            {"role": "user", "content": text},
+        ]
+        cache_key = ocr_cache.make_key(messages, model, "summarize")
+        summary = await ocr_cache.get(cache_key)
+        if summary is not None:
+            return summary
+        estimated_tokens = estimate_request_tokens(messages, settings.SUMMARY_MAX_OUTPUT_TOKENS)
+
+        async def summary_request():
+            response = await ocr_service.request_completion(
+                model, messages, estimated_tokens, max_tokens=settings.SUMMARY_MAX_OUTPUT_TOKENS
+            )
+            return ocr_service.extract_text_from_response(response)
+
+        async with slots, rate_limiter.in_flight(model):
+            summary = await retry_with_backoff(summary_request)
+        await ocr_cache.set(cache_key, summary)
+        return summary
+
+# Process-wide document summarizer
+document_summarizer = DocumentSummarizer()
@@ -0,0 +1,285 @@
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image  # type: ignore
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("tesserocr", "pytesseract")
+
+
+def resolve_backend(backend: str) -> str:
+    """
+    The OCR backend to use for a `TESSERACT_BACKEND` setting.
+
+    "auto" picks tesserocr when it is installed and pytesseract otherwise.
+    """
+    if backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown Tesseract backend {backend!r}; use auto, {' or '.join(BACKENDS)}.")
+        return backend
+    try:
+        import tesserocr  # type: ignore  # noqa: F401
+    except ImportError:
+        return "pytesseract"
+    return "tesserocr"
+
+# ----------------------------
+# Worker Side
+# ----------------------------
+
+# Initialized Tesseract API of this worker process, by language
+_apis: Dict[str, Any] = {}
+
+
+def warm_worker(backend: str, lang: str) -> None:
+    """
+    Pool initializer: keep each tesseract run on one core, since the pool
+    already runs one page per core, and load the libraries once. With
+    tesserocr the language model is loaded here, once per worker.
+    """
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    fitz.open().close()
+    if backend == "tesserocr":
+        tesserocr_api(lang)
+    else:
+        import pytesseract  # type: ignore  # noqa: F401
+
+
+def tesserocr_api(lang: str) -> Any:
+    api = _apis.get(lang)
+    if api is None:
+        import tesserocr  # type: ignore
+
+        api = tesserocr.PyTessBaseAPI(lang=lang)
+        _apis[lang] = api
+    return api
+
+
+def recognize_pixmap(pix: fitz.Pixmap, dpi: int, lang: str, backend: str) -> str:
+    """
+    OCR a grayscale page raster.
+
+    tesserocr reads the pixel buffer in memory through the worker's long-lived
+    API instance; pytesseract writes it to a temporary image and runs the
+    tesseract binary on it.
+    """
+    if backend == "tesserocr":
+        api = tesserocr_api(lang)
+        api.SetImageBytes(pix.samples, pix.width, pix.height, pix.n, pix.stride)
+        api.SetSourceResolution(dpi)
+        return api.GetUTF8Text()
+
+    import pytesseract  # type: ignore
+
+    image = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+    return pytesseract.image_to_string(image, lang=lang)
+
+
+def recognize_words(
+    pix: fitz.Pixmap, dpi: int, lang: str, backend: str
+) -> Tuple[str, List[Tuple[str, float, Tuple[int, int, int, int]]]]:
+    """
+    OCR a grayscale page raster and report every recognized word.
+
+    Args:
+        pix (fitz.Pixmap): The page, rendered gray at `dpi`.
+        dpi (int): Render resolution.
+        lang (str): Tesseract language(s).
+        backend (str): "tesserocr" or "pytesseract".
+
+    Returns:
+        Tuple[str, List[Tuple[str, float, Tuple[int, int, int, int]]]]: The page text,
+        and each word with its confidence (0-100) and (left, top, right, bottom) box.
+    """
+    words = []
+    if backend == "tesserocr":
+        from tesserocr import RIL, iterate_level  # type: ignore
+
+        api = tesserocr_api(lang)
+        api.SetImageBytes(pix.samples, pix.width, pix.height, pix.n, pix.stride)
+        api.SetSourceResolution(dpi)
+        api.Recognize()
+        for word in iterate_level(api.GetIterator(), RIL.WORD):
+            text = word.GetUTF8Text(RIL.WORD)
+            if text and text.strip():
+                words.append((text, word.Confidence(RIL.WORD), word.BoundingBox(RIL.WORD)))
+        return api.GetUTF8Text(), words
+
+    import pytesseract  # type: ignore
+
+    image = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+    data = pytesseract.image_to_data(
+        image, lang=lang, config=f"--dpi {dpi}", output_type=pytesseract.Output.DICT
+    )
+    # Rebuild the text from the words: lines of a paragraph on their own line,
+    # paragraphs separated by an empty one, as image_to_string lays them out
+    lines: Dict[Tuple[int, int, int], List[str]] = {}
+    for index, text in enumerate(data["text"]):
+        confidence = float(data["conf"][index])
+        if not text.strip() or confidence < 0:
+            continue
+        left, top = data["left"][index], data["top"][index]
+        words.append((text, confidence, (left, top, left + data["width"][index], top + data["height"][index])))
+        line = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+        lines.setdefault(line, []).append(text)
+    paragraphs: Dict[Tuple[int, int], List[str]] = {}
+    for (block, par, _), line_words in lines.items():
+        paragraphs.setdefault((block, par), []).append(" ".join(line_words))
+    return "\n\n".join("\n".join(paragraph) for paragraph in paragraphs.values()), words
+
+
+def recognize_page_range(
+    pdf_path: str, start: int, end: int, dpi: int, lang: str, backend: str = "pytesseract"
+) -> List[str]:
+    """
+    Render and recognize a contiguous range of pages, one page image at a time.
+
+    Args:
+        pdf_path (str): Path to the PDF (or image) file.
+        start (int): First page to recognize (0-based, inclusive).
+        end (int): Last page to recognize (0-based, exclusive).
+        dpi (int): Render resolution.
+        lang (str): Tesseract language(s), e.g. "eng" or "eng+deu".
+        backend (str): "tesserocr" or "pytesseract".
+
+    Returns:
+        List[str]: Text of each page of the range.
+    """
+    texts = []
+    with fitz.open(pdf_path) as doc:
+        for page_num in range(start, end):
+            pix = doc.load_page(page_num).get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+            texts.append(recognize_pixmap(pix, dpi, lang, backend))
+            del pix
+    return texts
+
+# ----------------------------
+# Tesseract Engine
+# ----------------------------
+
+class TesseractEngine:
+    """
+    Process pool that renders and OCRs pages with Tesseract in parallel.
+
+    A document is split into page ranges of at most `TESSERACT_CHUNK_PAGES`
+    and at most two ranges per worker are in flight, so a worker holds a
+    single page image at a time and the parent only ever holds text. Pages
+    are rendered with PyMuPDF inside the worker instead of being converted
+    up front with pdf2image. The pool is started on first use.
+
+    `TESSERACT_BACKEND` selects how pages are recognized: tesserocr keeps
+    one initialized Tesseract instance per worker and passes it the raw
+    pixels, pytesseract runs the tesseract binary for every page. "auto"
+    uses tesserocr when it is installed.
+    """
+
+    def __init__(self):
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.backend: Optional[str] = None
+        self.lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return settings.TESSERACT_POOL_SIZE or multiprocessing.cpu_count()
+
+    def start(self) -> None:
+        with self.lock:
+            if self.executor is not None:
+                return
+            self.backend = resolve_backend(settings.TESSERACT_BACKEND)
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_worker,
+                initargs=(self.backend, settings.TESSERACT_LANG),
+            )
+            # Spawn every worker now, so they load their libraries in parallel
+            for future in [
+                self.executor.submit(warm_worker, self.backend, settings.TESSERACT_LANG) for _ in range(self.size)
+            ]:
+                future.result()
+        logger.info(f"Started Tesseract pool with {self.size} {self.backend} workers.")
+
+    def shutdown(self) -> None:
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True, cancel_futures=True)
+                self.executor = None
+                logger.info("Shut down Tesseract pool.")
+
+    def page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        """
+        Split a document into page ranges, spread over every worker but no
+        larger than `TESSERACT_CHUNK_PAGES`.
+
+        Returns:
+            List[Tuple[int, int]]: (start, end) page indices, end exclusive.
+        """
+        chunk = max(1, min(settings.TESSERACT_CHUNK_PAGES, math.ceil(page_count / self.size)))
+        return [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+
+    def submit(self, pdf_path: str, start: int, end: int) -> Future:
+        if self.executor is None:
+            self.start()
+        return self.executor.submit(
+            recognize_page_range,
+            pdf_path,
+            start,
+            end,
+            settings.TESSERACT_DPI,
+            settings.TESSERACT_LANG,
+            self.backend,
+        )
+
+    def iter_pages(self, pdf_path: str) -> Iterator[Tuple[int, str]]:
+        """
+        Recognize a document and yield the text of each page, in order, as its range finishes.
+
+        Args:
+            pdf_path (str): Path to the PDF (or image) file.
+
+        Yields:
+            Tuple[int, str]: Page number (starting at 1) and its text.
+        """
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+        ranges = deque(self.page_ranges(page_count))
+        in_flight: Deque[Tuple[int, Future]] = deque()
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < 2 * self.size:
+                    start, end = ranges.popleft()
+                    in_flight.append((start, self.submit(pdf_path, start, end)))
+                start, future = in_flight.popleft()
+                for offset, text in enumerate(future.result()):
+                    yield start + offset + 1, text
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    def extract_text(self, pdf_path: str) -> List[str]:
+        """
+        Recognize every page of a document.
+
+        Args:
+            pdf_path (str): Path to the PDF (or image) file.
+
+        Returns:
+            List[str]: Text of each page, in page order.
+        """
+        texts = [text for _, text in self.iter_pages(pdf_path)]
+        logger.info(f"Tesseract extracted {len(texts)} pages of {pdf_path}.")
+        return texts
+
+# Process-wide Tesseract pool, started on first use and stopped with the application
+tesseract_engine = TesseractEngine()
@@ -0,0 +1,280 @@
+"""
+End-to-end throughput and latency of `POST /api/v1/gptfiles/ocr`.
+
+Usage:
+    python -m benchmarks.bench_e2e --pages 10 --documents 24 --concurrency 1 4 16 \
+        --latency 0.5 --error-rate 0.02 --rate-limit-rate 0.05 --output e2e.json
+    python -m benchmarks.bench_e2e ... --baseline e2e.json
+
+The real FastAPI app runs under uvicorn in its own process, with the
+database and the current user overridden by a throwaway SQLite user, and
+talks to a fake OpenAI server with the given latency and share of 500 and
+429 answers. For every concurrency level, that many clients upload the
+synthetic documents until all of them are done.
+
+Reported per level: pages/sec, document latency p50/p95/p99, failed pages
+and HTTP errors, peak RSS and CPU seconds of each stage. Stages are the
+processes the work runs in: "api" is the app's own process (upload
+handling, planning, request building and the OpenAI client), "render" the
+render pool workers (rasterizing and encoding pages), summed over the
+workers.
+
+With --output the full report is written as JSON; with --baseline the run
+is compared to an earlier report and the exit status is 1 if pages/sec or
+p95 latency of any level is worse by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+from benchmarks.bench_uploads import wait_for_port
+from benchmarks.common import Stopwatch, configure_environment, summarize_latencies
+from benchmarks.fake_openai import FakeOpenAIServer, create_fake_openai_app
+from benchmarks.synthetic import make_pdf, make_scanned_pdf
+
+CONTENT_KINDS = ("scanned", "text", "mixed")
+
+
+# ----------------------------
+# App Under Test
+# ----------------------------
+
+def process_usage(pid: int) -> Dict[str, float]:
+    """CPU seconds and peak RSS of a live process, from /proc."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    peak_rss_kb = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                peak_rss_kb = int(line.split()[1])
+    return {"cpu_seconds": (int(fields[11]) + int(fields[12])) / ticks, "peak_rss_mb": peak_rss_kb / 1024}
+
+
+def create_benchmark_app(database_path: str) -> Any:
+    """The real app with its database and current user replaced by a SQLite superuser."""
+    from sqlmodel import Session, SQLModel, create_engine
+
+    from app.api.deps import get_current_user, get_db
+    from app.main import app
+    from app.models import User
+
+    engine = create_engine(f"sqlite:///{database_path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(email="benchmark@example.com", hashed_password="-", is_superuser=True)
+        session.add(user)
+        session.commit()
+        user_id = user.id
+
+    def get_benchmark_db():
+        with Session(engine) as session:
+            yield session
+
+    def get_benchmark_user():
+        with Session(engine) as session:
+            return session.get(User, user_id)
+
+    app.dependency_overrides[get_db] = get_benchmark_db
+    app.dependency_overrides[get_current_user] = get_benchmark_user
+
+    @app.get("/benchmark/usage", tags=["benchmark"], include_in_schema=False)
+    def usage() -> Dict[str, Dict[str, float]]:
+        api = resource.getrusage(resource.RUSAGE_SELF)
+        stages = {
+            "api": {"cpu_seconds": api.ru_utime + api.ru_stime, "peak_rss_mb": api.ru_maxrss / 1024},
+            "render": {"cpu_seconds": 0.0, "peak_rss_mb": 0.0},
+        }
+        for child in multiprocessing.active_children():
+            child_usage = process_usage(child.pid)
+            stages["render"]["cpu_seconds"] += child_usage["cpu_seconds"]
+            stages["render"]["peak_rss_mb"] += child_usage["peak_rss_mb"]
+        return stages
+
+    return app
+
+
+def serve(port: int, openai_base_url: str, database_path: str) -> None:
+    import uvicorn
+
+    configure_environment(openai_base_url)
+    uvicorn.run(create_benchmark_app(database_path), host="127.0.0.1", port=port, log_level="warning")
+
+
+# ----------------------------
+# Load Generator
+# ----------------------------
+
+def make_documents(directory: str, count: int, pages: int, content: str) -> List[str]:
+    paths = []
+    for index in range(count):
+        kind = content if content != "mixed" else CONTENT_KINDS[index % 2]
+        path = os.path.join(directory, f"{kind}-{index}.pdf")
+        if kind == "scanned":
+            make_scanned_pdf(path, pages, seed=index)
+        else:
+            make_pdf(path, pages, seed=index)
+        paths.append(path)
+    return paths
+
+
+async def run_level(
+    port: int, documents: List[str], concurrency: int, text_layer: bool
+) -> Dict[str, Any]:
+    import httpx
+
+    pending = list(documents)
+    latencies: List[float] = []
+    counts = {"pages": 0, "failed_pages": 0, "http_errors": 0}
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        while pending:
+            path = pending.pop()
+            with open(path, "rb") as f, Stopwatch() as timer:
+                response = await client.post(
+                    "/api/v1/gptfiles/ocr",
+                    params={"text_layer": str(text_layer).lower()},
+                    files={"file": (os.path.basename(path), f, "application/pdf")},
+                )
+            latencies.append(timer.elapsed)
+            if response.status_code != 200:
+                counts["http_errors"] += 1
+                continue
+            body = response.json()
+            counts["pages"] += len(body["pages"])
+            counts["failed_pages"] += len(body["failed_pages"])
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=600) as client:
+        usage_before = (await client.get("/benchmark/usage")).json()
+        with Stopwatch() as timer:
+            await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        usage_after = (await client.get("/benchmark/usage")).json()
+
+    latency = summarize_latencies(latencies)
+    return {
+        "concurrency": concurrency,
+        "documents": len(documents),
+        **counts,
+        "wall_seconds": round(timer.elapsed, 2),
+        "pages_per_second": round((counts["pages"] - counts["failed_pages"]) / timer.elapsed, 2),
+        "latency_seconds": {key: round(value, 3) for key, value in latency.items()},
+        "stages": {
+            stage: {
+                "cpu_seconds": round(usage_after[stage]["cpu_seconds"] - usage_before[stage]["cpu_seconds"], 2),
+                "peak_rss_mb": round(usage_after[stage]["peak_rss_mb"], 1),
+            }
+            for stage in usage_after
+        },
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> List[str]:
+    """
+    Regressions of `results` against an earlier report, matched by concurrency.
+
+    Returns:
+        List[str]: One line per metric that got worse by more than `tolerance`.
+    """
+    with open(baseline_path) as f:
+        baseline = {row["concurrency"]: row for row in json.load(f)["results"]}
+    regressions = []
+    for row in results:
+        before = baseline.get(row["concurrency"])
+        if before is None:
+            continue
+        if row["pages_per_second"] < before["pages_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"concurrency {row['concurrency']}: pages/sec {before['pages_per_second']} -> {row['pages_per_second']}"
+            )
+        if row["latency_seconds"]["p95"] > before["latency_seconds"]["p95"] * (1 + tolerance):
+            regressions.append(
+                f"concurrency {row['concurrency']}: p95 latency "
+                f"{before['latency_seconds']['p95']}s -> {row['latency_seconds']['p95']}s"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=10, help="Pages per document.")
+    parser.add_argument("--documents", type=int, default=16, help="Documents uploaded per concurrency level.")
+    parser.add_argument("--content", choices=CONTENT_KINDS, default="scanned",
+                        help="Image-only scans, text PDFs or both.")
+    parser.add_argument("--text-layer", action="store_true", help="Let text pages skip vision OCR.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake model latency in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of model calls failing with 500.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of model calls failing with 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of the 429 answers.")
+    parser.add_argument("--port", type=int, default=8770)
+    parser.add_argument("--output", help="Write the report to this JSON file.")
+    parser.add_argument("--baseline", help="Compare with an earlier --output report.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression.")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--openai-base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--database", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.openai_base_url, args.database)
+        return
+
+    fake_openai = create_fake_openai_app(
+        args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+    )
+    with tempfile.TemporaryDirectory() as tmp, FakeOpenAIServer(fake_openai, port=args.port + 1) as openai_server:
+        documents = make_documents(tmp, args.documents, args.pages, args.content)
+        environment = {
+            **os.environ,
+            "MAX_EXTR_COUNT": str(10**9),
+            # Every level OCRs the same documents; measure the model path, not the caches
+            "OCR_CACHE_ENABLED": "false",
+            "OCR_CHECKPOINT_ENABLED": "false",
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.bench_e2e", "--serve", "--port", str(args.port),
+             "--openai-base-url", openai_server.base_url, "--database", os.path.join(tmp, "benchmark.db")],
+            env=environment,
+        )
+        try:
+            wait_for_port(args.port, timeout=60)
+            results = []
+            for concurrency in args.concurrency:
+                row = asyncio.run(run_level(args.port, documents, concurrency, args.text_layer))
+                results.append(row)
+                print(json.dumps(row))
+        finally:
+            server.terminate()
+            server.wait()
+        fake_counts = {
+            "requests": fake_openai.state.requests,
+            "errors": fake_openai.state.errors,
+            "rate_limited": fake_openai.state.rate_limited,
+        }
+        print(json.dumps({"fake_openai": fake_counts}))
+
+    config = {key: value for key, value in vars(args).items() if key not in ("serve", "openai_base_url", "database")}
+    report = {"config": config, "fake_openai": fake_counts, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
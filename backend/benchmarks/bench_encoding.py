@@ -0,0 +1,114 @@
+"""
+Page image encoding settings: bytes per page, encode time, estimated image
+tokens and OCR latency for each setting on a synthetic corpus of born-digital
+text pages and scanned pages.
+
+Usage:
+    python -m benchmarks.bench_encoding --pages 10 --latency 0.5 --upload-mbps 20
+
+OCR latency is measured against the local fake server, which sleeps for the
+model latency plus the time the request body takes at `--upload-mbps`, so the
+payload size is reflected the way it would be over a real uplink.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import fitz  # PyMuPDF
+
+from benchmarks.common import Stopwatch, configure_environment, summarize_latencies
+from benchmarks.fake_openai import FakeOpenAIServer, create_fake_openai_app
+from benchmarks.synthetic import make_pdf, make_scanned_pdf
+
+# name -> ImageEncoding overrides; "legacy" is the original zoom 2 colour PNG.
+SETTINGS: Dict[str, Dict[str, object]] = {
+    "legacy-png": {"image_format": "png", "max_long_edge": 0, "max_short_edge": 0, "detail": "high"},
+    "png-fit": {"image_format": "png"},
+    "png-fit-gray": {"image_format": "png", "grayscale": True},
+    "jpeg-q80-gray": {"image_format": "jpeg", "quality": 80, "grayscale": True},
+    "jpeg-q60-gray": {"image_format": "jpeg", "quality": 60, "grayscale": True},
+    "webp-q80-gray": {"image_format": "webp", "quality": 80, "grayscale": True},
+    "webp-q60-gray": {"image_format": "webp", "quality": 60, "grayscale": True},
+}
+
+
+def encode_corpus(pdf_paths: List[str], overrides: Dict[str, object]) -> Tuple[List[Tuple[str, str]], float]:
+    """Render every page with the given settings; return (data URL, detail) pairs and seconds per page."""
+    from app.gptocr.imageencoding import ImageEncoding, render_page
+
+    encoding = ImageEncoding.from_settings()._replace(**overrides)
+    pages = []
+    with Stopwatch() as timer:
+        for pdf_path in pdf_paths:
+            with fitz.open(pdf_path) as doc:
+                for page in doc:
+                    url, detail = render_page(page, encoding)
+                    pages.append((url.decode("ascii"), detail))
+    return pages, timer.elapsed / len(pages)
+
+
+async def ocr_latencies(pages: List[Tuple[str, str]]) -> List[float]:
+    from app.gptocr.ocrservice import ocr_service
+
+    samples = []
+    for page_num, (url, _) in enumerate(pages, start=1):
+        started = time.perf_counter()
+        await ocr_service.perform_ocr_on_batch([(page_num, url)])
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def run(pdf_paths: List[str]) -> List[Dict[str, object]]:
+    from app.gptocr.ocrservice import ocr_service
+    from app.gptocr.ratelimiter import estimate_image_tokens, image_dimensions
+
+    results = []
+    for name, overrides in SETTINGS.items():
+        pages, encode_seconds = encode_corpus(pdf_paths, overrides)
+        tokens = [estimate_image_tokens(*image_dimensions(url), detail) for url, detail in pages]
+        latency = summarize_latencies(await ocr_latencies(pages))
+        results.append(
+            {
+                "setting": name,
+                "pages": len(pages),
+                "bytes_per_page": int(statistics.fmean(len(url) for url, _ in pages)),
+                "encode_ms_per_page": round(encode_seconds * 1000, 1),
+                "image_tokens_per_page": round(statistics.fmean(tokens)),
+                "ocr_p50_seconds": round(latency["p50"], 3),
+                "ocr_max_seconds": round(latency["max"], 3),
+            }
+        )
+    await ocr_service.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=10, help="Pages of each kind in the corpus.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake model latency in seconds.")
+    parser.add_argument("--upload-mbps", type=float, default=20.0, help="Simulated uplink in megabits per second.")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    app = create_fake_openai_app(args.latency, upload_bytes_per_second=args.upload_mbps * 1_000_000 / 8)
+    with tempfile.TemporaryDirectory() as workdir, FakeOpenAIServer(app, port=args.port) as server:
+        configure_environment(server.base_url)
+        # Every setting sends the same pages; don't let the result cache answer them.
+        os.environ["OCR_CACHE_ENABLED"] = "false"
+        corpus = [
+            make_pdf(os.path.join(workdir, "text.pdf"), args.pages),
+            make_scanned_pdf(os.path.join(workdir, "scanned.pdf"), args.pages),
+        ]
+        results = asyncio.run(run(corpus))
+
+    for row in results:
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Vision-only OCR versus confidence-gated hybrid OCR on a mixed corpus.
+
+Usage:
+    python -m benchmarks.bench_hybrid --clean 8 --hard 4 --pages 2 --latency 1.0
+
+"clean" documents are scans at 200 dpi, which Tesseract reads with high
+confidence; "hard" ones are scanned at 60 dpi, too coarse for it. Every
+document goes through `ocr_document` against a fake OpenAI server with
+the given latency, first with `OCR_HYBRID_ENABLED` off and then on.
+Each variant runs in a fresh interpreter.
+
+Reported per variant: model requests, pages answered by Tesseract,
+wall time and time per document. The hybrid run also prints every page's
+routing decision with Tesseract's confidence, coverage and time. Needs
+the tesseract binary (or `pip install tesserocr`); without it every
+page falls back to the model.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+from benchmarks.common import Stopwatch, configure_environment, summarize_latencies
+from benchmarks.fake_openai import FakeOpenAIServer, create_fake_openai_app
+from benchmarks.synthetic import make_scanned_pdf
+
+VARIANTS = ("vision-only", "hybrid")
+
+
+async def run_documents(pdf_paths: List[str]) -> Dict[str, Any]:
+    from app.gptocr.ocrbatchprocess import ocr_document
+    from app.gptocr.ocrservice import ocr_service
+    from app.gptocr.renderpool import render_pool
+    from app.gptocr.utilityFunction import count_pdf_pages
+
+    render_pool.start()
+    samples = []
+    routes = []
+    try:
+        with Stopwatch() as total:
+            for pdf_path in pdf_paths:
+                with Stopwatch() as timer:
+                    response = await ocr_document(pdf_path, count_pdf_pages(pdf_path), False)
+                samples.append(timer.elapsed)
+                for status in response.pages:
+                    routes.append({
+                        "document": os.path.basename(pdf_path),
+                        "page": status.page,
+                        "source": status.source,
+                        "confidence": status.tesseract_confidence,
+                        "coverage": status.tesseract_coverage,
+                        "tesseract_ms": status.tesseract_ms,
+                    })
+    finally:
+        await ocr_service.close()
+        render_pool.shutdown()
+    return {"wall_seconds": total.elapsed, "latencies": samples, "routes": routes}
+
+
+def run_variant(variant: str, openai_base_url: str, pdf_paths: List[str]) -> None:
+    configure_environment(openai_base_url)
+    os.environ["OCR_HYBRID_ENABLED"] = str(variant == "hybrid").lower()
+    result = asyncio.run(run_documents(pdf_paths))
+    latency = summarize_latencies(result["latencies"])
+    routes = result["routes"]
+    print(json.dumps({
+        "variant": variant,
+        "documents": len(pdf_paths),
+        "pages": len(routes),
+        "tesseract_pages": sum(route["source"] == "tesseract" for route in routes),
+        "model_pages": sum(route["source"] == "ocr" for route in routes),
+        "wall_seconds": round(result["wall_seconds"], 2),
+        "document_seconds": {key: round(value, 3) for key, value in latency.items()},
+    }))
+    if variant == "hybrid":
+        for route in routes:
+            print(json.dumps(route))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clean", type=int, default=8, help="Clean scanned documents.")
+    parser.add_argument("--hard", type=int, default=4, help="Low-resolution scanned documents.")
+    parser.add_argument("--pages", type=int, default=2, help="Pages per document.")
+    parser.add_argument("--latency", type=float, default=1.0, help="Fake model latency in seconds.")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--variants", choices=VARIANTS, nargs="+", default=list(VARIANTS))
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--openai-base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.openai_base_url, args.pdf)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_paths = [
+            make_scanned_pdf(os.path.join(tmp, f"clean-{index}.pdf"), args.pages, dpi=200, seed=index)
+            for index in range(args.clean)
+        ] + [
+            make_scanned_pdf(os.path.join(tmp, f"hard-{index}.pdf"), args.pages, dpi=60, seed=index)
+            for index in range(args.hard)
+        ]
+        environment = {
+            **os.environ,
+            # Both variants OCR the same documents; measure the page path, not the caches or the classifier
+            "OCR_CACHE_ENABLED": "false",
+            "OCR_CHECKPOINT_ENABLED": "false",
+            "OCR_CLASSIFY_DOCUMENTS": "false",
+        }
+        fake_openai = create_fake_openai_app(args.latency)
+        with FakeOpenAIServer(fake_openai, port=args.port) as openai_server:
+            for variant in args.variants:
+                requests_before = fake_openai.state.requests
+                subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_hybrid", "--variant", variant,
+                     "--openai-base-url", openai_server.base_url, "--pdf", *pdf_paths],
+                    env=environment,
+                    check=True,
+                )
+                print(json.dumps({"variant": variant, "model_requests": fake_openai.state.requests - requests_before}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+A new OpenAI client per call versus the shared, pooled clients.
+
+Usage:
+    python -m benchmarks.bench_llmclients --calls 50 --concurrency 10 --latency 0.2
+
+"per-call" builds a synchronous `OpenAI()` client for every request, as
+`summarize_content` used to, and closes it afterwards. "shared-sync" sends
+the same requests over `llm_clients.sync_client` from a thread pool, and
+"shared-async" over `llm_clients.async_client` from the event loop.
+
+Reported per variant: wall time, request latency percentiles, new
+connections opened and mean pool wait, taken from the same `ClientMetrics`
+the shared clients expose on /gptfiles/llm/stats. The fake server speaks
+plain HTTP, so TLS handshakes (which the shared pool saves as well) are
+not part of the numbers.
+"""
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from benchmarks.common import Stopwatch, configure_environment, summarize_latencies
+from benchmarks.fake_openai import FakeOpenAIServer, create_fake_openai_app
+
+VARIANTS = ("per-call", "shared-sync", "shared-async")
+MESSAGES = [
+    {"role": "system", "content": "Please provide a concise summary in JSON form."},
+    {"role": "user", "content": "Invoice 1042, total 118.40 EUR, due 2024-03-01."},
+]
+
+
+def timed(call) -> float:
+    with Stopwatch() as timer:
+        call()
+    return timer.elapsed
+
+
+def run_threads(calls: int, concurrency: int, call) -> List[float]:
+    with ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(lambda _: timed(call), range(calls)))
+
+
+async def run_async(calls: int, concurrency: int) -> List[float]:
+    from app.core.llmclients import llm_clients
+
+    slots = asyncio.Semaphore(concurrency)
+
+    async def call() -> float:
+        async with slots:
+            with Stopwatch() as timer:
+                await llm_clients.async_client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+            return timer.elapsed
+
+    try:
+        return list(await asyncio.gather(*(call() for _ in range(calls))))
+    finally:
+        # The async client is bound to this event loop
+        await llm_clients.close()
+
+
+def run_variant(variant: str, calls: int, concurrency: int) -> Dict[str, Any]:
+    import httpx
+    from openai import DefaultHttpxClient, OpenAI
+
+    from app.core.llmclients import ClientMetrics, MeteredTransport, llm_clients
+
+    if variant == "per-call":
+        metrics = ClientMetrics()
+
+        def call() -> None:
+            client = OpenAI(http_client=DefaultHttpxClient(transport=MeteredTransport(httpx.HTTPTransport(), metrics)))
+            try:
+                client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+            finally:
+                client.close()
+    elif variant == "shared-sync":
+        metrics = llm_clients.metrics["sync"]
+
+        def call() -> None:
+            llm_clients.sync_client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+    else:
+        metrics = llm_clients.metrics["async"]
+
+    with Stopwatch() as total:
+        if variant == "shared-async":
+            samples = asyncio.run(run_async(calls, concurrency))
+        else:
+            samples = run_threads(calls, concurrency, call)
+    stats = metrics.snapshot()
+    return {
+        "variant": variant,
+        "calls": calls,
+        "wall_seconds": round(total.elapsed, 2),
+        "latency_seconds": {key: round(value, 3) for key, value in summarize_latencies(samples).items()},
+        "new_connections": stats["new_connections"],
+        "mean_pool_wait_ms": stats["mean_pool_wait_ms"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50, help="Requests per variant.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight at once.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake model latency in seconds.")
+    parser.add_argument("--port", type=int, default=8786)
+    parser.add_argument("--variants", choices=VARIANTS, nargs="+", default=list(VARIANTS))
+    args = parser.parse_args()
+
+    fake_openai = create_fake_openai_app(args.latency)
+    with FakeOpenAIServer(fake_openai, port=args.port) as openai_server:
+        configure_environment(openai_server.base_url)
+        for variant in args.variants:
+            print(json.dumps(run_variant(variant, args.calls, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
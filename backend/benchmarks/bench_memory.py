@@ -0,0 +1,81 @@
+"""
+Peak RSS and main-thread CPU of the render -> encode -> request-build path.
+
+"before" renders with one pickled PNG per page and base64-encodes every page
+in the parent; "after" uses the render pool, whose workers encode into shared
+memory so the parent only materializes one data URL at a time.
+
+Usage:
+    python -m benchmarks.bench_memory --pages 300
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import configure_environment
+from benchmarks.synthetic import make_scanned_pdf
+
+
+def run_variant(variant: str, pdf_path: str, workers: int) -> None:
+    configure_environment("http://127.0.0.1:1/v1")
+    os.environ["PDF_RENDER_POOL_SIZE"] = str(workers)
+    from app.gptocr.ocrservice import ocr_service
+    from app.gptocr.renderpool import release_pages, render_pool
+    from app.gptocr.utilityFunction import convert_pdf_to_images_pymupdf, encode_images
+
+    render_pool.start()
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started_cpu = time.thread_time()
+    started = time.perf_counter()
+    if variant == "before":
+        from benchmarks.bench_render import legacy_convert
+        pages = encode_images(legacy_convert(pdf_path, workers))
+    else:
+        pages = encode_images(convert_pdf_to_images_pymupdf(pdf_path))
+    payload_bytes = 0
+    for page in pages:
+        messages = ocr_service.build_ocr_messages([page])
+        payload_bytes += len(messages[-1]["content"][0]["image_url"]["url"])
+    release_pages(image for _, image in pages)
+    print(json.dumps({
+        "variant": variant,
+        "pages": len(pages),
+        "payload_mb": round(payload_bytes / 2**20, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "rss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024, 1),
+        "main_thread_cpu_seconds": round(time.thread_time() - started_cpu, 2),
+        "wall_seconds": round(time.perf_counter() - started, 2),
+    }))
+    render_pool.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--variant", choices=["before", "after"], help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.pdf, args.workers)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = make_scanned_pdf(os.path.join(tmp, "scan.pdf"), args.pages)
+        # Each variant runs in a fresh interpreter so peak RSS is not shared.
+        for variant in ("before", "after"):
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_memory", "--variant", variant,
+                 "--pdf", pdf_path, "--workers", str(args.workers)],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Per-document OCR latency against a local fake OpenAI server.
+
+Usage:
+    python -m benchmarks.bench_ocrservice --latency 1.0 --batches 1 2 4 8 16
+
+With a non-blocking client every batch of a document overlaps, so per-document
+latency stays close to one model round trip regardless of the batch count,
+and the event loop keeps serving other coroutines while OCR is in flight.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import time
+from typing import Dict, List
+
+from benchmarks.common import Stopwatch, configure_environment
+from benchmarks.fake_openai import FakeOpenAIServer, create_fake_openai_app
+
+# 1x1 transparent PNG, enough for the request payload shape.
+PIXEL_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.05) -> float:
+    """Return the worst event-loop scheduling delay observed until `stop` is set."""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run(batch_counts: List[int]) -> List[Dict[str, float]]:
+    from app.gptocr.ocrbatchprocess import process_batches
+    from app.gptocr.ocrservice import ocr_service
+    from app.gptocr.utilityFunction import create_batches, encode_images
+
+    results = []
+    for batch_count in batch_counts:
+        pages = encode_images([(page, PIXEL_PNG) for page in range(1, batch_count + 1)])
+        batches = create_batches(pages, 1)
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(measure_loop_lag(stop))
+        with Stopwatch() as timer:
+            await process_batches(batches)
+        stop.set()
+        results.append(
+            {
+                "batches": batch_count,
+                "document_seconds": round(timer.elapsed, 3),
+                "max_loop_lag_seconds": round(await lag_task, 3),
+            }
+        )
+    await ocr_service.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=1.0, help="Fake model latency in seconds.")
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(create_fake_openai_app(args.latency), port=args.port) as server:
+        configure_environment(server.base_url)
+        results = asyncio.run(run(args.batches))
+
+    for row in results:
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
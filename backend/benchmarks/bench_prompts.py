@@ -0,0 +1,118 @@
+"""
+Single general prompt versus classify-then-extract: estimated input tokens
+per page and end-to-end document latency on a synthetic corpus.
+
+Usage:
+    python -m benchmarks.bench_prompts --pages 10 --latency 0.5 --prefill-ms-per-1k 150
+
+The fake server sleeps `--prefill-ms-per-1k` for every 1000 text prompt
+tokens on top of the fixed model latency, so shorter prompts show up in
+latency the way prompt processing time does on the real endpoint. The
+classify-then-extract latency includes rendering the first page small and
+the classification call.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+import fitz  # PyMuPDF
+
+from benchmarks.common import Stopwatch, configure_environment, summarize_latencies
+from benchmarks.fake_openai import FakeOpenAIServer, create_fake_openai_app
+from benchmarks.synthetic import make_pdf, make_scanned_pdf
+
+MODES = ("single-prompt", "classify-then-extract")
+
+
+def page_tokens(pdf_path: str, document_type: Optional[str]) -> Dict[str, int]:
+    """Estimated input tokens of a single-page OCR request for page 1, with and without the image."""
+    from app.gptocr.imageencoding import ImageEncoding, render_page
+    from app.gptocr.ocrservice import ocr_service
+    from app.gptocr.ratelimiter import estimate_request_tokens
+
+    with fitz.open(pdf_path) as doc:
+        url, _ = render_page(doc[0], ImageEncoding.from_settings())
+    messages = ocr_service.build_ocr_messages([(1, url.decode("ascii"))], document_type)
+    total = estimate_request_tokens(messages, 0)
+    text_only = [message for message in messages if isinstance(message["content"], str)]
+    return {"input_tokens": total, "text_tokens": estimate_request_tokens(text_only, 0)}
+
+
+async def ocr_document(pdf_path: str, classify: bool) -> Optional[str]:
+    from app.core.config import settings
+    from app.gptocr.ocrbatchprocess import classify_pdf, stream_ocr_pipeline
+    from app.gptocr.renderpool import SegmentTracker
+    from app.gptocr.utilityFunction import count_pdf_pages, iter_rendered_pages
+
+    settings.OCR_CLASSIFY_DOCUMENTS = classify
+    document_type = await classify_pdf(pdf_path)
+    tracker = SegmentTracker()
+    pages = iter_rendered_pages(pdf_path, count_pdf_pages(pdf_path), tracker)
+    async for name, event in stream_ocr_pipeline(pages, tracker, document_type=document_type):
+        if name == "error":
+            raise RuntimeError(event.detail)
+    return document_type
+
+
+async def run(pdf_paths: List[str], repeats: int) -> List[Dict[str, object]]:
+    from app.gptocr.ocrservice import ocr_service
+    from app.gptocr.renderpool import render_pool
+
+    render_pool.start()
+    results = []
+    for mode in MODES:
+        classify = mode == "classify-then-extract"
+        samples = []
+        document_type = None
+        for _ in range(repeats):
+            for pdf_path in pdf_paths:
+                with Stopwatch() as timer:
+                    document_type = await ocr_document(pdf_path, classify)
+                samples.append(timer.elapsed)
+        tokens = page_tokens(pdf_paths[0], document_type)
+        latency = summarize_latencies(samples)
+        results.append(
+            {
+                "mode": mode,
+                "document_type": document_type,
+                "documents": len(samples),
+                "input_tokens_per_page": tokens["input_tokens"],
+                "prompt_text_tokens_per_page": tokens["text_tokens"],
+                "document_p50_seconds": round(latency["p50"], 3),
+                "document_max_seconds": round(latency["max"], 3),
+            }
+        )
+    await ocr_service.close()
+    render_pool.shutdown()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=10, help="Pages per document.")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs over the corpus per mode.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake model latency in seconds.")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=150.0, help="Fake prompt processing time.")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    app = create_fake_openai_app(args.latency, seconds_per_1k_prompt_tokens=args.prefill_ms_per_1k / 1000)
+    with tempfile.TemporaryDirectory() as workdir, FakeOpenAIServer(app, port=args.port) as server:
+        configure_environment(server.base_url)
+        # Every run sends the same pages; measure the model calls, not the cache.
+        os.environ["OCR_CACHE_ENABLED"] = "false"
+        corpus = [
+            make_pdf(os.path.join(workdir, "text.pdf"), args.pages),
+            make_scanned_pdf(os.path.join(workdir, "scanned.pdf"), args.pages),
+        ]
+        results = asyncio.run(run(corpus, args.repeats))
+
+    for row in results:
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
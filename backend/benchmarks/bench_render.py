@@ -0,0 +1,69 @@
+"""
+PDF rendering throughput: per-request pool with one task per page (before)
+against the persistent render pool with page-range tasks (after).
+
+Usage:
+    python -m benchmarks.bench_render --pages 1 20 500 --workers 4
+"""
+import argparse
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import fitz  # PyMuPDF
+
+from benchmarks.common import Stopwatch, configure_environment
+from benchmarks.synthetic import make_pdf
+
+
+def legacy_render_page(args: Tuple[str, int, int]) -> Tuple[int, bytes]:
+    pdf_path, page_num, zoom = args
+    doc = fitz.open(pdf_path)
+    image_bytes = doc.load_page(page_num).get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png")
+    doc.close()
+    return page_num + 1, image_bytes
+
+
+def legacy_convert(pdf_path: str, workers: int, zoom: int = 2) -> List[Tuple[int, bytes]]:
+    """The original conversion: a fresh process pool and one task per page."""
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(legacy_render_page, [(pdf_path, i, zoom) for i in range(page_count)]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 20, 500])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3, help="Documents converted per measurement.")
+    args = parser.parse_args()
+
+    configure_environment("http://127.0.0.1:1/v1")
+    os.environ["PDF_RENDER_POOL_SIZE"] = str(args.workers)
+    from app.gptocr.renderpool import render_pool
+    from app.gptocr.utilityFunction import convert_pdf_to_images_pymupdf
+
+    render_pool.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            pdf_path = make_pdf(os.path.join(tmp, f"doc_{pages}.pdf"), pages)
+            for label, convert in (
+                ("before", lambda path: legacy_convert(path, args.workers)),
+                ("after", convert_pdf_to_images_pymupdf),
+            ):
+                with Stopwatch() as timer:
+                    for _ in range(args.repeat):
+                        convert(pdf_path)
+                print(json.dumps({
+                    "pages": pages,
+                    "variant": label,
+                    "pages_per_second": round(pages * args.repeat / timer.elapsed, 1),
+                }))
+    render_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Tesseract extractor summarization: page 1 only versus the whole document, map-reduce.
+
+Usage:
+    python -m benchmarks.bench_summarize --pages 1 10 40 --latency 1.0
+
+"before" summarizes the first page's text with a new synchronous `OpenAI()`
+client per call, as `summarize_content` used to; the rest of the document
+is never sent. "after" runs `document_summarizer` over every page:
+chunks of `SUMMARY_CHUNK_TOKENS` are summarized concurrently over the
+shared client and merged, so latency grows with the depth of the merge
+tree rather than with the page count. "cached" repeats the same document,
+answered from the chunk cache.
+
+Page text is synthetic, about 2000 characters per page.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+from typing import Any, Dict, List
+
+from benchmarks.common import Stopwatch, configure_environment
+from benchmarks.fake_openai import FakeOpenAIServer, create_fake_openai_app
+from benchmarks.synthetic import WORDS
+
+
+def page_texts(pages: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        "\n".join(" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(20))
+        for _ in range(pages)
+    ]
+
+
+def legacy_summarize(content: str) -> str:
+    from openai import OpenAI
+
+    client = OpenAI()
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "Please provide a concise summary in JSON form."},
+            {"role": "user", "content": content},
+        ],
+    )
+    return response.choices[0].message.content
+
+
+async def run(page_counts: List[int], fake_openai: Any) -> List[Dict[str, Any]]:
+    from app.gptocr.ocrservice import ocr_service
+    from app.tesractopenaiapi.summarizer import document_summarizer
+
+    rows = []
+    try:
+        for pages in page_counts:
+            texts = page_texts(pages, seed=pages)
+            for variant in ("before", "after", "cached"):
+                requests_before = fake_openai.state.requests
+                with Stopwatch() as timer:
+                    if variant == "before":
+                        await asyncio.to_thread(legacy_summarize, texts[0])
+                    else:
+                        await document_summarizer.summarize(texts)
+                rows.append({
+                    "variant": variant,
+                    "pages": pages,
+                    "pages_summarized": 1 if variant == "before" else pages,
+                    "model_requests": fake_openai.state.requests - requests_before,
+                    "seconds": round(timer.elapsed, 2),
+                })
+    finally:
+        await ocr_service.close()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 40], help="Document lengths.")
+    parser.add_argument("--latency", type=float, default=1.0, help="Fake model latency in seconds.")
+    parser.add_argument("--port", type=int, default=8785)
+    args = parser.parse_args()
+
+    fake_openai = create_fake_openai_app(args.latency)
+    with tempfile.TemporaryDirectory() as tmp, FakeOpenAIServer(fake_openai, port=args.port) as openai_server:
+        configure_environment(openai_server.base_url)
+        os.environ["OCR_CACHE_DIR"] = os.path.join(tmp, "ocr-cache")
+        for row in asyncio.run(run(args.pages, fake_openai)):
+            print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Tesseract extraction throughput and peak memory, by backend.
+
+"before" converts the whole PDF with pdf2image and runs pytesseract over
+the pages one after the other, as the Tesseract extractors used to.
+"pytesseract" and "tesserocr" use `tesseract_engine` with that
+`TESSERACT_BACKEND`: pytesseract starts the tesseract binary and reloads
+its language data for every page, tesserocr keeps one initialized
+instance per pool worker and hands it the pixels in memory.
+
+Usage:
+    python -m benchmarks.bench_tesseract --receipts 40 --pages 40 --workers 4
+
+"small" OCRs `--receipts` one-page receipt scans one after another, where
+the per-page startup cost dominates; "large" OCRs one document of
+`--pages` letter-size scanned pages. Needs the tesseract and pdftoppm
+(poppler) binaries, and `pip install tesserocr` for the tesserocr variant.
+Each variant runs in a fresh interpreter; peak RSS is reported for the
+parent and for the largest child process.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+from benchmarks.common import configure_environment
+from benchmarks.synthetic import make_receipt_pdf, make_scanned_pdf
+
+VARIANTS = ("before", "pytesseract", "tesserocr")
+
+
+def legacy_extract_text(pdf_path: str) -> List[str]:
+    import pytesseract  # type: ignore
+    from pdf2image import convert_from_path  # type: ignore
+
+    images = convert_from_path(pdf_path)
+    return [pytesseract.image_to_string(image) for image in images]
+
+
+def run_variant(variant: str, size: str, pdf_paths: List[str], workers: int) -> None:
+    configure_environment("http://127.0.0.1:1/v1")
+    os.environ["TESSERACT_POOL_SIZE"] = str(workers)
+    if variant != "before":
+        os.environ["TESSERACT_BACKEND"] = variant
+    from app.tesractopenaiapi.tesseractengine import tesseract_engine
+
+    if variant != "before":
+        # Pay for the pool (and tesserocr's model load) before timing, as a server does at startup
+        tesseract_engine.start()
+    started = time.perf_counter()
+    texts = []
+    for pdf_path in pdf_paths:
+        texts.extend(legacy_extract_text(pdf_path) if variant == "before" else tesseract_engine.extract_text(pdf_path))
+    elapsed = time.perf_counter() - started
+    tesseract_engine.shutdown()
+    print(json.dumps({
+        "variant": variant,
+        "size": size,
+        "pages": len(texts),
+        "characters": sum(len(text) for text in texts),
+        "wall_seconds": round(elapsed, 2),
+        "pages_per_second": round(len(texts) / elapsed, 2),
+        "ms_per_page": round(1000 * elapsed / len(texts), 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_child_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--receipts", type=int, default=40, help="One-page receipts for the small run.")
+    parser.add_argument("--pages", type=int, default=40, help="Pages of the document for the large run.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--variants", choices=VARIANTS, nargs="+", default=list(VARIANTS))
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--size", choices=["small", "large"], help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.size, args.pdf, args.workers)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        documents = {
+            "small": [
+                make_receipt_pdf(os.path.join(tmp, f"receipt-{index}.pdf"), seed=index)
+                for index in range(args.receipts)
+            ],
+            "large": [make_scanned_pdf(os.path.join(tmp, "scan.pdf"), args.pages)],
+        }
+        for size, pdf_paths in documents.items():
+            for variant in args.variants:
+                subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_tesseract", "--variant", variant, "--size", size,
+                     "--workers", str(args.workers), "--pdf", *pdf_paths],
+                    check=True,
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Concurrent large uploads: server peak RSS and latency when the whole upload
+is read into memory ("before": `await file.read()` then a second write to a
+temporary file) versus streamed to disk in chunks behind
+`UploadLimitMiddleware` ("after"), plus how fast bad uploads are rejected.
+
+Usage:
+    python -m benchmarks.bench_uploads --concurrency 8 --size-mb 50
+
+Each variant's server runs in a fresh interpreter so peak RSS is its own;
+uploads are streamed from disk by the client. For the "after" variant it
+also sends a non-PDF and an oversized upload of the same size and reports
+the time until they were rejected.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List
+
+from benchmarks.common import Stopwatch, configure_environment, summarize_latencies
+from benchmarks.synthetic import make_large_pdf
+
+VARIANTS = ("before", "after")
+
+
+def create_upload_app(variant: str) -> Any:
+    from fastapi import FastAPI, File, UploadFile
+
+    from app.core.uploads import UploadLimitMiddleware, check_page_count, spool_upload
+    from app.gptocr.utilityFunction import count_pdf_pages
+
+    app = FastAPI()
+    if variant == "after":
+        app.add_middleware(UploadLimitMiddleware)
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)) -> Dict[str, int]:
+        if variant == "before":
+            pdf_bytes = await file.read()
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf_file:
+                tmp_pdf_file.write(pdf_bytes)
+                path = tmp_pdf_file.name
+        else:
+            path = await spool_upload(file)
+        try:
+            return {"pages": check_page_count(count_pdf_pages(path))}
+        finally:
+            os.remove(path)
+
+    @app.get("/stats")
+    async def stats() -> Dict[str, float]:
+        return {"peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+    return app
+
+
+def serve(variant: str, port: int, max_upload_mb: int) -> None:
+    import uvicorn
+
+    configure_environment("http://127.0.0.1:1/v1")
+    os.environ["MAX_UPLOAD_BYTES"] = str(max_upload_mb * 1024 * 1024)
+    uvicorn.run(create_upload_app(variant), host="127.0.0.1", port=port, log_level="warning")
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Upload server did not start on port {port}")
+
+
+async def post_file(client: Any, path: str, content_type: str) -> Dict[str, Any]:
+    import httpx
+
+    with open(path, "rb") as f, Stopwatch() as timer:
+        try:
+            response = await client.post("/upload", files={"file": (os.path.basename(path), f, content_type)})
+            status = response.status_code
+        except httpx.HTTPError as e:
+            # The server may answer and close before the client finished sending
+            status = type(e).__name__
+    return {"status": status, "seconds": timer.elapsed}
+
+
+async def run_uploads(port: int, paths: List[str], content_type: str = "application/pdf") -> List[Dict[str, Any]]:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=600) as client:
+        return await asyncio.gather(*(post_file(client, path, content_type) for path in paths))
+
+
+async def peak_rss(port: int) -> float:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        return (await client.get("/stats")).json()["peak_rss_mb"]
+
+
+@contextlib.contextmanager
+def upload_server(variant: str, port: int, max_upload_mb: int) -> Iterator[None]:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.bench_uploads", "--serve", variant,
+         "--port", str(port), "--max-upload-mb", str(max_upload_mb)]
+    )
+    try:
+        wait_for_port(port)
+        yield
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run_variant(variant: str, pdf_path: str, bad_path: str, args: argparse.Namespace) -> Dict[str, Any]:
+    port = args.port + VARIANTS.index(variant)
+    with upload_server(variant, port, args.max_upload_mb):
+        idle_rss = asyncio.run(peak_rss(port))
+        with Stopwatch() as timer:
+            results = asyncio.run(run_uploads(port, [pdf_path] * args.concurrency))
+        latency = summarize_latencies([result["seconds"] for result in results])
+        row = {
+            "variant": variant,
+            "uploads": args.concurrency,
+            "upload_mb": round(os.path.getsize(pdf_path) / 2**20, 1),
+            "statuses": sorted({str(result["status"]) for result in results}),
+            "wall_seconds": round(timer.elapsed, 2),
+            "upload_p50_seconds": round(latency["p50"], 2),
+            "idle_rss_mb": idle_rss,
+            "peak_rss_mb": asyncio.run(peak_rss(port)),
+        }
+        if variant == "after":
+            bad = asyncio.run(run_uploads(port, [bad_path]))[0]
+            row["non_pdf_status"] = bad["status"]
+            row["non_pdf_rejected_seconds"] = round(bad["seconds"], 3)
+    return row
+
+
+def run_oversized(pdf_path: str, args: argparse.Namespace) -> Dict[str, Any]:
+    # A server whose limit is half the upload refuses it from its Content-Length alone
+    max_upload_mb = max(1, args.size_mb // 2)
+    port = args.port + len(VARIANTS)
+    with upload_server("after", port, max_upload_mb):
+        result = asyncio.run(run_uploads(port, [pdf_path]))[0]
+    return {
+        "variant": "after",
+        "max_upload_mb": max_upload_mb,
+        "oversized_status": result["status"],
+        "oversized_rejected_seconds": round(result["seconds"], 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8, help="Uploads sent at once.")
+    parser.add_argument("--size-mb", type=int, default=50, help="Size of each upload.")
+    parser.add_argument("--max-upload-mb", type=int, default=250, help="MAX_UPLOAD_BYTES of the server.")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--serve", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.max_upload_mb)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = make_large_pdf(os.path.join(tmp, "scan.pdf"), args.size_mb)
+        bad_path = os.path.join(tmp, "scan.bin")
+        with open(bad_path, "wb") as f:
+            f.write(os.urandom(os.path.getsize(pdf_path)))
+        for variant in VARIANTS:
+            print(json.dumps(run_variant(variant, pdf_path, bad_path, args)))
+        print(json.dumps(run_oversized(pdf_path, args)))
+
+
+if __name__ == "__main__":
+    main()
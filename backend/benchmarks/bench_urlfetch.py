@@ -0,0 +1,207 @@
+"""
+URL ingestion against a local stand-in document server.
+
+Usage:
+    python -m benchmarks.bench_urlfetch --documents 16 --latency 0.5
+
+"before" downloads with a blocking `requests.get` that reads the whole body
+into memory, as `download_pdf` used to; concurrent requests queue up
+behind each other on the event loop. "after" uses the shared `url_fetcher`
+pool, which overlaps downloads up to `URL_FETCH_MAX_PER_HOST` per host
+(documents are spread over two host names, 127.0.0.1 and localhost).
+
+It then OCRs one document twice against a fake OpenAI server: the second
+time the server answers the conditional request with 304 Not Modified and
+the stored result is returned. Finally it checks that an oversized and a
+non-PDF document are refused without being downloaded in full.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+
+from benchmarks.bench_ocrservice import measure_loop_lag
+from benchmarks.common import Stopwatch, configure_environment
+from benchmarks.fake_openai import FakeOpenAIServer, create_fake_openai_app
+from benchmarks.synthetic import make_pdf
+
+
+def create_document_app(documents: Dict[str, bytes], latency: float) -> FastAPI:
+    """
+    Serve `documents` by name with an ETag, honouring If-None-Match, after
+    `latency` seconds. Counts full and 304 answers and the most requests in
+    flight per Host header.
+    """
+    app = FastAPI()
+    app.state.counters = {"full": 0, "not_modified": 0, "bytes_sent": 0}
+    app.state.in_flight: Dict[str, int] = {}
+    app.state.max_in_flight: Dict[str, int] = {}
+
+    @app.get("/docs/{name}")
+    async def document(name: str, request: Request) -> Response:
+        host = request.headers["host"].split(":")[0]
+        app.state.in_flight[host] = app.state.in_flight.get(host, 0) + 1
+        app.state.max_in_flight[host] = max(app.state.max_in_flight.get(host, 0), app.state.in_flight[host])
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            app.state.in_flight[host] -= 1
+        content = documents[name]
+        etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+        if request.headers.get("if-none-match") == etag:
+            app.state.counters["not_modified"] += 1
+            return Response(status_code=304, headers={"ETag": etag})
+        app.state.counters["full"] += 1
+
+        async def body():
+            for start in range(0, len(content), 64 * 1024):
+                chunk = content[start : start + 64 * 1024]
+                app.state.counters["bytes_sent"] += len(chunk)
+                yield chunk
+
+        return StreamingResponse(
+            body(),
+            media_type="application/octet-stream",
+            headers={"ETag": etag, "Content-Length": str(len(content))},
+        )
+
+    return app
+
+
+def legacy_download(url: str) -> bytes:
+    import requests
+
+    response = requests.get(url, timeout=15)
+    response.raise_for_status()
+    return response.content
+
+
+async def download_all(variant: str, urls: List[str]) -> Dict[str, Any]:
+    from app.gptocr.urlfetch import url_fetcher
+
+    async def download(url: str) -> None:
+        if variant == "before":
+            legacy_download(url)
+        else:
+            path = (await url_fetcher.fetch(url)).path
+            os.remove(path)
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    with Stopwatch() as timer:
+        await asyncio.gather(*(download(url) for url in urls))
+    stop.set()
+    return {
+        "variant": variant,
+        "documents": len(urls),
+        "wall_seconds": round(timer.elapsed, 2),
+        "max_loop_lag_ms": round(await lag_task * 1000),
+    }
+
+
+async def revisit(url: str) -> List[Dict[str, Any]]:
+    from app.gptocr.ocrbatchprocess import ocr_document
+    from app.gptocr.urlfetch import url_fetcher
+    from app.gptocr.utilityFunction import count_pdf_pages
+
+    rows = []
+    for attempt in ("first", "unchanged"):
+        with Stopwatch() as timer:
+            document = await url_fetcher.fetch(url, use_text_layer=False)
+            if document.result is None:
+                try:
+                    response = await ocr_document(document.path, count_pdf_pages(document.path), False)
+                finally:
+                    os.remove(document.path)
+                await url_fetcher.store_result(document, False, response)
+            else:
+                response = document.result
+        rows.append({
+            "fetch": attempt,
+            "reused_result": document.result is not None,
+            "pages": len(response.pages),
+            "seconds": round(timer.elapsed, 3),
+        })
+    return rows
+
+
+async def refused(url: str) -> Dict[str, Any]:
+    from fastapi import HTTPException
+
+    from app.gptocr.urlfetch import url_fetcher
+
+    with Stopwatch() as timer:
+        try:
+            await url_fetcher.fetch(url)
+            status = 200
+        except HTTPException as he:
+            status = he.status_code
+    return {"url": url.rsplit("/", 1)[-1], "status": status, "seconds": round(timer.elapsed, 3)}
+
+
+async def run_after(args: argparse.Namespace, urls: List[str], base_urls: List[str]) -> List[Dict[str, Any]]:
+    from app.gptocr.ocrservice import ocr_service
+    from app.gptocr.urlfetch import url_fetcher
+
+    try:
+        rows: List[Dict[str, Any]] = [await download_all("after", urls)]
+        rows.extend(await revisit(f"{base_urls[0]}/docs/ocr.pdf"))
+        rows.append(await refused(f"{base_urls[0]}/docs/oversized.pdf"))
+        rows.append(await refused(f"{base_urls[0]}/docs/not-a.pdf"))
+        return rows
+    finally:
+        await url_fetcher.close()
+        await ocr_service.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=16, help="Documents downloaded at once.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Document server time to first byte.")
+    parser.add_argument("--size-mb", type=int, default=5, help="Size of each downloaded document.")
+    parser.add_argument("--port", type=int, default=8780)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["OCR_CACHE_DIR"] = os.path.join(tmp, "ocr-cache")
+        os.environ["OCR_CHECKPOINT_ENABLED"] = "false"
+        os.environ["MAX_UPLOAD_BYTES"] = str(args.size_mb * 2 * 1024 * 1024)
+        # The origin server runs on loopback
+        os.environ["URL_FETCH_ALLOW_PRIVATE_HOSTS"] = "true"
+        documents = {
+            "ocr.pdf": open(make_pdf(os.path.join(tmp, "ocr.pdf"), 3), "rb").read(),
+            "oversized.pdf": b"%PDF-1.7\n" + os.urandom(args.size_mb * 3 * 1024 * 1024),
+            "not-a.pdf": b"<html>" + os.urandom(args.size_mb * 1024 * 1024),
+        }
+        for index in range(args.documents):
+            documents[f"doc{index}.pdf"] = b"%PDF-1.7\n" + os.urandom(args.size_mb * 1024 * 1024)
+
+        document_app = create_document_app(documents, args.latency)
+        with FakeOpenAIServer(create_fake_openai_app(0.2), port=args.port) as openai_server, \
+                FakeOpenAIServer(document_app, port=args.port + 1):
+            configure_environment(openai_server.base_url)
+            from app.gptocr.renderpool import render_pool
+
+            base_urls = [f"http://127.0.0.1:{args.port + 1}", f"http://localhost:{args.port + 1}"]
+            urls = [f"{base_urls[index % 2]}/docs/doc{index}.pdf" for index in range(args.documents)]
+            print(json.dumps(asyncio.run(download_all("before", urls))))
+            render_pool.start()
+            try:
+                for row in asyncio.run(run_after(args, urls, base_urls)):
+                    print(json.dumps(row))
+            finally:
+                render_pool.shutdown()
+            print(json.dumps({
+                "document_server": document_app.state.counters,
+                "max_in_flight_per_host": document_app.state.max_in_flight,
+            }))
+
+
+if __name__ == "__main__":
+    main()
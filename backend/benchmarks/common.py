@@ -0,0 +1,69 @@
+import math
+import os
+import statistics
+import time
+from typing import Dict, List
+
+# ----------------------------
+# Shared Benchmark Helpers
+# ----------------------------
+
+def configure_environment(openai_base_url: str) -> None:
+    """
+    Point the app at a local fake OpenAI server and fill in the settings that
+    are normally provided by the top level .env file.
+
+    Must be called before anything under `app` is imported, because the
+    settings are read at import time.
+
+    Args:
+        openai_base_url (str): Base URL of the fake server, e.g. http://127.0.0.1:8765/v1
+    """
+    os.environ["OPENAI_BASE_URL"] = openai_base_url
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    # The fake server has no quota; keep the rate limiter out of the way.
+    os.environ.setdefault("OPENAI_RPM_LIMIT", "1000000")
+    os.environ.setdefault("OPENAI_TPM_LIMIT", "1000000000")
+    os.environ.setdefault("PROJECT_NAME", "benchmark")
+    os.environ.setdefault("POSTGRES_SERVER", "localhost")
+    os.environ.setdefault("POSTGRES_USER", "postgres")
+    os.environ.setdefault("FIRST_SUPERUSER", "admin@example.com")
+    os.environ.setdefault("FIRST_SUPERUSER_PASSWORD", "benchmark")
+
+
+def summarize_latencies(samples: List[float]) -> Dict[str, float]:
+    """
+    Summarize a list of latency samples (in seconds).
+
+    Args:
+        samples (List[float]): Latency samples.
+
+    Returns:
+        Dict[str, float]: Mean, p50, p95, p99 and max of the samples.
+    """
+    ordered = sorted(samples)
+    return {
+        "mean": statistics.fmean(ordered),
+        "p50": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1],
+    }
+
+
+def percentile(ordered: List[float], percent: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Stopwatch:
+    """Context manager measuring wall-clock time in seconds."""
+
+    def __enter__(self) -> "Stopwatch":
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict
+
+import uvicorn
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# ----------------------------
+# Fake OpenAI Chat Completions Server
+# ----------------------------
+
+def create_fake_openai_app(
+    latency: float = 1.0,
+    upload_bytes_per_second: float = 0,
+    seconds_per_1k_prompt_tokens: float = 0,
+    error_rate: float = 0,
+    rate_limit_rate: float = 0,
+    retry_after: float = 1.0,
+    seed: int = 0,
+) -> FastAPI:
+    """
+    Build a FastAPI app that mimics the OpenAI chat completions endpoint.
+
+    Every request sleeps for `latency` seconds (without blocking other requests)
+    and answers with a short markdown body echoing the page markers it received.
+    Classification requests (system prompt starting with "Classify") are
+    answered with `invoice`.
+
+    The Files and Batch endpoints used by the bulk OCR mode are emulated in
+    memory: a batch completes `latency` seconds after it is created, with one
+    output line per input request.
+
+    Chat completions can be made to fail at random: a share `error_rate`
+    with 500 and a share `rate_limit_rate` with 429 and a Retry-After header,
+    after the same latency as a successful answer.
+
+    Args:
+        latency (float): Simulated model latency in seconds.
+        upload_bytes_per_second (float): If set, also sleep for the time the request
+            body would take to upload at this rate, so payload size shows up in latency.
+        seconds_per_1k_prompt_tokens (float): If set, also sleep this long per 1000
+            text prompt tokens, so prompt length shows up in latency.
+        error_rate (float): Share of chat completions answered with 500.
+        rate_limit_rate (float): Share of chat completions answered with 429.
+        retry_after (float): Retry-After of the 429 answers, in seconds.
+        seed (int): Seed of the random failures.
+
+    Returns:
+        FastAPI: The fake server application.
+    """
+    app = FastAPI()
+    app.state.latency = latency
+    app.state.upload_bytes_per_second = upload_bytes_per_second
+    app.state.seconds_per_1k_prompt_tokens = seconds_per_1k_prompt_tokens
+    app.state.requests = 0
+    app.state.errors = 0
+    app.state.rate_limited = 0
+    app.state.random = random.Random(seed)
+    app.state.files: Dict[str, Dict[str, Any]] = {}
+    app.state.batches: Dict[str, Dict[str, Any]] = {}
+    app.state.batch_tasks = set()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> Any:
+        raw = await request.body()
+        body = json.loads(raw)
+        app.state.requests += 1
+        if app.state.upload_bytes_per_second:
+            await asyncio.sleep(len(raw) / app.state.upload_bytes_per_second)
+        if app.state.seconds_per_1k_prompt_tokens:
+            await asyncio.sleep(text_prompt_tokens(body) / 1000 * app.state.seconds_per_1k_prompt_tokens)
+        roll = app.state.random.random()
+        if roll < error_rate + rate_limit_rate:
+            await asyncio.sleep(app.state.latency)
+            if roll < error_rate:
+                app.state.errors += 1
+                return JSONResponse(
+                    {"error": {"message": "The server had an error.", "type": "server_error"}},
+                    status_code=500,
+                )
+            app.state.rate_limited += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached.", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": str(retry_after)},
+            )
+        if body.get("stream"):
+            return StreamingResponse(
+                stream_completion(body, app.state.latency), media_type="text/event-stream"
+            )
+        await asyncio.sleep(app.state.latency)
+        return build_completion(body)
+
+    @app.post("/v1/files")
+    async def create_file(file: UploadFile = File(...), purpose: str = Form(...)) -> Dict[str, Any]:
+        return store_file(app, file.filename or "upload.jsonl", purpose, await file.read())
+
+    @app.get("/v1/files/{file_id}/content")
+    async def file_content(file_id: str) -> Response:
+        if file_id not in app.state.files:
+            raise HTTPException(status_code=404, detail="No such file")
+        return Response(app.state.files[file_id]["content"], media_type="application/octet-stream")
+
+    @app.post("/v1/batches")
+    async def create_batch(request: Request) -> Dict[str, Any]:
+        body = await request.json()
+        if body["input_file_id"] not in app.state.files:
+            raise HTTPException(status_code=404, detail="No such file")
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex}",
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "completion_window": body["completion_window"],
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "metadata": body.get("metadata"),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        app.state.batches[batch["id"]] = batch
+        task = asyncio.create_task(run_batch(app, batch))
+        app.state.batch_tasks.add(task)
+        task.add_done_callback(app.state.batch_tasks.discard)
+        return batch
+
+    @app.get("/v1/batches/{batch_id}")
+    async def retrieve_batch(batch_id: str) -> Dict[str, Any]:
+        if batch_id not in app.state.batches:
+            raise HTTPException(status_code=404, detail="No such batch")
+        return app.state.batches[batch_id]
+
+    return app
+
+
+def store_file(app: FastAPI, filename: str, purpose: str, content: bytes) -> Dict[str, Any]:
+    file_id = f"file-{uuid.uuid4().hex}"
+    app.state.files[file_id] = {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(content),
+        "created_at": int(time.time()),
+        "filename": filename,
+        "purpose": purpose,
+        "status": "processed",
+        "content": content,
+    }
+    return {key: value for key, value in app.state.files[file_id].items() if key != "content"}
+
+
+async def run_batch(app: FastAPI, batch: Dict[str, Any]) -> None:
+    """Answer every request of a batch input file after the simulated latency."""
+    lines = [json.loads(line) for line in app.state.files[batch["input_file_id"]]["content"].splitlines() if line]
+    batch["request_counts"]["total"] = len(lines)
+    await asyncio.sleep(app.state.latency)
+    output = []
+    for line in lines:
+        output.append(
+            {
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": line["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "request_id": uuid.uuid4().hex,
+                    "body": build_completion(line["body"]),
+                },
+                "error": None,
+            }
+        )
+    content = "".join(json.dumps(record) + "\n" for record in output).encode()
+    batch["output_file_id"] = store_file(app, f"{batch['id']}_output.jsonl", "batch_output", content)["id"]
+    batch["request_counts"]["completed"] = len(lines)
+    batch["status"] = "completed"
+    batch["completed_at"] = int(time.time())
+
+
+def text_prompt_tokens(body: Dict[str, Any]) -> int:
+    """Rough token count of the text parts of a request (4 characters per token)."""
+    characters = 0
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            characters += len(content)
+        elif isinstance(content, list):
+            characters += sum(len(part.get("text", "")) for part in content if part.get("type") == "text")
+    return characters // 4
+
+
+def build_completion(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a chat completion payload for a request body.
+
+    Args:
+        body (Dict[str, Any]): The JSON request body.
+
+    Returns:
+        Dict[str, Any]: An OpenAI compatible chat completion object.
+    """
+    markers = []
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str) and content.startswith("Page "):
+            markers.append(content)
+        elif isinstance(content, list):
+            markers.extend(
+                part["text"] for part in content
+                if part.get("type") == "text" and part.get("text", "").startswith("Page ")
+            )
+    text = "\n\n".join(f"{marker}\n# Fake page\n\nLorem ipsum dolor sit amet." for marker in markers)
+    messages = body.get("messages", [])
+    if messages and str(messages[0].get("content", "")).startswith("Classify"):
+        text = "invoice"
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": text or "# Fake page"},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": text_prompt_tokens(body),
+            "completion_tokens": 100,
+            "total_tokens": text_prompt_tokens(body) + 100,
+        },
+    }
+
+
+async def stream_completion(body: Dict[str, Any], latency: float, chunks: int = 10) -> AsyncIterator[str]:
+    """
+    Stream a completion as `chat.completion.chunk` events spread over `latency` seconds.
+
+    Args:
+        body (Dict[str, Any]): The JSON request body.
+        latency (float): Total simulated generation time in seconds.
+        chunks (int): Number of content chunks to send.
+
+    Yields:
+        str: Server-Sent Events lines.
+    """
+    completion = build_completion(body)
+    text = completion["choices"][0]["message"]["content"]
+    step = max(1, len(text) // chunks)
+    for index in range(0, len(text), step):
+        await asyncio.sleep(latency / chunks)
+        chunk = {
+            "id": completion["id"],
+            "object": "chat.completion.chunk",
+            "created": completion["created"],
+            "model": completion["model"],
+            "choices": [{"index": 0, "delta": {"content": text[index : index + step]}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+class FakeOpenAIServer:
+    """Run the fake server with uvicorn on a background thread."""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: int = 8765):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host=host, port=port, log_level="warning")
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.should_exit = True
+        self.thread.join()
@@ -0,0 +1,114 @@
+import random
+
+import fitz  # PyMuPDF
+
+# ----------------------------
+# Synthetic PDF Documents
+# ----------------------------
+
+WORDS = (
+    "invoice total amount due vendor address payment terms quantity unit price "
+    "contract party agreement clause date signature tax currency reference"
+).split()
+
+
+def make_pdf(path: str, pages: int, lines_per_page: int = 40, seed: int = 0) -> str:
+    """
+    Write a text-heavy PDF with `pages` letter-size pages.
+
+    Args:
+        path (str): Where to write the PDF.
+        pages (int): Number of pages.
+        lines_per_page (int): Lines of random words per page.
+        seed (int): Random seed, so runs are comparable.
+
+    Returns:
+        str: The path written.
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=612, height=792)
+        page.insert_text((72, 60), f"Synthetic document - page {page_num + 1}", fontsize=16)
+        for line in range(lines_per_page):
+            text = " ".join(rng.choice(WORDS) for _ in range(12))
+            page.insert_text((72, 90 + line * 16), text, fontsize=10)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def make_scanned_pdf(path: str, pages: int, dpi: int = 150, seed: int = 0) -> str:
+    """
+    Write an image-only PDF that looks like a scan: every page is a raster of a text page.
+
+    Args:
+        path (str): Where to write the PDF.
+        pages (int): Number of pages.
+        dpi (int): Resolution of the embedded page images.
+        seed (int): Random seed, so runs are comparable.
+
+    Returns:
+        str: The path written.
+    """
+    text_doc = fitz.open(make_pdf(path + ".text.pdf", min(pages, 10), seed=seed))
+    doc = fitz.open()
+    for page_num in range(pages):
+        pix = text_doc.load_page(page_num % text_doc.page_count).get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        page = doc.new_page(width=612, height=792)
+        page.insert_image(page.rect, pixmap=pix)
+    doc.save(path)
+    doc.close()
+    text_doc.close()
+    return path
+
+
+def make_receipt_pdf(path: str, lines: int = 20, dpi: int = 150, seed: int = 0) -> str:
+    """
+    Write a one-page scan of a narrow receipt, 3 x 8 inches.
+
+    Args:
+        path (str): Where to write the PDF.
+        lines (int): Lines of random words.
+        dpi (int): Resolution of the embedded page image.
+        seed (int): Random seed, so runs are comparable.
+
+    Returns:
+        str: The path written.
+    """
+    rng = random.Random(seed)
+    text_doc = fitz.open()
+    page = text_doc.new_page(width=216, height=576)
+    page.insert_text((12, 30), "RECEIPT", fontsize=12)
+    for line in range(lines):
+        text = " ".join(rng.choice(WORDS) for _ in range(3))
+        page.insert_text((12, 54 + line * 24), f"{text}  {rng.randint(1, 999)}.{rng.randint(0, 99):02d}", fontsize=9)
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    doc = fitz.open()
+    doc.new_page(width=216, height=576).insert_image(fitz.Rect(0, 0, 216, 576), pixmap=pix)
+    doc.save(path)
+    doc.close()
+    text_doc.close()
+    return path
+
+
+def make_large_pdf(path: str, megabytes: int, pages: int = 10, seed: int = 0) -> str:
+    """
+    Write a valid PDF of roughly `megabytes` MB: a short text document
+    carrying an incompressible embedded file, like a high-resolution scan.
+
+    Args:
+        path (str): Where to write the PDF.
+        megabytes (int): Approximate file size.
+        pages (int): Number of pages.
+        seed (int): Random seed, so runs are comparable.
+
+    Returns:
+        str: The path written.
+    """
+    make_pdf(path + ".text.pdf", pages, seed=seed)
+    doc = fitz.open(path + ".text.pdf")
+    doc.embfile_add("scan.bin", random.Random(seed).randbytes(megabytes * 1024 * 1024))
+    doc.save(path)
+    doc.close()
+    return path